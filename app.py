@@ -1,28 +1,38 @@
-from flask import Flask, render_template, jsonify, request, Response
-from database import init_db, get_latest_scorers, get_last_update_time, get_latest_live_data, clear_live_data
-from data_processor import update_top_scorers, update_live_games
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.executors.pool import ThreadPoolExecutor
-from threading import Thread
-import pandas as pd
+from log_config import configure_logging
+
+# Set up logging before the imports below, some of which log as they load
+configure_logging('web')
+
+from flask import Flask, render_template, jsonify, request, Response, g, send_from_directory
+from database import (init_db, get_last_update_time, publish_replica, get_replica_snapshot,
+                      get_replica_snapshots, add_replica_listener, iter_table_pages,
+                      GAME_SCHEDULED, GAME_LIVE, GAME_FINAL, ROLLING_SPANS)
+from response_cache import response_cache
+from compression import choose_encoding, iter_gzip
+from live_stream import live_broadcaster
+from metrics import render_metrics, REQUEST_LATENCY, DATA_FRESHNESS, LIVE_STREAMS_REJECTED, LIVE_STREAMS_OPEN
+import profiling
+import memory
+import player_search
+import tracing
+from serializers import (prepare_columns, to_records, to_rows, iter_csv, iter_arrow, field_headers, SHEETS_FIELDS,
+                         aggregate_records)
+import ingestion
+from ingestion import top_scorers_refresh, live_refresh
 import logging
 import os
-import csv
-import io
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from itertools import chain
 
 # Import the migration function
 from db_migration import migrate_database  # Add this import
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='app.log'
-)
-
 app = Flask(__name__)
 
+# Trace allocations from here on when MEMORY_TRACING_ENABLED is set
+memory.start_memory_tracing()
+
 # Initialize database
 init_db()
 
@@ -33,24 +43,149 @@ if migration_result:
 else:
     logging.error("Database migration failed")
 
-# Clear live data on startup to ensure clean state
-clear_live_data()
-logging.info("Cleared live data on startup")
+# Load the last persisted leaderboards into the read replica
+publish_replica()
 
-# Create scheduler with limited concurrency to prevent database locks
-executors = {
-    'default': ThreadPoolExecutor(1)  # Limit to 1 thread to prevent concurrent DB access
-}
+# Index player names for search, keeping their scores current with every publish
+player_search.build_index()
+add_replica_listener(player_search.on_replica_publish)
+
+# Longest a ?wait=1 refresh request holds its worker before returning the current snapshot
+REFRESH_WAIT_TIMEOUT = 20
+
+# Seconds a client turned away from the live stream should poll before trying it again
+LIVE_STREAM_RETRY_AFTER = 300
+
+# Process start, for the readiness probe
+STARTED_AT = time.time()
+
+# Game status filters accepted by /api/games
+GAME_STATUSES = {'scheduled': GAME_SCHEDULED, 'live': GAME_LIVE, 'final': GAME_FINAL}
+
+# Players on each rolling leaderboard
+ROLLING_LEADERBOARD_LIMIT = 100
+
+def start_background_work():
+    """Start following (or leading) ingestion without blocking startup"""
+    ingestion.start()
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+def _profile_token():
+    # Header only: a token in the query string ends up in access logs and browser history
+    return request.headers.get('X-Profile-Token')
+
+@app.before_request
+def _start_request_profile():
+    """Profile this request when asked with ?profile=1 and the admin token"""
+    if request.args.get('profile') == '1' and profiling.is_authorized(_profile_token()):
+        mode = request.args.get('profile_mode', 'cprofile')
+        if mode in profiling.PROFILE_MODES:
+            g.profile_session = profiling.ProfileSession(f"{request.method}_{request.path}", mode).start()
+
+@app.teardown_request
+def _stop_request_profile(exc):
+    """Save the request's profile (for streamed bodies, up to the first byte)"""
+    session = g.pop('profile_session', None)
+    if session is not None:
+        session.stop()
+
+@app.after_request
+def _record_request_latency(response):
+    """Record per-route latency (for streamed bodies, up to the first byte)"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_LATENCY.observe(time.perf_counter() - g.request_start,
+                            route=route, method=request.method, status=response.status_code)
+    return response
+
+def _parse_db_time(value):
+    """Parse a timestamp written by the database layer into an aware UTC datetime"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).astimezone(timezone.utc)
+    except ValueError:
+        return None
 
-# Create a scheduler for automatic updates
-scheduler = BackgroundScheduler(executors=executors, job_defaults={'misfire_grace_time': 30})
-scheduler.add_job(update_top_scorers, 'interval', minutes=30)
+def _not_modified(etag, last_modified):
+    """Check the request's conditional headers against the current data version"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
 
-# Add live game scheduler
-app.logger.info("Setting up live games scheduler")
-live_scheduler = BackgroundScheduler(executors=executors, job_defaults={'misfire_grace_time': 30})
-live_scheduler.add_job(update_live_games, 'interval', seconds=30)
-app.logger.info("Live scheduler job created")
+def _freshness_record(freshness):
+    """Where a table's data came from, as served alongside it"""
+    if freshness is None:
+        return None
+    fetched_at = _parse_db_time(freshness.fetched_at)
+    saved_at = _parse_db_time(freshness.saved_at)
+    return {
+        'trace_id': freshness.trace_id,
+        'fetched_at': fetched_at.isoformat() if fetched_at else None,
+        'source_time': freshness.source_time,
+        'saved_at': saved_at.isoformat() if saved_at else None
+    }
+
+def _with_freshness(payload, tables, snapshots):
+    """Add where each table's data came from to a payload"""
+    payload['freshness'] = {table: _freshness_record(snapshot.freshness) for table, snapshot in zip(tables, snapshots)}
+    return payload
+
+def _data_age(tables, snapshots):
+    """Seconds since the oldest upstream fetch behind the snapshots, recording each table's age"""
+    now = datetime.now(timezone.utc)
+    ages = []
+    for table, snapshot in zip(tables, snapshots):
+        fetched_at = _parse_db_time(snapshot.freshness.fetched_at) if snapshot.freshness else None
+        if fetched_at is not None:
+            age = max(0.0, (now - fetched_at).total_seconds())
+            DATA_FRESHNESS.observe(age, table=table)
+            ages.append(age)
+    return max(ages, default=None)
+
+def _cached_json_response(key, tables, build_payload):
+    """Serve a JSON payload from the response cache, building it once per data version.
+
+    build_payload is called with one replica snapshot per table, all taken
+    together. Conditional requests are answered with a 304 from the
+    snapshots' versions alone, before any payload is built or serialized.
+    Payloads carry where each table's data came from, and every response
+    the age of its data in X-Data-Age, which changes without a new version.
+    """
+    snapshots = get_replica_snapshots(tables)
+    version = tuple(snapshot.version for snapshot in snapshots)
+    encoding = choose_encoding(request.accept_encodings)
+    
+    # Each content coding is its own representation and needs its own strong ETag
+    etag = '-'.join(list(key) + [str(v) for v in version] + ([encoding] if encoding else []))
+    modified = [_parse_db_time(snapshot.modified_at) for snapshot in snapshots]
+    last_modified = max((m for m in modified if m is not None), default=None)
+    
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        body = response_cache.get_or_build(
+            key, version,
+            lambda: app.json.dumps(_with_freshness(build_payload(*snapshots), tables, snapshots),
+                                   separators=(',', ':')).encode('utf-8'),
+            encoding=encoding)
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    data_age = _data_age(tables, snapshots)
+    if data_age is not None:
+        response.headers['X-Data-Age'] = str(int(data_age))
+    return response
 
 @app.route('/')
 def index():
@@ -63,56 +198,24 @@ def index():
         
     return render_template('index.html', last_update=last_update_display)
 
+def _players_payload(snapshot, empty_message):
+    """Build a leaderboard payload from a replica snapshot"""
+    if not snapshot.rows:
+        return {'status': 'error', 'message': empty_message, 'players': []}
+        
+    players = to_records(prepare_columns(snapshot))
+    
+    return {'status': 'success', 'players': players}
+
+def _top_scorers_payload(snapshot):
+    """Build the /api/top-scorers payload"""
+    return _players_payload(snapshot, 'No data available')
+
 @app.route('/api/top-scorers')
 def top_scorers_api():
     """API endpoint to get top scorers"""
     try:
-        df = get_latest_scorers()
-        
-        if df.empty:
-            return jsonify({'status': 'error', 'message': 'No data available', 'players': []})
-        
-        # Convert to list of dictionaries for JSON response
-        players = []
-        for _, row in df.iterrows():
-            # Format minutes properly if it's in an odd format
-            minutes_display = row['minutes']
-            if ':' in str(minutes_display):
-                try:
-                    parts = str(minutes_display).split(':')
-                    if '.' in parts[0]:
-                        minutes_part = parts[0].split('.')[0]  # Take just the integer part
-                        minutes_int = int(minutes_part)
-                    else:
-                        minutes_int = int(parts[0])
-                    
-                    seconds_int = int(parts[1]) if parts[1].isdigit() else 0
-                    minutes_display = f"{minutes_int}:{seconds_int:02d}"
-                except Exception as e:
-                    logging.error(f"Error formatting minutes {minutes_display}: {str(e)}")
-
-            total_rebounds = int(row['offensive_rebounds']) + int(row['defensive_rebounds'])
-            
-            players.append({
-                'player_name': row['player_name'],
-                'team': row['team'],
-                'minutes': minutes_display,
-                'points': int(row['points']),
-                'rebounds': total_rebounds,
-                'assists': int(row['assists']),
-                'steals': int(row['steals']),
-                'blocks': int(row['blocks']),
-                'turnovers': int(row['turnovers']),
-                'field_goal_made': int(row['field_goal_made']),
-                'field_goal_attempts': int(row['field_goal_attempts']),
-                'three_point_made': int(row['three_point_made']),
-                'three_point_attempts': int(row['three_point_attempts']),
-                'personal_fouls': int(row['personal_fouls']),
-                'plus_minus': int(row['plus_minus']),
-                'custom_score': float(row['custom_score'])
-            })
-        
-        return jsonify({'status': 'success', 'players': players})
+        return _cached_json_response(('top-scorers',), ('top_scorers',), _top_scorers_payload)
         
     except Exception as e:
         logging.error(f"Error in top_scorers_api: {str(e)}")
@@ -122,107 +225,133 @@ def top_scorers_api():
 def refresh_data():
     """Force a refresh of the data"""
     try:
-        # Start update in background
-        thread = Thread(target=update_top_scorers)
-        thread.daemon = True
-        thread.start()
+        # Start update in background, or join the one already running
+        state, _ = ingestion.refresh(top_scorers_refresh)
+        
+        if state == 'fresh':
+            return jsonify({
+                'status': 'success',
+                'message': 'Data was refreshed moments ago'
+            })
         
         # Return immediately
         return jsonify({
             'status': 'processing',
-            'message': 'Data refresh started in background'
+            'message': {
+                'started': 'Data refresh started in background',
+                'in_flight': 'Data refresh already in progress',
+                'requested': 'Data refresh requested from the ingestion process'
+            }[state]
         })
         
     except Exception as e:
         logging.error(f"Error starting refresh: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)})
 
+def _last_update_payload(snapshot):
+    """Build the /api/last-update payload"""
+    last_update = snapshot.modified_at
+    if last_update:
+        return {'status': 'success', 'last_update': last_update}
+    else:
+        return {'status': 'error', 'message': 'No update record found'}
+
 @app.route('/api/last-update')
 def last_update_api():
     """API endpoint to get the last update time"""
-    last_update = get_last_update_time()
-    if last_update:
-        return jsonify({'status': 'success', 'last_update': last_update})
-    else:
-        return jsonify({'status': 'error', 'message': 'No update record found'})
+    # The updates table only changes when the completed-games leaderboard is saved
+    return _cached_json_response(('last-update',), ('top_scorers',), _last_update_payload)
+
+def _live_games_payload(snapshot):
+    """Build the /api/live-games payload"""
+    return _players_payload(snapshot, 'No live games data available')
+
+def _game_players(snapshot, game_id):
+    """A leaderboard snapshot narrowed to the players of one game"""
+    game_index = snapshot.columns.index('game_id')
+    return snapshot._replace(rows=tuple(row for row in snapshot.rows if row[game_index] == game_id))
 
 @app.route('/api/live-games')
 def live_games_api():
-    """API endpoint to get live game data"""
+    """API endpoint to get live game data, optionally for one game with ?game_id="""
     try:
-        df = get_latest_live_data()
-        
-        if df.empty:
-            return jsonify({'status': 'error', 'message': 'No live games data available', 'players': []})
-        
-        # Convert to list of dictionaries for JSON response
-        players = []
-        for _, row in df.iterrows():
-            # Format minutes properly if it's in an odd format
-            minutes_display = row['minutes']
-            if ':' in str(minutes_display):
-                try:
-                    parts = str(minutes_display).split(':')
-                    if '.' in parts[0]:
-                        minutes_part = parts[0].split('.')[0]  # Take just the integer part
-                        minutes_int = int(minutes_part)
-                    else:
-                        minutes_int = int(parts[0])
-                    
-                    seconds_int = int(parts[1]) if parts[1].isdigit() else 0
-                    minutes_display = f"{minutes_int}:{seconds_int:02d}"
-                except Exception as e:
-                    logging.error(f"Error formatting minutes {minutes_display}: {str(e)}")
-
-            total_rebounds = int(row['offensive_rebounds']) + int(row['defensive_rebounds'])
-            
-            players.append({
-                'player_name': row['player_name'],
-                'team': row['team'],
-                'minutes': minutes_display,
-                'points': int(row['points']),
-                'rebounds': total_rebounds,
-                'assists': int(row['assists']),
-                'steals': int(row['steals']),
-                'blocks': int(row['blocks']),
-                'turnovers': int(row['turnovers']),
-                'field_goal_made': int(row['field_goal_made']),
-                'field_goal_attempts': int(row['field_goal_attempts']),
-                'three_point_made': int(row['three_point_made']),
-                'three_point_attempts': int(row['three_point_attempts']),
-                'personal_fouls': int(row['personal_fouls']),
-                'plus_minus': int(row['plus_minus']),
-                'custom_score': float(row['custom_score'])
-            })
+        game_id = request.args.get('game_id')
+        if game_id is None:
+            return _cached_json_response(('live-games',), ('live_players',), _live_games_payload)
         
-        return jsonify({'status': 'success', 'players': players})
+        # Only known games get a cache entry of their own
+        if game_id not in _game_ids(get_replica_snapshot('games')):
+            return jsonify({'status': 'error', 'message': f"Unknown game {game_id}", 'players': []}), 404
+        return _cached_json_response(('live-games', game_id), ('live_players',),
+                                     lambda snapshot: _live_games_payload(_game_players(snapshot, game_id)))
         
     except Exception as e:
         logging.error(f"Error in live_games_api: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e), 'players': []})
 
+def _broadcast_live_snapshot(table, snapshot):
+    """Push each newly published live leaderboard to the connected streams"""
+    if table == 'live_players':
+        live_broadcaster.publish(snapshot.version, _live_games_payload(snapshot)['players'],
+                                 _freshness_record(snapshot.freshness))
+
+add_replica_listener(_broadcast_live_snapshot)
+_broadcast_live_snapshot('live_players', get_replica_snapshot('live_players'))
+
+@app.route('/api/live-stream')
+def live_stream():
+    """Stream live leaderboard changes as Server-Sent Events, or 503 when this process has no stream slot free"""
+    subscriber = live_broadcaster.open_stream()
+    if subscriber is None:
+        # EventSource gives up on a 503 and the dashboard falls back to polling /api/live-games
+        LIVE_STREAMS_REJECTED.inc()
+        response = jsonify({'status': 'error', 'message': 'Too many live streams open, poll /api/live-games instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(LIVE_STREAM_RETRY_AFTER)
+        return response
+    
+    response = Response(live_broadcaster.stream(subscriber), mimetype='text/event-stream')
+    # Frees the slot even when the client leaves before the stream is first iterated
+    response.call_on_close(lambda: live_broadcaster.close_stream(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _game_ids(games_snapshot):
+    """IDs of every game in a games snapshot"""
+    if not games_snapshot.rows:
+        return set()
+    game_index = games_snapshot.columns.index('game_id')
+    return {row[game_index] for row in games_snapshot.rows}
+
+def _game_records(games_snapshot, status=None, game_date=None):
+    """Games of a games snapshot as dicts, optionally only those with a status or on a date"""
+    if not games_snapshot.rows:
+        return []
+    columns = games_snapshot.columns
+    status_index, date_index = columns.index('status'), columns.index('game_date')
+    return [dict(zip(columns, row)) for row in games_snapshot.rows
+            if (status is None or row[status_index] == status)
+            and (game_date is None or row[date_index] == game_date)]
+
+def _live_status_payload(snapshot, games_snapshot):
+    """Build the /api/live-games-status payload"""
+    player_count = len(snapshot.rows)
+    live_games = _game_records(games_snapshot, status=GAME_LIVE)
+    
+    return {
+        'status': 'success',
+        'has_live_games': player_count > 0,
+        'player_count': player_count,
+        'game_count': len(live_games),
+        'games': live_games
+    }
+
 @app.route('/api/live-games-status')
 def live_games_status():
     """Check if there are any live games"""
     try:
-        df = get_latest_live_data()
-        
-        has_live_games = not df.empty
-        player_count = len(df) if has_live_games else 0
-        
-        # Try to determine unique game count (you might need to adjust this based on your data)
-        unique_games = 0
-        if has_live_games:
-            # This is a simple way - you might need to add game_id to your data
-            teams = df['team'].unique()
-            unique_games = len(teams) // 2  # Rough estimate
-        
-        return jsonify({
-            'status': 'success',
-            'has_live_games': has_live_games,
-            'player_count': player_count,
-            'game_count': unique_games
-        })
+        return _cached_json_response(('live-games-status',), ('live_players', 'games'), _live_status_payload)
         
     except Exception as e:
         logging.error(f"Error checking live games status: {str(e)}")
@@ -232,19 +361,113 @@ def live_games_status():
             'has_live_games': False
         })
 
+def _dashboard_payload(top_snapshot, live_snapshot, games_snapshot):
+    """Build the /api/dashboard payload from one consistent set of snapshots"""
+    return {
+        'status': 'success',
+        'completed': _top_scorers_payload(top_snapshot),
+        'live': _live_games_payload(live_snapshot),
+        'live_status': _live_status_payload(live_snapshot, games_snapshot),
+        'last_update': top_snapshot.modified_at,
+        'live_updated_at': live_snapshot.modified_at
+    }
+
+@app.route('/api/dashboard')
+def dashboard_api():
+    """Everything the dashboard page needs in one response"""
+    try:
+        return _cached_json_response(('dashboard',), ('top_scorers', 'live_players', 'games'), _dashboard_payload)
+        
+    except Exception as e:
+        logging.error(f"Error in dashboard_api: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/api/games')
+def games_api():
+    """Recent games with their status, period, clock and score, filtered by ?status= and ?date="""
+    try:
+        status = request.args.get('status')
+        game_date = request.args.get('date')
+        if status is not None and status not in GAME_STATUSES:
+            return jsonify({'status': 'error', 'message': f"Unknown game status {status}", 'games': []}), 400
+        
+        # Dates without games get no cache entry of their own
+        if game_date is not None and not _game_records(get_replica_snapshot('games'), game_date=game_date):
+            return jsonify({'status': 'success', 'games': []})
+        
+        return _cached_json_response(
+            ('games', status or 'all', game_date or 'all'), ('games',),
+            lambda snapshot: {'status': 'success',
+                              'games': _game_records(snapshot, GAME_STATUSES.get(status), game_date)})
+        
+    except Exception as e:
+        logging.error(f"Error in games_api: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e), 'games': []})
+
+def _rolling_response(table, key_columns, field, limit=None):
+    """Serve one span of a rolling aggregate table, chosen with ?window=7d|30d|season"""
+    span = request.args.get('window', '7d')
+    if span not in ROLLING_SPANS:
+        return jsonify({'status': 'error', 'message': f"Unknown window {span}", field: []}), 400
+    
+    return _cached_json_response(
+        ('rolling', table, span), (table,),
+        lambda snapshot: {'status': 'success', 'window': span,
+                          field: aggregate_records(snapshot, span, key_columns, limit)})
+
+@app.route('/api/rolling/players')
+def rolling_players_api():
+    """Per-game player averages over the last 7 days, last 30 days or the season"""
+    try:
+        return _rolling_response('player_aggregates', ('player_id', 'player_name', 'team'), 'players',
+                                 limit=ROLLING_LEADERBOARD_LIMIT)
+        
+    except Exception as e:
+        logging.error(f"Error in rolling_players_api: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e), 'players': []})
+
+@app.route('/api/rolling/teams')
+def rolling_teams_api():
+    """Per-game team totals over the last 7 days, last 30 days or the season"""
+    try:
+        return _rolling_response('team_aggregates', ('team',), 'teams')
+        
+    except Exception as e:
+        logging.error(f"Error in rolling_teams_api: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e), 'teams': []})
+
+@app.route('/api/players/search')
+def player_search_api():
+    """Autocomplete players by name prefix, or by similar name, with their latest and rolling EPA"""
+    try:
+        query = request.args.get('q', '')[:64]
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify({'status': 'success', 'players': player_search.search_players(query, limit=max(limit, 1))})
+        
+    except Exception as e:
+        logging.error(f"Error in player_search_api: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e), 'players': []})
+
 @app.route('/refresh-live')
 def refresh_live_data():
     """Force a refresh of the live data"""
     try:
-        result = update_live_games()
+        # By default never hold the worker: kick off (or join) a refresh in the
+        # background and answer from the current snapshot. ?wait=1 waits for it.
+        wait = request.args.get('wait') == '1'
+        state, result = ingestion.refresh(live_refresh, wait=wait, timeout=REFRESH_WAIT_TIMEOUT)
+        
+        if state in ('started', 'in_flight', 'timeout', 'requested', 'completed'):
+            count = len(get_replica_snapshot('live_players').rows)
+            return jsonify({'status': 'success', 'refresh': state, 'count': count})
         
         # Ensure we always return valid JSON
         if result is not None and not result.empty:
-            return jsonify({'status': 'success', 'count': len(result)})
+            return jsonify({'status': 'success', 'refresh': state, 'count': len(result)})
         elif result is None:
-            return jsonify({'status': 'success', 'message': 'No live games available', 'count': 0})
+            return jsonify({'status': 'success', 'refresh': state, 'message': 'No live games available', 'count': 0})
         else:
-            return jsonify({'status': 'success', 'message': 'No players with stats in live games', 'count': 0})
+            return jsonify({'status': 'success', 'refresh': state, 'message': 'No players with stats in live games', 'count': 0})
             
     except Exception as e:
         logging.error(f"Error in refresh_live_data: {str(e)}")
@@ -253,130 +476,179 @@ def refresh_live_data():
         # Always return valid JSON, even in case of error
         return jsonify({'status': 'error', 'message': str(e)})
 
+# Streamed export formats: mimetype and file extension
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
 # Add this new route to your app.py
 @app.route('/download-csv')
 def download_csv():
-    """Generate and download CSV file with current stats"""
+    """Stream a download of the current stats as CSV, or Arrow/Parquet with ?format="""
     try:
         # Check if user wants live or completed games data
         data_type = request.args.get('type', 'completed')
+        file_format = request.args.get('format', 'csv')
         
-        if data_type == 'live':
-            df = get_latest_live_data()
-        else:
-            df = get_latest_scorers()
+        if file_format not in EXPORT_FORMATS:
+            return jsonify({'status': 'error', 'message': f'Unsupported format {file_format}'})
+        
+        if file_format != 'csv':
+            try:
+                import pyarrow
+            except ImportError:
+                return jsonify({'status': 'error', 'message': f'{file_format} export requires pyarrow'})
+        
+        # Page rows straight from disk so memory stays flat however big the export is
+        pages = iter_table_pages('live_players' if data_type == 'live' else 'top_scorers')
+        first_page = next(pages, None)
         
-        if df.empty:
+        if first_page is None:
             return jsonify({'status': 'error', 'message': 'No data available'})
         
-        # Create a string buffer to store CSV data
-        output = io.StringIO()
+        pages = chain([first_page], pages)
+        body = iter_csv(pages) if file_format == 'csv' else iter_arrow(pages, file_format)
         
-        # Prepare data for export
-        export_data = []
-        for _, row in df.iterrows():
-            export_data.append({
-                'Player': row['player_name'],
-                'Team': row['team'],
-                'Minutes': row['minutes'],
-                'Points': row['points'],
-                'Off_Rebounds': row['offensive_rebounds'],
-                'Def_Rebounds': row['defensive_rebounds'],
-                'Total_Rebounds': row['offensive_rebounds'] + row['defensive_rebounds'],
-                'Assists': row['assists'],
-                'Steals': row['steals'],
-                'Blocks': row['blocks'],
-                'Turnovers': row['turnovers'],
-                'FG_Made': row['field_goal_made'],
-                'FG_Attempts': row['field_goal_attempts'],
-                'FG_Percentage': f"{(row['field_goal_made'] / row['field_goal_attempts'] * 100):.1f}%" if row['field_goal_attempts'] > 0 else "0.0%",
-                'Three_Made': row['three_point_made'],
-                'Three_Attempts': row['three_point_attempts'],
-                'Three_Percentage': f"{(row['three_point_made'] / row['three_point_attempts'] * 100):.1f}%" if row['three_point_attempts'] > 0 else "0.0%",
-                'Personal_Fouls': row['personal_fouls'],
-                'Plus_Minus': row['plus_minus'],
-                'EPA_Score': row['custom_score']
-            })
+        # Create response
+        mimetype, extension = EXPORT_FORMATS[file_format]
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"nba_stats_{data_type}_{timestamp}.{extension}"
+        headers = {'Content-Disposition': f'attachment; filename={filename}', 'Vary': 'Accept-Encoding'}
         
-        # Create CSV writer
-        if export_data:
-            fieldnames = export_data[0].keys()
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            
-            # Write headers and data
-            writer.writeheader()
-            writer.writerows(export_data)
-            
-            # Create response
-            output.seek(0)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"nba_stats_{data_type}_{timestamp}.csv"
-            
-            return Response(
-                output.getvalue(),
-                mimetype='text/csv',
-                headers={'Content-Disposition': f'attachment; filename={filename}'}
-            )
-        else:
-            return jsonify({'status': 'error', 'message': 'No data to export'})
+        # CSV compresses well - gzip it on the fly when the client accepts it
+        if file_format == 'csv' and choose_encoding(request.accept_encodings, allow_brotli=False):
+            body = iter_gzip(body)
+            headers['Content-Encoding'] = 'gzip'
+        
+        return Response(body, mimetype=mimetype, headers=headers)
             
     except Exception as e:
-        logging.error(f"Error generating CSV: {str(e)}")
+        logging.error(f"Error generating export: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)})
 
+def _sheets_payload(snapshot):
+    """Build the /api/sheets-data payload"""
+    if not snapshot.rows:
+        return {'status': 'error', 'message': 'No data available'}
+    
+    columns = prepare_columns(snapshot)
+    
+    return {
+        'status': 'success',
+        'headers': field_headers(SHEETS_FIELDS),
+        'data': to_rows(columns)
+    }
+
 # Add this route to get data directly as JSON for sheets integration
 @app.route('/api/sheets-data')
 def sheets_data():
     """Get data formatted for Google Sheets"""
     try:
         data_type = request.args.get('type', 'completed')
+        table = 'live_players' if data_type == 'live' else 'top_scorers'
         
-        if data_type == 'live':
-            df = get_latest_live_data()
-        else:
-            df = get_latest_scorers()
-        
-        if df.empty:
-            return jsonify({'status': 'error', 'message': 'No data available'})
-        
-        # Format data for sheets
-        sheets_data = []
-        for _, row in df.iterrows():
-            sheets_data.append([
-                row['player_name'],
-                row['team'],
-                row['minutes'],
-                int(row['points']),
-                int(row['offensive_rebounds']),
-                int(row['defensive_rebounds']),
-                int(row['offensive_rebounds'] + row['defensive_rebounds']),
-                int(row['assists']),
-                int(row['steals']),
-                int(row['blocks']),
-                int(row['turnovers']),
-                int(row['field_goal_made']),
-                int(row['field_goal_attempts']),
-                f"{(row['field_goal_made'] / row['field_goal_attempts'] * 100):.1f}" if row['field_goal_attempts'] > 0 else "0.0",
-                int(row['three_point_made']),
-                int(row['three_point_attempts']),
-                f"{(row['three_point_made'] / row['three_point_attempts'] * 100):.1f}" if row['three_point_attempts'] > 0 else "0.0",
-                int(row['personal_fouls']),
-                int(row['plus_minus']),
-                float(row['custom_score'])
-            ])
-        
-        return jsonify({
-            'status': 'success',
-            'headers': ['Player', 'Team', 'Minutes', 'Points', 'OREB', 'DREB', 'Total REB', 
-                       'Assists', 'Steals', 'Blocks', 'Turnovers', 'FGM', 'FGA', 'FG%', 
-                       '3PM', '3PA', '3P%', 'Fouls', '+/-', 'EPA Score'],
-            'data': sheets_data
-        })
+        return _cached_json_response(('sheets-data', table), (table,), _sheets_payload)
         
     except Exception as e:
         logging.error(f"Error getting sheets data: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/ready')
+def readiness():
+    """Readiness probe: 200 once the replica is loaded, 503 until then"""
+    top, live = get_replica_snapshots(('top_scorers', 'live_players'))
+    state = {
+        'replica_loaded': top.published_at is not None and live.published_at is not None,
+        'top_scorers': len(top.rows),
+        'live_players': len(live.rows),
+        'uptime_seconds': round(time.time() - STARTED_AT, 3),
+        'ingestion': ingestion.warm_up_state()
+    }
+    ready = state['replica_loaded']
+    return jsonify({'status': 'ready' if ready else 'warming_up', **state}), 200 if ready else 503
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for the ingestion and serving paths"""
+    memory.update_memory_gauges()
+    LIVE_STREAMS_OPEN.set(live_broadcaster.subscriber_count())
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def _profiling_not_found():
+    # Without profiling enabled and the admin token these routes do not exist
+    return jsonify({'status': 'error', 'message': 'Not found'}), 404
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """Saved profiling reports and jobs armed for profiling"""
+    if not profiling.is_authorized(_profile_token()):
+        return _profiling_not_found()
+    return jsonify({
+        'status': 'success',
+        'profiles': profiling.list_profiles(),
+        'armed_jobs': profiling.armed_jobs()
+    })
+
+@app.route('/admin/profiles/<path:name>')
+def download_profile(name):
+    """Download one saved profiling report"""
+    if not profiling.is_authorized(_profile_token()):
+        return _profiling_not_found()
+    return send_from_directory(os.path.abspath(profiling.PROFILE_DIR), name, as_attachment=True)
+
+@app.route('/admin/profile-job/<job_id>')
+def profile_job(job_id):
+    """Profile the next ?runs= runs of a scheduled job (0 disarms it)"""
+    if not profiling.is_authorized(_profile_token()):
+        return _profiling_not_found()
+    if ingestion.get_job(job_id) is None:
+        return jsonify({'status': 'error', 'message': f"Unknown job {job_id}"}), 404
+
+    try:
+        runs = int(request.args.get('runs', 1))
+        profiling.arm_job(job_id, runs, request.args.get('mode', 'cprofile'))
+        logging.info(f"Armed {runs} profiled runs of job {job_id}")
+        # Jobs only run in the ingestion leader, so arming any other process does nothing
+        return jsonify({'status': 'success', 'leader': ingestion.is_leader(), 'armed_jobs': profiling.armed_jobs()})
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@app.route('/admin/memory')
+def memory_status():
+    """Memory use, top allocations and growth between snapshots (?snapshot=1 takes a fresh one)"""
+    if not profiling.has_admin_token(_profile_token()):
+        return _profiling_not_found()
+
+    try:
+        if request.args.get('snapshot') == '1':
+            memory.take_snapshot()
+        key_type = request.args.get('group_by', 'lineno')
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'status': 'error', 'message': f"Unknown grouping {key_type}"}), 400
+
+        report = memory.memory_report(int(request.args.get('limit', 20)), key_type)
+        return jsonify({'status': 'success', **report})
+
+    except Exception as e:
+        logging.error(f"Error building memory report: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/admin/traces')
+def ingestion_traces():
+    """Stage timings and data freshness of the latest ingestion cycles run by this process"""
+    if not profiling.has_admin_token(_profile_token()):
+        return _profiling_not_found()
+
+    try:
+        limit = int(request.args.get('limit', tracing.TRACE_HISTORY))
+        return jsonify({'status': 'success', 'leader': ingestion.is_leader(), 'traces': tracing.recent_traces(limit)})
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
 @app.route('/test-api-connection')
 def test_api_connection():
     """Test endpoint to check API connectivity and environment"""
@@ -436,14 +708,8 @@ if __name__ == '__main__':
     os.makedirs('static/css', exist_ok=True)
     os.makedirs('static/js', exist_ok=True)
     
-    # Run the initial update
-    update_top_scorers()
-    
-    # Start the scheduler
-    scheduler.start()
-
-    # Start the live scheduler
-    live_scheduler.start()
+    # Follow the ingestion leader, or become it, in the background
+    start_background_work()
     
     # Start the Flask app
     app.run(debug=True, host='0.0.0.0', port=8080)
@@ -455,23 +721,5 @@ else:
     os.makedirs('static/css', exist_ok=True)
     os.makedirs('static/js', exist_ok=True)
     
-    # Initialize database
-    init_db()
-    
-    # Perform database migration
-    migration_result = migrate_database()
-    if migration_result:
-        logging.info("Database migration completed successfully")
-    else:
-        logging.error("Database migration failed")
-    
-    # Clear live data on startup
-    clear_live_data()
-    logging.info("Cleared live data on startup")
-    
-    # Run the initial update
-    update_top_scorers()
-    
-    # Start the schedulers
-    scheduler.start()
-    live_scheduler.start()
+    # Database setup already ran at import; everything slow happens in the background
+    start_background_work()
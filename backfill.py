@@ -0,0 +1,111 @@
+# backfill.py - Score historical games in bulk
+#
+# Fetches the box score of every completed game between two dates (keeping
+# the raw responses in a cache directory so reruns, for example to try new
+# score weights, need no upstream requests), then parses and scores them
+# across worker processes.
+#
+#   python backfill.py 2024-10-22 2024-11-30 --processes 8 --output backfill.csv
+#   python backfill.py 2024-10-22 2024-11-30 --weights weights.json --top 10
+
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from nba_api.stats.endpoints import ScoreboardV2, BoxScoreTraditionalV2
+from log_config import configure_logging
+from nba_data import fetch_with_retries
+from executors import io_pool, PRIORITY_COMPLETED
+from scoring import SCORE_WEIGHTS
+from bulk_scoring import BULK_PROCESSES, score_box_scores, to_frame
+
+def completed_game_ids(game_date):
+    """IDs of the games on a date that have finished"""
+    formatted = game_date.strftime('%m/%d/%Y')
+    games_df = fetch_with_retries('ScoreboardV2', f"date {formatted}",
+                                  lambda: ScoreboardV2(game_date=formatted).game_header.get_data_frame())
+    if games_df.empty:
+        return []
+    return games_df[games_df['GAME_STATUS_TEXT'].isin(['Final', 'Finished', 'Complete'])]['GAME_ID'].tolist()
+
+def _raw_box_score(game_id, cache_dir):
+    """Raw box score JSON of a game, from the cache directory when it has been fetched before"""
+    path = os.path.join(cache_dir, f"{game_id}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return f.read()
+
+    raw = fetch_with_retries('BoxScoreTraditionalV2', f"game {game_id}",
+                             lambda: BoxScoreTraditionalV2(game_id=game_id).get_json())
+    # Write beside the cache file and move it into place, so an interrupted
+    # run never leaves a truncated box score for the next run to trust
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w') as f:
+            f.write(raw)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return raw
+
+def main():
+    parser = argparse.ArgumentParser(description='Score historical NBA games in bulk')
+    parser.add_argument('start', help='first game date, YYYY-MM-DD')
+    parser.add_argument('end', nargs='?', help='last game date, YYYY-MM-DD (defaults to start)')
+    parser.add_argument('--processes', type=int, default=BULK_PROCESSES, help='worker processes for scoring')
+    parser.add_argument('--weights', help='JSON file of stat weights overriding the defaults')
+    parser.add_argument('--cache-dir', default='backfill_cache', help='where raw box scores are kept')
+    parser.add_argument('--top', type=int, help='keep only the top N players of each date')
+    parser.add_argument('--output', default='backfill.csv', help='CSV file to write')
+    args = parser.parse_args()
+    configure_logging('backfill')
+
+    start = datetime.strptime(args.start, '%Y-%m-%d')
+    end = datetime.strptime(args.end, '%Y-%m-%d') if args.end else start
+    weights = dict(SCORE_WEIGHTS)
+    if args.weights:
+        with open(args.weights) as f:
+            weights.update(json.load(f))
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    # Fetching is I/O bound and shares the ingestion I/O pool's concurrency limit
+    game_dates = {}
+    day = start
+    while day <= end:
+        for game_id in completed_game_ids(day):
+            game_dates[game_id] = day.strftime('%Y-%m-%d')
+        day += timedelta(days=1)
+    logging.info(f"Found {len(game_dates)} completed games between {start:%Y-%m-%d} and {end:%Y-%m-%d}")
+
+    fetch_start = time.perf_counter()
+    pending = {game_id: io_pool.submit(PRIORITY_COMPLETED, _raw_box_score, game_id, args.cache_dir)
+               for game_id in game_dates}
+    raw_box_scores = []
+    for game_id, future in pending.items():
+        try:
+            raw_box_scores.append(future.result())
+        except Exception as e:
+            logging.error(f"Skipping game {game_id}: {str(e)}")
+    logging.info(f"Loaded {len(raw_box_scores)} box scores in {time.perf_counter() - fetch_start:.1f}s")
+
+    # Parsing and scoring is CPU bound, so it is sharded across processes
+    score_start = time.perf_counter()
+    scored = to_frame(score_box_scores(raw_box_scores, processes=args.processes, weights=weights))
+    elapsed = time.perf_counter() - score_start
+    logging.info(f"Scored {len(scored)} player games on {args.processes} processes in {elapsed:.2f}s")
+    if scored.empty:
+        logging.warning("Nothing to write")
+        return
+
+    scored.insert(0, 'GAME_DATE', scored['GAME_ID'].map(game_dates))
+    scored = scored.sort_values(['GAME_DATE', 'CUSTOM_SCORE'], ascending=[True, False])
+    if args.top:
+        scored = scored.groupby('GAME_DATE', sort=False).head(args.top)
+    scored.to_csv(args.output, index=False)
+    logging.info(f"Wrote {len(scored)} rows to {args.output}")
+
+if __name__ == '__main__':
+    main()
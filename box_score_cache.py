@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+import logging
+from collections import namedtuple
+
+# Seconds a completed game's box score is reused before it is fetched again,
+# so stat corrections made after the final buzzer are picked up
+FINAL_BOX_SCORE_TTL = float(os.environ.get('FINAL_BOX_SCORE_TTL', 3600))
+
+# A completed game's player stats, when they were fetched (epoch seconds),
+# and what the scoreboards showed of the game at the time
+CachedBoxScore = namedtuple('CachedBoxScore', ['player_stats', 'fetched_at', 'state'])
+
+class BoxScoreCache:
+    """Box scores of completed games keyed by game ID.
+
+    Final box scores rarely change, so a run of completed-game ingestion
+    reuses the ones earlier runs fetched. An entry is dropped once it is
+    older than the TTL, or as soon as the scoreboards show the game
+    differently from when it was fetched, so stat corrections still arrive.
+    """
+
+    def __init__(self, ttl=FINAL_BOX_SCORE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, game_id, state):
+        """Return the cached entry of a game if it is still valid for its scoreboard state, else None"""
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                return None
+            if time.time() - entry.fetched_at > self.ttl:
+                reason = f"is older than {self.ttl:.0f}s"
+            elif entry.state != state:
+                reason = "predates a scoreboard change"
+            else:
+                return entry
+            del self._entries[game_id]
+        logging.info(f"Box score of game {game_id} {reason}, fetching it again")
+        return None
+
+    def put(self, game_id, player_stats, state, fetched_at=None):
+        """Cache the box score of a game as fetched at fetched_at (now by default) with its scoreboard state"""
+        with self._lock:
+            self._entries[game_id] = CachedBoxScore(player_stats, fetched_at or time.time(), state)
+
+    def retain(self, game_ids):
+        """Drop every game not in game_ids, which will not be asked for again"""
+        game_ids = set(game_ids)
+        with self._lock:
+            for game_id in [game_id for game_id in self._entries if game_id not in game_ids]:
+                del self._entries[game_id]
+
+    def clear(self):
+        """Drop every cached box score"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scoring import SCORE_WEIGHTS, weighted_score
+
+# Worker processes for bulk parsing and scoring; 1 runs everything in-process
+BULK_PROCESSES = int(os.environ.get('BULK_PROCESSES', os.cpu_count() or 1))
+
+# Box-score stats carried through to the results, as int32 columns in this order
+STAT_COLUMNS = ['PTS', 'OREB', 'DREB', 'AST', 'STL', 'BLK', 'TO', 'FGM', 'FGA', 'FG3M', 'FG3A', 'PF', 'PLUS_MINUS']
+
+# One scored game as compact arrays, which cross the process boundary as raw
+# buffers instead of a pickled DataFrame with its index and block manager
+GameScores = namedtuple('GameScores', ['game_id', 'player_ids', 'player_names', 'teams', 'minutes', 'stats', 'scores'])
+
+def _number(value):
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def _minutes_to_numeric(minutes):
+    """Played minutes as a number, the same way get_top_scorers reads them"""
+    try:
+        if minutes is None:
+            return 0.0
+        minutes = str(minutes)
+        if ':' in minutes:
+            parts = minutes.split(':')
+            whole = float(parts[0]) if '.' in parts[0] else int(parts[0])
+            seconds = int(parts[1]) if parts[1].isdigit() else 0
+            return whole + (seconds / 60)
+        return float(minutes) if minutes else 0.0
+    except Exception:
+        return 0.0
+
+def score_box_score(raw, weights=None):
+    """Parse a raw BoxScoreTraditionalV2 JSON response and score every player who played"""
+    data = json.loads(raw)
+    player_stats = next(result for result in data['resultSets'] if result['name'] == 'PlayerStats')
+    index = {header: position for position, header in enumerate(player_stats['headers'])}
+    rows = player_stats['rowSet']
+
+    minutes = np.array([_minutes_to_numeric(row[index['MIN']]) for row in rows], dtype=np.float64)
+    played = [row for row, minutes_played in zip(rows, minutes) if minutes_played > 0]
+
+    def column(name):
+        position = index.get(name)
+        return np.array([_number(row[position]) if position is not None else 0.0 for row in played],
+                        dtype=np.float64)
+
+    stats = {stat: column(stat) for stat in STAT_COLUMNS}
+    stats['MIN_NUMERIC'] = minutes[minutes > 0]
+    scores = weighted_score(stats, weights)
+
+    game_position = index.get('GAME_ID')
+    return GameScores(
+        game_id=played[0][game_position] if played and game_position is not None else None,
+        player_ids=np.array([row[index['PLAYER_ID']] for row in played], dtype=np.int64),
+        player_names=[row[index['PLAYER_NAME']] for row in played],
+        teams=[row[index['TEAM_ABBREVIATION']] for row in played],
+        minutes=[row[index['MIN']] for row in played],
+        stats=np.column_stack([stats[stat] for stat in STAT_COLUMNS]).astype(np.int32) if played
+        else np.zeros((0, len(STAT_COLUMNS)), dtype=np.int32),
+        scores=scores
+    )
+
+def _score_payload(payload):
+    raw, weights = payload
+    return score_box_score(raw, weights)
+
+def score_box_scores(raw_box_scores, processes=BULK_PROCESSES, weights=None):
+    """Parse and score many raw box scores, sharded by game across worker processes.
+
+    Yields GameScores in input order. With processes <= 1, or a single box
+    score, everything runs in this process.
+    """
+    raw_box_scores = list(raw_box_scores)
+    payloads = [(raw, weights or SCORE_WEIGHTS) for raw in raw_box_scores]
+
+    if processes <= 1 or len(payloads) <= 1:
+        yield from map(_score_payload, payloads)
+        return
+
+    # A few shards per worker keeps them all busy without one task per game
+    chunksize = max(1, len(payloads) // (processes * 4))
+    logging.info(f"Scoring {len(payloads)} box scores on {processes} processes")
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        yield from pool.map(_score_payload, payloads, chunksize=chunksize)
+
+def to_frame(game_scores):
+    """Combine scored games into one frame with the columns get_top_scorers returns, plus game and player IDs"""
+    game_scores = [game for game in game_scores if len(game.scores)]
+    if not game_scores:
+        return pd.DataFrame()
+
+    stats = np.concatenate([game.stats for game in game_scores])
+    frame = pd.DataFrame({
+        'GAME_ID': np.concatenate([[game.game_id] * len(game.scores) for game in game_scores]),
+        'PLAYER_ID': np.concatenate([game.player_ids for game in game_scores]),
+        'PLAYER_NAME': [name for game in game_scores for name in game.player_names],
+        'TEAM_ABBREVIATION': [team for game in game_scores for team in game.teams],
+        'MIN': [minutes for game in game_scores for minutes in game.minutes],
+    })
+    for position, stat in enumerate(STAT_COLUMNS):
+        frame[stat] = stats[:, position]
+    frame['CUSTOM_SCORE'] = np.concatenate([game.scores for game in game_scores])
+    return frame
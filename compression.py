@@ -0,0 +1,45 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional - without it clients are offered gzip only
+    brotli = None
+
+# Cached bodies are compressed once per data version, but on the request
+# thread that missed the cache, so brotli stays at a dynamic-content quality:
+# 11 takes hundreds of milliseconds on a full leaderboard, 5 a few
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 5
+
+# Streamed bodies are compressed per request and trade some ratio for speed
+STREAM_GZIP_LEVEL = 6
+
+def choose_encoding(accept_encodings, allow_brotli=True):
+    """Pick the content coding to send for a request's Accept-Encoding, or None for identity"""
+    if allow_brotli and brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    """Compress a complete body with the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # Fixed mtime keeps the bytes identical across rebuilds, so ETags stay strong
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+def iter_gzip(chunks):
+    """Gzip a streamed body chunk by chunk"""
+    compressor = zlib.compressobj(STREAM_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
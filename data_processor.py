@@ -1,23 +1,58 @@
 # data_processor.py - Improved version with better error handling
 
-from nba_data import get_games_last_12_hours, get_player_stats, get_live_games, get_live_player_stats
-from scoring import calculate_custom_score, get_top_scorers
-from database import init_db, save_top_scorers, save_live_data, clear_live_data
+from nba_data import (get_games_last_12_hours, iter_player_stats, get_live_games, get_live_player_stats,
+                      take_game_updates)
+from scoring import calculate_custom_score, get_top_scorers, merge_top_scorers
+from database import (init_db, save_top_scorers, save_live_data, clear_live_data, get_latest_scorers, save_games,
+                      save_game_history)
+from metrics import SCORING_LATENCY, INGEST_PUBLISH_LATENCY
+from executors import db_writer, PRIORITY_LIVE, PRIORITY_COMPLETED
+import tracing
+from log_config import log_sampled
+import pandas as pd
 import logging
 import time
-import sys
 
-# Configure logging to console
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Players kept on the completed-games leaderboard
+TOP_SCORERS_LIMIT = 100
 
+# Stored leaderboard columns under the names scoring uses
+_STORED_TO_SCORED = {
+    'game_id': 'GAME_ID', 'player_id': 'PLAYER_ID', 'player_name': 'PLAYER_NAME',
+    'team': 'TEAM_ABBREVIATION', 'minutes': 'MIN', 'points': 'PTS', 'offensive_rebounds': 'OREB',
+    'defensive_rebounds': 'DREB', 'assists': 'AST', 'steals': 'STL',
+    'blocks': 'BLK', 'turnovers': 'TO', 'field_goal_made': 'FGM', 'field_goal_attempts': 'FGA',
+    'three_point_made': 'FG3M', 'three_point_attempts': 'FG3A', 'personal_fouls': 'PF',
+    'plus_minus': 'PLUS_MINUS', 'custom_score': 'CUSTOM_SCORE'
+}
+
+def _published_top_scorers():
+    """The leaderboard readers currently see, in scoring's column names"""
+    published = get_latest_scorers().reindex(columns=list(_STORED_TO_SCORED)).rename(columns=_STORED_TO_SCORED)
+    stat_columns = [column for column in published.columns
+                    if column not in ('GAME_ID', 'PLAYER_ID', 'PLAYER_NAME', 'TEAM_ABBREVIATION', 'MIN')]
+    published[stat_columns] = published[stat_columns].apply(pd.to_numeric, errors='coerce').fillna(0)
+    return published
+
+def _player_keys(player_stats):
+    return set(zip(player_stats['PLAYER_NAME'], player_stats['TEAM_ABBREVIATION']))
+
+def _save_game_updates(priority):
+    """Persist the games whose state changed on the scoreboards and box scores just fetched"""
+    games = take_game_updates()
+    if games:
+        db_writer.run(priority, save_games, games)
+
+@tracing.traced('completed')
 def update_top_scorers():
-    """Update the database with latest top scorers"""
+    """Update the database with latest top scorers, publishing a new version as each game arrives.
+
+    Each box score is normalized, scored and merged into a running top N as
+    soon as it is fetched, so only one game's stats are held at a time and
+    the first version is out after one box score rather than the whole slate.
+    Until this run has seen every game, published players it has not seen
+    yet stay on the board; the last version holds exactly this run's players.
+    """
     try:
         start_time = time.time()
         logging.info("Starting top scorers update...")
@@ -25,58 +60,74 @@ def update_top_scorers():
         # Get recent games
         logging.info("Fetching games from the last 12 hours...")
         game_ids = get_games_last_12_hours()
+        _save_game_updates(PRIORITY_COMPLETED)
+        
+        # Move the rolling aggregates on to today, even on a night without games
+        db_writer.run(PRIORITY_COMPLETED, save_game_history)
         
         if not game_ids:
             logging.info("No completed games found in the last 12 hours.")
             return pd.DataFrame()  # Return empty DataFrame instead of None
         
-        logging.info(f"Found {len(game_ids)} completed games. Fetching player stats...")
-        
-        # Get player stats for these games
-        player_stats = get_player_stats(game_ids)
-        
-        if player_stats.empty:
-            logging.info("No player stats retrieved.")
-            return pd.DataFrame()
+        games_left = len(set(game_ids))
+        logging.info(f"Found {games_left} completed games. Streaming player stats...")
         
-        logging.info(f"Retrieved stats for {len(player_stats)} players")
+        previous = _published_top_scorers()
+        seen_players = set()
+        top_players = pd.DataFrame()
+        published_final = False
         
         # Validate required columns
         required_columns = ['PLAYER_NAME', 'TEAM_ABBREVIATION', 'MIN', 'PTS', 'OREB', 'DREB', 
                           'AST', 'STL', 'BLK', 'TO', 'FGM', 'FGA', 'FG3M', 'FG3A', 'PF']
-        missing_columns = [col for col in required_columns if col not in player_stats.columns]
         
-        if missing_columns:
-            logging.error(f"Missing required columns: {missing_columns}")
-            return pd.DataFrame()
-        
-        # Calculate top scorers
-        logging.info("Calculating custom scores...")
-        try:
-            top_players = get_top_scorers(player_stats, limit=100)
-        except Exception as e:
-            logging.error(f"Error calculating custom scores: {str(e)}")
-            return pd.DataFrame()
+        for batch_game_ids, player_stats in iter_player_stats(game_ids):
+            games_left -= len(batch_game_ids)
+            
+            missing_columns = [col for col in required_columns if col not in player_stats.columns]
+            if missing_columns:
+                logging.error(f"Missing required columns for games {batch_game_ids}: {missing_columns}")
+                continue
+            
+            try:
+                with SCORING_LATENCY.time(kind='completed'), tracing.span('score'):
+                    scored = get_top_scorers(player_stats, limit=len(player_stats))
+            except Exception as e:
+                logging.error(f"Error calculating custom scores for games {batch_game_ids}: {str(e)}")
+                continue
+            
+            # Every line of a final game goes into the history behind the rolling aggregates
+            db_writer.run(PRIORITY_COMPLETED, save_game_history, scored)
+            scored = scored.head(TOP_SCORERS_LIMIT)
+            
+            seen_players |= _player_keys(player_stats)
+            top_players = merge_top_scorers(top_players, scored, limit=TOP_SCORERS_LIMIT)
+            if top_players.empty:
+                continue
+            
+            if games_left > 0:
+                still_published = previous.loc[[key not in seen_players for key in
+                                                zip(previous['PLAYER_NAME'], previous['TEAM_ABBREVIATION'])]]
+                leaderboard = merge_top_scorers(top_players, still_published, limit=TOP_SCORERS_LIMIT)
+            else:
+                leaderboard = top_players
+            
+            if db_writer.run(PRIORITY_COMPLETED, save_top_scorers, leaderboard, final=games_left <= 0):
+                INGEST_PUBLISH_LATENCY.observe(time.time() - start_time, kind='completed',
+                                               stage='final' if games_left <= 0 else 'partial')
+                published_final = games_left <= 0
+                logging.info(f"Published {len(leaderboard)} top scorers with {max(games_left, 0)} games to go")
         
         if top_players.empty:
             logging.warning("No players with valid stats found")
             return pd.DataFrame()
         
-        logging.info(f"Calculated custom scores for {len(top_players)} players")
-        
-        # Save to database
-        logging.info("Saving top scorers to database...")
-        try:
-            save_result = save_top_scorers(top_players)
-        except Exception as e:
-            logging.error(f"Error saving to database: {str(e)}")
-            return pd.DataFrame()
-        
-        if save_result:
-            logging.info(f"Successfully saved {len(top_players)} player records to database")
-        else:
-            logging.error("Failed to save player records to database")
-            return pd.DataFrame()
+        # Games whose box score never arrived drop off, as in a batch run
+        if not published_final:
+            if not db_writer.run(PRIORITY_COMPLETED, save_top_scorers, top_players):
+                logging.error("Failed to save player records to database")
+                return pd.DataFrame()
+            INGEST_PUBLISH_LATENCY.observe(time.time() - start_time, kind='completed', stage='final')
         
         elapsed_time = time.time() - start_time
         logging.info(f"Update completed successfully in {elapsed_time:.2f} seconds!")
@@ -88,6 +139,7 @@ def update_top_scorers():
         logging.error(traceback.format_exc())
         return pd.DataFrame()
 
+@tracing.traced('live')
 def update_live_games():
     """Update the database with latest live game stats"""
     try:
@@ -95,44 +147,44 @@ def update_live_games():
         
         # Get in-progress games only
         live_games = get_live_games()
+        _save_game_updates(PRIORITY_LIVE)
         
         if not live_games:
             logging.info("No live games found. Clearing live data...")
             # Clear the live data table since no games are currently active
-            clear_live_data()
+            db_writer.run(PRIORITY_LIVE, clear_live_data)
             return None
         
         logging.info(f"Found {len(live_games)} live games. Fetching player stats...")
         
         # Get player stats for live games using the live endpoint
         player_stats = get_live_player_stats(live_games)
+        _save_game_updates(PRIORITY_LIVE)
         
         if player_stats.empty:
             logging.info("No player stats retrieved for live games. Clearing live data...")
             # Clear the live data table if no valid stats
-            clear_live_data()
+            db_writer.run(PRIORITY_LIVE, clear_live_data)
             return None
         
         logging.info(f"Retrieved stats for {len(player_stats)} players from live games")
         
-        # Log the data structure
-        logging.info(f"Live data columns: {player_stats.columns.tolist()}")
-        if not player_stats.empty:
-            sample_player = player_stats.iloc[0].to_dict()
-            logging.info(f"Sample player data: {sample_player}")
+        # Log the data structure now and then, when debugging
+        log_sampled('live_sample_player', lambda: f"Sample player data: {player_stats.iloc[0].to_dict()}")
         
         # Calculate custom scores - make sure is_live=True so we include all players
-        live_player_data = get_top_scorers(player_stats, limit=100, is_live=True)
+        with SCORING_LATENCY.time(kind='live'), tracing.span('score'):
+            live_player_data = get_top_scorers(player_stats, limit=100, is_live=True)
         
         if live_player_data.empty:
             logging.warning("No valid player data after processing")
-            clear_live_data()
+            db_writer.run(PRIORITY_LIVE, clear_live_data)
             return None
         
         logging.info(f"Processed {len(live_player_data)} players with custom scores")
         
         # Save to database (live data table)
-        save_result = save_live_data(live_player_data)
+        save_result = db_writer.run(PRIORITY_LIVE, save_live_data, live_player_data)
         
         if save_result:
             logging.info(f"Successfully saved {len(live_player_data)} live player records to database")
@@ -1,17 +1,90 @@
 import sqlite3
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import logging
 import os
+import threading
 import time
+from collections import namedtuple
+from metrics import DB_WRITE_LATENCY, DB_READ_LATENCY, DB_ROWS_WRITTEN, DATA_PUBLISH_LAG
+import tracing
+from log_config import log_sampled
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='database.log'
+DB_NAME = 'nba_scores.db'
+
+# Rows read per page when streaming an export straight from disk
+EXPORT_PAGE_SIZE = 500
+
+# Player leaderboard tables
+LEADERBOARD_TABLES = ('top_scorers', 'live_players')
+
+# Sort key of exported rows; rows without a score sort last instead of
+# dropping out of the keyset comparisons, where NULL never matches.
+# init_db indexes it with id so export pages are read in index order.
+_EXPORT_SCORE = 'COALESCE(custom_score, -1e308)'
+_EXPORT_NO_SCORE = -1e308
+
+# Rolling aggregate tables, maintained incrementally from the game history
+AGGREGATE_TABLES = ('player_aggregates', 'team_aggregates')
+
+# Tables published to the in-memory read replica
+REPLICA_TABLES = LEADERBOARD_TABLES + ('games',) + AGGREGATE_TABLES
+
+# Rolling aggregate spans and their length in days; the season span runs
+# from the first day of SEASON_START_MONTH
+ROLLING_SPANS = {'7d': 7, '30d': 30, 'season': None}
+SEASON_START_MONTH = 10
+
+# Per-game columns summed into the rolling aggregates
+AGGREGATE_COLUMNS = (
+    'min_numeric', 'points', 'offensive_rebounds', 'defensive_rebounds', 'assists', 'steals', 'blocks',
+    'turnovers', 'field_goal_made', 'field_goal_attempts', 'three_point_made', 'three_point_attempts',
+    'personal_fouls', 'plus_minus', 'custom_score'
 )
 
-DB_NAME = 'nba_scores.db'
+# Game status codes, as ScoreboardV2 and the live box score report them
+GAME_SCHEDULED, GAME_LIVE, GAME_FINAL = 1, 2, 3
+
+# Order each replica table is read in, best players first by default
+_SNAPSHOT_ORDER = {
+    'games': 'game_date DESC, game_id',
+    'player_aggregates': 'span, custom_score / games DESC',
+    'team_aggregates': 'span, custom_score / games DESC'
+}
+
+# When each replica table last changed; tables not listed use their rows' own save time
+_SNAPSHOT_MODIFIED = {
+    # Saved with every version bump, so saves that only remove rows still move it
+    'live_players': "SELECT COALESCE((SELECT saved_at FROM data_freshness WHERE name = 'live_players'), "
+                    "(SELECT MAX(timestamp) FROM live_players))",
+    'top_scorers': "SELECT COALESCE((SELECT saved_at FROM data_freshness WHERE name = 'top_scorers'), "
+                   "(SELECT MAX(update_time) FROM updates))",
+    'games': "SELECT MAX(updated_at) FROM games",
+    'player_aggregates': "SELECT MAX(updated_at) FROM aggregate_windows",
+    'team_aggregates': "SELECT MAX(updated_at) FROM aggregate_windows"
+}
+
+# Rows of a leaderboard table as plain sqlite3 tuples, in column order
+TablePage = namedtuple('TablePage', ['columns', 'rows'])
+
+# Where the data last saved to a table came from: the ingestion trace that
+# saved it, when that cycle's oldest upstream response was fetched, the
+# upstream feed's own timestamp when it has one, and when it was saved
+DataFreshness = namedtuple('DataFreshness', ['trace_id', 'fetched_at', 'source_time', 'saved_at'])
+
+# Immutable copy of a leaderboard table as it was after the last save
+ReplicaSnapshot = namedtuple('ReplicaSnapshot', ['columns', 'rows', 'version', 'modified_at', 'published_at',
+                                                 'freshness'], defaults=(None,))
+
+# The read replica: request handlers only ever read from here, never from disk.
+# Snapshots are replaced wholesale under the lock, so readers always see a
+# complete leaderboard even while the scheduler is writing.
+_replica_lock = threading.Lock()
+_replica = {}
+_replica_last_update = None
+_replica_loaded = False
+
+# Callbacks run with (table, snapshot) after each snapshot is published
+_replica_listeners = []
 
 def get_db_connection(max_retries=5, retry_delay=1.0):
     """Get a database connection with retry logic for locked database"""
@@ -33,6 +106,212 @@ def get_db_connection(max_retries=5, retry_delay=1.0):
     # If we get here, we've exhausted our retries
     raise sqlite3.OperationalError("Could not access database after multiple retries - database is locked")
 
+def _read_table_snapshot(conn, table):
+    """Read a replica table into an immutable snapshot"""
+    order = _SNAPSHOT_ORDER.get(table, 'custom_score DESC')
+    with DB_READ_LATENCY.time(table=table):
+        cursor = conn.execute(f"SELECT * FROM {table} ORDER BY {order}")
+        columns = tuple(description[0] for description in cursor.description)
+        rows = tuple(cursor.fetchall())
+    version = conn.execute("SELECT version FROM data_versions WHERE name = ?", (table,)).fetchone()
+    
+    modified_at = conn.execute(_SNAPSHOT_MODIFIED.get(table, f"SELECT MAX(timestamp) FROM {table}")).fetchone()[0]
+    freshness = conn.execute("SELECT trace_id, fetched_at, source_time, saved_at FROM data_freshness WHERE name = ?",
+                             (table,)).fetchone()
+    
+    return ReplicaSnapshot(columns, rows, version[0] if version else 0, modified_at, datetime.now(),
+                           DataFreshness(*freshness) if freshness else None)
+
+def _bump_data_version(cursor, table):
+    """Increment the data version of a table inside the caller's transaction"""
+    cursor.execute('''
+    INSERT INTO data_versions (name, version) VALUES (?, 1)
+    ON CONFLICT(name) DO UPDATE SET version = version + 1
+    ''', (table,))
+
+def _record_freshness(cursor, tables):
+    """Stamp tables with the ingestion trace and upstream fetch behind the data being saved, in the caller's transaction"""
+    trace = tracing.current()
+    fetched_at = datetime.fromtimestamp(trace.fetched_at) if trace is not None and trace.fetched_at else None
+    cursor.executemany('''
+    INSERT OR REPLACE INTO data_freshness (name, trace_id, fetched_at, source_time, saved_at)
+    VALUES (?, ?, ?, ?, ?)
+    ''', [(table, trace.trace_id if trace else None, fetched_at, trace.source_time if trace else None, datetime.now())
+          for table in tables])
+
+def _observe_write(table, write_start):
+    """Record the time since write_start as a write of a table, in the metrics and the current trace"""
+    elapsed = time.perf_counter() - write_start
+    DB_WRITE_LATENCY.observe(elapsed, table=table)
+    tracing.record('db_write', elapsed)
+
+def publish_replica(conn=None, tables=REPLICA_TABLES):
+    """Copy the given tables from disk into the read replica"""
+    global _replica_last_update, _replica_loaded
+    try:
+        publish_start = time.perf_counter()
+        own_connection = conn is None
+        if own_connection:
+            conn = get_db_connection()
+            # Read rows and versions in one transaction, as another process may be saving
+            conn.isolation_level = None
+            conn.execute("BEGIN")
+
+        snapshots = {table: _read_table_snapshot(conn, table) for table in tables}
+        last_update = conn.execute("SELECT MAX(update_time) FROM updates").fetchone()[0]
+
+        if own_connection:
+            conn.execute("COMMIT")
+            conn.close()
+
+        with _replica_lock:
+            # A slow publish must never replace a snapshot of a newer version
+            snapshots = {table: snapshot for table, snapshot in snapshots.items()
+                         if table not in _replica or _replica[table].version <= snapshot.version}
+            # New versions of tables already loaded, which are what the publish lag measures
+            new_versions = [table for table, snapshot in snapshots.items()
+                            if table in _replica and _replica[table].version < snapshot.version]
+            _replica.update(snapshots)
+            _replica_last_update = last_update
+            _replica_loaded = True
+
+        logging.debug(f"Published read replica for {', '.join(tables)}")
+        
+        for table, snapshot in snapshots.items():
+            for listener in _replica_listeners:
+                try:
+                    listener(table, snapshot)
+                except Exception as e:
+                    logging.error(f"Error in replica listener for {table}: {str(e)}")
+        
+        tracing.record('publish', time.perf_counter() - publish_start)
+        for table in new_versions:
+            freshness = snapshots[table].freshness
+            if freshness is not None and freshness.fetched_at:
+                fetched_at = datetime.fromisoformat(str(freshness.fetched_at))
+                DATA_PUBLISH_LAG.observe(max(0.0, (datetime.now() - fetched_at).total_seconds()), table=table)
+        return True
+
+    except Exception as e:
+        logging.error(f"Error publishing read replica: {str(e)}")
+        return False
+
+def add_replica_listener(listener):
+    """Register a callback run with (table, snapshot) after every publish"""
+    _replica_listeners.append(listener)
+
+def get_replica_snapshot(table):
+    """Return the current replica snapshot of a table"""
+    return get_replica_snapshots((table,))[0]
+
+def get_replica_snapshots(tables):
+    """Return the current replica snapshots of several tables as one consistent view"""
+    missing = [table for table in tables if table not in _replica]
+    if missing:
+        # First read in this process - load whatever was last persisted
+        if not os.path.exists(DB_NAME):
+            logging.warning(f"Database file {DB_NAME} does not exist")
+            return tuple(ReplicaSnapshot((), (), 0, None, None) for _ in tables)
+        publish_replica(tables=tuple(missing))
+
+    with _replica_lock:
+        return tuple(_replica.get(table, ReplicaSnapshot((), (), 0, None, None)) for table in tables)
+
+def get_data_version(table):
+    """Get the version of the leaderboard currently held in the read replica"""
+    return get_replica_snapshot(table).version
+
+def _read_versions(conn, names):
+    placeholders = ', '.join('?' for _ in names)
+    cursor = conn.execute(f"SELECT name, version FROM data_versions WHERE name IN ({placeholders})", tuple(names))
+    return dict(cursor.fetchall())
+
+def poll_replica():
+    """Republish any table that another process has saved since this replica was published"""
+    try:
+        conn = get_db_connection()
+        try:
+            versions = _read_versions(conn, REPLICA_TABLES)
+        finally:
+            conn.close()
+
+        with _replica_lock:
+            changed = tuple(table for table in REPLICA_TABLES
+                            if table not in _replica or _replica[table].version != versions.get(table, 0))
+        if changed:
+            publish_replica(tables=changed)
+        return changed
+
+    except Exception as e:
+        logging.error(f"Error polling for new data versions: {str(e)}")
+        return ()
+
+def request_refresh(name):
+    """Ask the ingestion leader for a refresh, returning the ticket it will acknowledge.
+
+    While an earlier request of name is still waiting for the leader, its
+    ticket is returned and nothing is written, so however many clients ask,
+    followers write at most one ticket per refresh the leader serves.
+    """
+    requested_key, handled_key = f"refresh_requested:{name}", f"refresh_handled:{name}"
+    conn = get_db_connection()
+    try:
+        versions = _read_versions(conn, (requested_key, handled_key))
+        if versions.get(requested_key, 0) > versions.get(handled_key, 0):
+            return versions[requested_key]
+        
+        # Another follower may have asked since the read; only the first ticket is written
+        conn.execute('''
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+        WHERE version <= COALESCE((SELECT version FROM data_versions WHERE name = ?), 0)
+        ''', (requested_key, handled_key))
+        ticket = _read_versions(conn, (requested_key,))[requested_key]
+        conn.commit()
+        return ticket
+    finally:
+        conn.close()
+
+def get_refresh_tickets(names):
+    """Latest (requested, handled) refresh tickets of each name"""
+    conn = get_db_connection()
+    try:
+        keys = [f"{kind}:{name}" for name in names for kind in ('refresh_requested', 'refresh_handled')]
+        versions = _read_versions(conn, keys)
+    finally:
+        conn.close()
+    return {name: (versions.get(f"refresh_requested:{name}", 0), versions.get(f"refresh_handled:{name}", 0))
+            for name in names}
+
+def mark_refresh_handled(name, ticket):
+    """Acknowledge every refresh request of name up to ticket"""
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+        INSERT INTO data_versions (name, version) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET version = MAX(version, excluded.version)
+        ''', (f"refresh_handled:{name}", ticket))
+        conn.commit()
+    finally:
+        conn.close()
+
+def snapshot_to_frame(snapshot):
+    """Build a DataFrame from a replica snapshot"""
+    import pandas as pd
+    if not snapshot.rows:
+        return pd.DataFrame(columns=list(snapshot.columns))
+    return pd.DataFrame.from_records(snapshot.rows, columns=list(snapshot.columns))
+
+def ensure_player_key(conn, table):
+    """Create the unique (game_id, player_id) index saves of a player table upsert on, first dropping duplicate pairs"""
+    conn.execute(f'''
+    DELETE FROM {table}
+    WHERE game_id IS NOT NULL AND player_id IS NOT NULL AND id NOT IN (
+        SELECT MIN(id) FROM {table} GROUP BY game_id, player_id
+    )
+    ''')
+    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_game_player ON {table} (game_id, player_id)")
+
 def init_db():
     """Initialize the database with required tables"""
     try:
@@ -43,6 +322,8 @@ def init_db():
             conn.execute('''
             CREATE TABLE IF NOT EXISTS top_scorers (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id TEXT,
+                player_id INTEGER,
                 player_name TEXT,
                 team TEXT,
                 minutes TEXT,
@@ -70,6 +351,8 @@ def init_db():
             conn.execute('''
             CREATE TABLE IF NOT EXISTS live_players (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id TEXT,
+                player_id INTEGER,
                 player_name TEXT,
                 team TEXT,
                 minutes TEXT,
@@ -92,6 +375,123 @@ def init_db():
             )
             ''')
             
+            # Key player rows by game and player, which every save upserts on.
+            # Files from before those columns existed get it from the migration.
+            for table in ('top_scorers', 'live_players'):
+                columns = {column[1] for column in conn.execute(f"PRAGMA table_info({table})")}
+                if {'game_id', 'player_id'} <= columns:
+                    ensure_player_key(conn, table)
+            
+            # Index the export sort key so each page is a range scan, not a sort
+            for table in LEADERBOARD_TABLES:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_export ON {table} ({_EXPORT_SCORE}, id)")
+            
+            # Create a table of the games on recent scoreboards, one row per game
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS games (
+                game_id TEXT PRIMARY KEY,
+                game_date TEXT,
+                home_team TEXT,
+                away_team TEXT,
+                status INTEGER,
+                status_text TEXT,
+                period INTEGER,
+                clock TEXT,
+                home_score INTEGER,
+                away_score INTEGER,
+                updated_at DATETIME
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_games_status ON games (status, game_date)")
+            
+            # Create a table of every player line of every final game seen
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS player_game_stats (
+                game_id TEXT,
+                player_id INTEGER,
+                game_date TEXT,
+                player_name TEXT,
+                team TEXT,
+                minutes TEXT,
+                min_numeric REAL,
+                points INTEGER,
+                offensive_rebounds INTEGER,
+                defensive_rebounds INTEGER,
+                assists INTEGER,
+                steals INTEGER,
+                blocks INTEGER,
+                turnovers INTEGER,
+                field_goal_made INTEGER,
+                field_goal_attempts INTEGER,
+                three_point_made INTEGER,
+                three_point_attempts INTEGER,
+                personal_fouls INTEGER,
+                plus_minus INTEGER,
+                custom_score REAL,
+                PRIMARY KEY (game_id, player_id)
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_player_game_stats_date ON player_game_stats (game_date)")
+            
+            # Create tables of per-span sums over the game history, one row per player or team
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS player_aggregates (
+                span TEXT,
+                player_id INTEGER,
+                player_name TEXT,
+                team TEXT,
+                games INTEGER,
+                min_numeric REAL,
+                points INTEGER,
+                offensive_rebounds INTEGER,
+                defensive_rebounds INTEGER,
+                assists INTEGER,
+                steals INTEGER,
+                blocks INTEGER,
+                turnovers INTEGER,
+                field_goal_made INTEGER,
+                field_goal_attempts INTEGER,
+                three_point_made INTEGER,
+                three_point_attempts INTEGER,
+                personal_fouls INTEGER,
+                plus_minus INTEGER,
+                custom_score REAL,
+                PRIMARY KEY (span, player_id)
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS team_aggregates (
+                span TEXT,
+                team TEXT,
+                games INTEGER,
+                min_numeric REAL,
+                points INTEGER,
+                offensive_rebounds INTEGER,
+                defensive_rebounds INTEGER,
+                assists INTEGER,
+                steals INTEGER,
+                blocks INTEGER,
+                turnovers INTEGER,
+                field_goal_made INTEGER,
+                field_goal_attempts INTEGER,
+                three_point_made INTEGER,
+                three_point_attempts INTEGER,
+                personal_fouls INTEGER,
+                plus_minus INTEGER,
+                custom_score REAL,
+                PRIMARY KEY (span, team)
+            )
+            ''')
+            
+            # Create a table of the first game date each aggregate span currently covers
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS aggregate_windows (
+                span TEXT PRIMARY KEY,
+                start_date TEXT,
+                updated_at DATETIME
+            )
+            ''')
+            
             # Create a table to track updates
             conn.execute('''
             CREATE TABLE IF NOT EXISTS updates (
@@ -100,6 +500,25 @@ def init_db():
                 games_processed INTEGER
             )
             ''')
+            
+            # Create a table of where each replica table's data came from, stamped on every save
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS data_freshness (
+                name TEXT PRIMARY KEY,
+                trace_id TEXT,
+                fetched_at DATETIME,
+                source_time TEXT,
+                saved_at DATETIME
+            )
+            ''')
+            
+            # Create a table of data versions, bumped on every leaderboard save
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
         
         logging.info("Database initialized successfully")
         return True
@@ -111,39 +530,118 @@ def init_db():
 def clear_live_data():
     """Clear all live player data when no games are active"""
     try:
+        write_start = time.perf_counter()
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Clear the live_players table
+        # Clear the live_players table; when it is already empty nothing changes
         cursor.execute("DELETE FROM live_players")
+        cleared = cursor.rowcount
+        if cleared > 0:
+            _bump_data_version(cursor, 'live_players')
+            _record_freshness(cursor, ('live_players',))
         
         conn.commit()
+        _observe_write('live_players', write_start)
+        if cleared > 0:
+            publish_replica(conn, tables=('live_players',))
         conn.close()
         
-        logging.info("Cleared live game data from database")
+        logging.info(f"Cleared {cleared} live player records from database")
         return True
         
     except Exception as e:
         logging.error(f"Error clearing live data: {str(e)}")
         return False
 
-def save_top_scorers(top_scorers_df):
-    """Save top scorers to database"""
+# Live player columns an upsert compares and updates; the game and player key them
+_LIVE_VALUE_COLUMNS = (
+    'player_name', 'team', 'minutes', 'points', 'offensive_rebounds', 'defensive_rebounds', 'assists', 'steals',
+    'blocks', 'turnovers', 'field_goal_made', 'field_goal_attempts', 'three_point_made', 'three_point_attempts',
+    'personal_fouls', 'plus_minus', 'custom_score'
+)
+_TOP_SCORER_VALUE_COLUMNS = (
+    'player_name', 'team', 'minutes', 'points', 'offensive_rebounds', 'defensive_rebounds', 'assists', 'steals',
+    'blocks', 'turnovers', 'field_goal_made', 'field_goal_attempts', 'three_point_made', 'three_point_attempts',
+    'personal_fouls', 'free_throw_attempts', 'plus_minus', 'custom_score'
+)
+
+def _player_upsert(table, value_columns):
+    """Insert a new player row or update one whose line moved on.
+
+    Rows are (game_id, player_id, *value_columns, timestamp). An unchanged
+    row is not touched, so it costs no page or WAL writes.
+    """
+    columns = ('game_id', 'player_id') + value_columns + ('timestamp',)
+    return '''
+    INSERT INTO {table} ({columns}) VALUES ({placeholders})
+    ON CONFLICT(game_id, player_id) DO UPDATE SET {assignments}, timestamp = excluded.timestamp
+    WHERE ({stored}) IS NOT ({incoming})
+    '''.format(table=table, columns=', '.join(columns), placeholders=', '.join('?' for _ in columns),
+               assignments=', '.join(f"{column} = excluded.{column}" for column in value_columns),
+               stored=', '.join(f"{table}.{column}" for column in value_columns),
+               incoming=', '.join(f"excluded.{column}" for column in value_columns))
+
+_LIVE_UPSERT = _player_upsert('live_players', _LIVE_VALUE_COLUMNS)
+_TOP_SCORER_UPSERT = _player_upsert('top_scorers', _TOP_SCORER_VALUE_COLUMNS)
+
+def _delete_other_players(cursor, table, records):
+    """Delete the rows of a player table whose (game_id, player_id) is not among the records'.
+
+    The keys go through a temporary table that never reaches the WAL, so
+    this is one statement however many players there are. Returns the
+    number of rows deleted.
+    """
+    cursor.execute('''
+    CREATE TEMP TABLE IF NOT EXISTS player_keys (game_id TEXT, player_id INTEGER, PRIMARY KEY (game_id, player_id))
+    ''')
+    cursor.execute("DELETE FROM temp.player_keys")
+    cursor.executemany("INSERT OR IGNORE INTO temp.player_keys (game_id, player_id) VALUES (?, ?)",
+                       [(record[0], record[1]) for record in records])
+    cursor.execute(f'''
+    DELETE FROM {table}
+    WHERE NOT EXISTS (
+        SELECT 1 FROM temp.player_keys
+        WHERE player_keys.game_id = {table}.game_id AND player_keys.player_id = {table}.player_id
+    )
+    ''')
+    return cursor.rowcount
+
+def _row_id(row, column, cast):
+    """A game or player ID from a stats row, None when the source did not carry it"""
+    value = row.get(column)
+    if value is None or value != value:
+        return None
+    return cast(value)
+
+def save_top_scorers(top_scorers_df, final=True):
+    """Upsert the top scorers leaderboard keyed by game and player, writing only the rows that changed.
+
+    Players no longer on the board are deleted, and a new version is
+    published only when the board changed. Partial boards, saved while a
+    night's box scores are still arriving, are not logged as updates; the
+    final one is, whether or not it changed.
+    """
     try:
         if top_scorers_df.empty:
             logging.warning("Attempted to save empty dataframe")
             return False
             
+        write_start = time.perf_counter()
         conn = get_db_connection()
-        
-        # First, clear existing data to avoid duplicates
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM top_scorers")
-        conn.commit()
         
         # Convert DataFrame to database records
+        now = datetime.now()
         records = []
+        skipped = 0
         for _, row in top_scorers_df.iterrows():
+            game_id = _row_id(row, 'GAME_ID', str)
+            player_id = _row_id(row, 'PLAYER_ID', int)
+            if game_id is None or player_id is None:
+                skipped += 1
+                continue
+            
             # Get plus_minus value - handle both uppercase and lowercase column names
             plus_minus_value = 0
             if 'PLUS_MINUS' in row:
@@ -152,6 +650,8 @@ def save_top_scorers(top_scorers_df):
                 plus_minus_value = int(row['plus_minus'])
                 
             records.append((
+                game_id,
+                player_id,
                 row['PLAYER_NAME'],
                 row['TEAM_ABBREVIATION'],
                 row['MIN'],
@@ -170,29 +670,34 @@ def save_top_scorers(top_scorers_df):
                 int(row.get('FTA', 0)),  # Use get with default in case FTA is no longer included
                 plus_minus_value,  # Use the extracted plus_minus value
                 float(row['CUSTOM_SCORE']),
-                datetime.now()
+                now
             ))
         
-        # Insert records with existing columns only
-        cursor.executemany('''
-        INSERT INTO top_scorers (
-            player_name, team, minutes, points, offensive_rebounds, defensive_rebounds, assists, 
-            steals, blocks, turnovers, field_goal_made, field_goal_attempts, 
-            three_point_made, three_point_attempts, personal_fouls, free_throw_attempts,
-            plus_minus, custom_score, timestamp
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', records)
+        if skipped:
+            logging.warning(f"Skipped {skipped} top scorer rows without a game or player ID")
         
-        # Log update
-        cursor.execute('''
-        INSERT INTO updates (update_time, games_processed)
-        VALUES (?, ?)
-        ''', (datetime.now(), len(records)))
+        # Upsert and delete in one transaction, so no reader ever sees a half-saved board
+        cursor.executemany(_TOP_SCORER_UPSERT, records)
+        changed = cursor.rowcount
+        removed = _delete_other_players(cursor, 'top_scorers', records)
+        
+        if changed > 0 or removed > 0:
+            _bump_data_version(cursor, 'top_scorers')
+            _record_freshness(cursor, ('top_scorers',))
+        if final:
+            cursor.execute('''
+            INSERT INTO updates (update_time, games_processed)
+            VALUES (?, ?)
+            ''', (now, len(records)))
         
         conn.commit()
+        _observe_write('top_scorers', write_start)
+        DB_ROWS_WRITTEN.inc(max(changed, 0) + removed, table='top_scorers')
+        if changed > 0 or removed > 0 or final:
+            publish_replica(conn, tables=('top_scorers',))
         conn.close()
         
-        logging.info(f"Saved {len(records)} player records to database")
+        logging.info(f"Saved {changed} changed top scorer records of {len(records)}, removed {removed}")
         return True
         
     except Exception as e:
@@ -200,27 +705,37 @@ def save_top_scorers(top_scorers_df):
         return False
 
 def save_live_data(live_player_data):
-    """Save live player data to database"""
+    """Upsert live player rows keyed by game and player, writing only the rows that changed.
+
+    Unchanged rows are left alone, and the rows of players no longer on the
+    live leaderboard, including every player of a game that ended, are
+    deleted. A tick that changes nothing writes nothing and publishes no
+    new version.
+    """
     try:
         if live_player_data.empty:
             logging.warning("Attempted to save empty live data")
             return False
         
-        # Log sample data for debugging
-        if not live_player_data.empty:
-            sample_row = live_player_data.iloc[0].to_dict()
-            logging.info(f"Sample data before saving: {sample_row}")
+        # Log sample data now and then, when debugging
+        log_sampled('live_sample_row', lambda: f"Sample data before saving: {live_player_data.iloc[0].to_dict()}")
         
         # Connect to the database
+        write_start = time.perf_counter()
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Clear existing live data
-        cursor.execute("DELETE FROM live_players")
-        
         # Convert DataFrame to records
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
         records = []
+        skipped = 0
         for _, row in live_player_data.iterrows():
+            game_id = _row_id(row, 'GAME_ID', str)
+            player_id = _row_id(row, 'PLAYER_ID', int)
+            if game_id is None or player_id is None:
+                skipped += 1
+                continue
+            
             # Ensure we're using MIN, not MIN_NUMERIC for display
             minutes_display = row['MIN'] if 'MIN' in row else '0:00'
             
@@ -232,6 +747,8 @@ def save_live_data(live_player_data):
                 plus_minus_value = int(row['plus_minus'])
             
             record = (
+                game_id,
+                player_id,
                 row['PLAYER_NAME'],
                 row['TEAM_ABBREVIATION'],
                 minutes_display,  # Use formatted minutes string
@@ -249,44 +766,325 @@ def save_live_data(live_player_data):
                 int(row['PF']),
                 plus_minus_value,  # Use the extracted plus_minus value
                 float(row['CUSTOM_SCORE']),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+                now
             )
             records.append(record)
         
-        # Insert records
-        cursor.executemany('''
-        INSERT INTO live_players (
-            player_name, team, minutes, points, offensive_rebounds, defensive_rebounds, assists, 
-            steals, blocks, turnovers, field_goal_made, field_goal_attempts, 
-            three_point_made, three_point_attempts, personal_fouls, plus_minus,
-            custom_score, timestamp
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', records)
+        if skipped:
+            logging.warning(f"Skipped {skipped} live player rows without a game or player ID")
+        
+        cursor.executemany(_LIVE_UPSERT, records)
+        changed = cursor.rowcount
+        
+        # Remove players who dropped off the leaderboard and games that ended
+        removed = _delete_other_players(cursor, 'live_players', records)
+        
+        if changed > 0 or removed > 0:
+            _bump_data_version(cursor, 'live_players')
+            _record_freshness(cursor, ('live_players',))
         
         # Commit changes
         conn.commit()
+        _observe_write('live_players', write_start)
+        DB_ROWS_WRITTEN.inc(max(changed, 0) + removed, table='live_players')
+        if changed > 0 or removed > 0:
+            publish_replica(conn, tables=('live_players',))
         conn.close()
         
-        logging.info(f"Saved {len(records)} live player records to database")
+        logging.info(f"Saved {changed} changed live player records of {len(records)}, removed {removed}")
         return True
         
     except Exception as e:
         logging.error(f"Error saving live player data: {str(e)}")
         return False
 
-def get_latest_live_data():
-    """Retrieve the latest live player data from database"""
+def save_games(games):
+    """Upsert game rows, bumping the games version only when one of them changed"""
     try:
-        if not os.path.exists(DB_NAME):
-            logging.warning(f"Database file {DB_NAME} does not exist")
-            return pd.DataFrame()
-            
+        if not games:
+            return False
+        
+        write_start = time.perf_counter()
         conn = get_db_connection()
-        query = "SELECT * FROM live_players ORDER BY custom_score DESC"
-        df = pd.read_sql_query(query, conn)
+        cursor = conn.cursor()
+        
+        now = datetime.now()
+        records = [(game['game_id'], game.get('game_date'), game.get('home_team'), game.get('away_team'),
+                    game.get('status'), game.get('status_text'), game.get('period'), game.get('clock'),
+                    game.get('home_score'), game.get('away_score'), now)
+                   for game in games]
+        
+        # Fields a source did not report keep their stored value, and a
+        # game that has not moved on is left alone, so its version stays put
+        cursor.executemany('''
+        INSERT INTO games (
+            game_id, game_date, home_team, away_team, status, status_text,
+            period, clock, home_score, away_score, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(game_id) DO UPDATE SET
+            game_date = COALESCE(excluded.game_date, game_date),
+            home_team = COALESCE(excluded.home_team, home_team),
+            away_team = COALESCE(excluded.away_team, away_team),
+            status = COALESCE(excluded.status, status),
+            status_text = COALESCE(excluded.status_text, status_text),
+            period = COALESCE(excluded.period, period),
+            clock = COALESCE(excluded.clock, clock),
+            home_score = COALESCE(excluded.home_score, home_score),
+            away_score = COALESCE(excluded.away_score, away_score),
+            updated_at = excluded.updated_at
+        WHERE (COALESCE(excluded.status, games.status), COALESCE(excluded.status_text, games.status_text),
+               COALESCE(excluded.period, games.period), COALESCE(excluded.clock, games.clock),
+               COALESCE(excluded.home_score, games.home_score), COALESCE(excluded.away_score, games.away_score))
+              IS NOT (games.status, games.status_text, games.period, games.clock,
+                      games.home_score, games.away_score)
+        ''', records)
+        changed = cursor.rowcount
+        
+        if changed > 0:
+            _bump_data_version(cursor, 'games')
+            _record_freshness(cursor, ('games',))
+        conn.commit()
+        _observe_write('games', write_start)
+        DB_ROWS_WRITTEN.inc(max(changed, 0), table='games')
+        if changed > 0:
+            publish_replica(conn, tables=('games',))
+        conn.close()
+        
+        logging.info(f"Saved {changed} changed games of {len(records)}")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Error saving games: {str(e)}")
+        return False
+
+def _span_start(span, today):
+    """First game date a rolling span covers on a given day"""
+    days = ROLLING_SPANS[span]
+    if days is None:
+        season_year = today.year if today.month >= SEASON_START_MONTH else today.year - 1
+        return date(season_year, SEASON_START_MONTH, 1).isoformat()
+    return (today - timedelta(days=days - 1)).isoformat()
+
+def _fold_history(cursor, span, where, params, sign, source='player_game_stats'):
+    """Add (sign 1) or subtract (sign -1) the history rows matching where into a span's aggregates"""
+    sums = ', '.join(f"SUM({column})" for column in AGGREGATE_COLUMNS)
+    columns = ', '.join(('games',) + AGGREGATE_COLUMNS)
+    placeholders = ', '.join('?' for _ in ('games',) + AGGREGATE_COLUMNS)
+    totals = ', '.join(f"{column} = {column} + excluded.{column}" for column in ('games',) + AGGREGATE_COLUMNS)
+    
+    players = cursor.execute(f"""
+    SELECT player_id, player_name, team, COUNT(*), {sums}
+    FROM {source} WHERE {where} GROUP BY player_id
+    """, params).fetchall()
+    cursor.executemany(f"""
+    INSERT INTO player_aggregates (span, player_id, player_name, team, {columns})
+    VALUES (?, ?, ?, ?, {placeholders})
+    ON CONFLICT(span, player_id) DO UPDATE SET {totals},
+        player_name = CASE WHEN excluded.games > 0 THEN excluded.player_name ELSE player_name END,
+        team = CASE WHEN excluded.games > 0 THEN excluded.team ELSE team END
+    """, [(span, player_id, name, team, *(sign * value for value in values))
+          for player_id, name, team, *values in players])
+    
+    teams = cursor.execute(f"""
+    SELECT team, COUNT(DISTINCT game_id), {sums}
+    FROM {source} WHERE {where} GROUP BY team
+    """, params).fetchall()
+    cursor.executemany(f"""
+    INSERT INTO team_aggregates (span, team, {columns})
+    VALUES (?, ?, {placeholders})
+    ON CONFLICT(span, team) DO UPDATE SET {totals}
+    """, [(span, team, *(sign * value for value in values)) for team, *values in teams])
+    
+    if sign < 0:
+        cursor.execute("DELETE FROM player_aggregates WHERE span = ? AND games <= 0", (span,))
+        cursor.execute("DELETE FROM team_aggregates WHERE span = ? AND games <= 0", (span,))
+
+def _advance_span(cursor, span, today):
+    """Move a span's start up to today's, subtracting the games that left it. Returns whether it moved."""
+    start = _span_start(span, today)
+    current = cursor.execute("SELECT start_date FROM aggregate_windows WHERE span = ?", (span,)).fetchone()
+    if current is not None and current[0] == start:
+        return False
+    
+    if current is None or start < current[0]:
+        # First run, or the span grew backwards: rebuild it from the history
+        cursor.execute("DELETE FROM player_aggregates WHERE span = ?", (span,))
+        cursor.execute("DELETE FROM team_aggregates WHERE span = ?", (span,))
+        _fold_history(cursor, span, "game_date >= ?", (start,), 1)
+    else:
+        _fold_history(cursor, span, "game_date >= ? AND game_date < ?", (current[0], start), -1)
+    
+    cursor.execute('''
+    INSERT INTO aggregate_windows (span, start_date) VALUES (?, ?)
+    ON CONFLICT(span) DO UPDATE SET start_date = excluded.start_date
+    ''', (span, start))
+    return True
+
+# Columns of a history line that a stat correction can change; a line keeps
+# the game date it was first recorded with, so spans always agree on it
+_HISTORY_VALUE_COLUMNS = ('player_name', 'team', 'minutes') + AGGREGATE_COLUMNS
+
+# Records a new history line or corrects one whose stats changed; an
+# unchanged line is not touched
+_HISTORY_UPSERT = '''
+INSERT INTO player_game_stats (game_id, player_id, game_date, {columns}) VALUES ({placeholders})
+ON CONFLICT(game_id, player_id) DO UPDATE SET {assignments}
+WHERE ({stored}) IS NOT ({incoming})
+'''.format(columns=', '.join(_HISTORY_VALUE_COLUMNS),
+           placeholders=', '.join('?' for _ in ('game_id', 'player_id', 'game_date') + _HISTORY_VALUE_COLUMNS),
+           assignments=', '.join(f"{column} = excluded.{column}" for column in _HISTORY_VALUE_COLUMNS),
+           stored=', '.join(f"player_game_stats.{column}" for column in _HISTORY_VALUE_COLUMNS),
+           incoming=', '.join(f"excluded.{column}" for column in _HISTORY_VALUE_COLUMNS))
+
+def save_game_history(player_stats=None):
+    """Record the player lines of final games and fold them into the rolling aggregates.
+
+    Box scores of games already in the history are compared line by line,
+    and a game whose lines changed, such as by a stat correction, has its
+    old lines subtracted from the aggregates and the new ones added. Each
+    span otherwise only adds new games and subtracts the ones its start
+    date has moved past, so no update scans the whole history. Called
+    without stats, it just moves the spans on to today.
+    """
+    try:
+        write_start = time.perf_counter()
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        today = date.today()
+        
+        advanced = [span for span in ROLLING_SPANS if _advance_span(cursor, span, today)]
+        
+        changed_game_ids = []
+        new_game_ids = []
+        written = 0
+        if player_stats is not None and not player_stats.empty and 'GAME_ID' in player_stats.columns:
+            game_ids = player_stats['GAME_ID'].dropna().unique().tolist()
+            placeholders = ', '.join('?' for _ in game_ids)
+            game_dates = dict(cursor.execute(
+                f"SELECT game_id, game_date FROM games WHERE game_id IN ({placeholders})", game_ids))
+            
+            records = []
+            for _, row in player_stats[player_stats['GAME_ID'].isin(game_ids)].iterrows():
+                player_id = _row_id(row, 'PLAYER_ID', int)
+                if player_id is None:
+                    continue
+                records.append((
+                    row['GAME_ID'], player_id, game_dates.get(row['GAME_ID']) or today.isoformat(),
+                    row['PLAYER_NAME'], row['TEAM_ABBREVIATION'], row['MIN'], float(row['MIN_NUMERIC']),
+                    int(row['PTS']), int(row['OREB']), int(row['DREB']), int(row['AST']), int(row['STL']),
+                    int(row['BLK']), int(row['TO']), int(row['FGM']), int(row['FGA']), int(row['FG3M']),
+                    int(row['FG3A']), int(row['PF']), int(row.get('PLUS_MINUS', 0)), float(row['CUSTOM_SCORE'])
+                ))
+            
+            # Keep the lines these games had before, to subtract those of corrected games
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS previous_lines AS SELECT * FROM player_game_stats WHERE 0")
+            cursor.execute("DELETE FROM temp.previous_lines")
+            cursor.execute(
+                f"INSERT INTO temp.previous_lines SELECT * FROM player_game_stats WHERE game_id IN ({placeholders})",
+                game_ids)
+            known = {row[0] for row in cursor.execute("SELECT DISTINCT game_id FROM temp.previous_lines")}
+            
+            cursor.executemany(_HISTORY_UPSERT, records)
+            written = max(cursor.rowcount, 0)
+            
+            if written:
+                stored = ', '.join(f"lines.{column}" for column in _HISTORY_VALUE_COLUMNS)
+                previous = ', '.join(f"previous_lines.{column}" for column in _HISTORY_VALUE_COLUMNS)
+                changed_game_ids = [row[0] for row in cursor.execute(f'''
+                SELECT DISTINCT game_id FROM player_game_stats AS lines
+                WHERE game_id IN ({placeholders}) AND NOT EXISTS (
+                    SELECT 1 FROM temp.previous_lines
+                    WHERE previous_lines.game_id = lines.game_id AND previous_lines.player_id = lines.player_id
+                    AND ({previous}) IS ({stored})
+                )
+                ''', game_ids)]
+                new_game_ids = [game_id for game_id in changed_game_ids if game_id not in known]
+        
+        if changed_game_ids:
+            placeholders = ', '.join('?' for _ in changed_game_ids)
+            for span in ROLLING_SPANS:
+                where = f"game_id IN ({placeholders}) AND game_date >= ?"
+                params = (*changed_game_ids, _span_start(span, today))
+                _fold_history(cursor, span, where, params, -1, source='temp.previous_lines')
+                _fold_history(cursor, span, where, params, 1)
+        
+        if not advanced and not changed_game_ids:
+            conn.close()
+            return True
+        
+        cursor.execute("UPDATE aggregate_windows SET updated_at = ?", (datetime.now(),))
+        for table in AGGREGATE_TABLES:
+            _bump_data_version(cursor, table)
+        _record_freshness(cursor, AGGREGATE_TABLES)
+        
+        conn.commit()
+        _observe_write('player_game_stats', write_start)
+        DB_ROWS_WRITTEN.inc(written, table='player_game_stats')
+        publish_replica(conn, tables=AGGREGATE_TABLES)
+        conn.close()
+        
+        corrected = len(changed_game_ids) - len(new_game_ids)
+        logging.info(f"Added {len(new_game_ids)} games to the history"
+                     + (f", corrected {corrected}" if corrected else "")
+                     + f" ({written} player lines written)"
+                     + (f", moved {', '.join(advanced)} on" if advanced else ""))
+        return True
+        
+    except Exception as e:
+        logging.error(f"Error saving game history: {str(e)}")
+        return False
+
+def iter_table_pages(table, page_size=EXPORT_PAGE_SIZE):
+    """Yield a leaderboard table from disk as pages of at most page_size rows, best first.
+
+    Pages are fetched with keyset pagination inside one read transaction, so
+    the export is a consistent view of the table and memory stays at one page
+    however large the table grows.
+    """
+    if table not in LEADERBOARD_TABLES:
+        raise ValueError(f"Unknown leaderboard table {table}")
+    
+    conn = get_db_connection()
+    try:
+        conn.isolation_level = None
+        conn.execute("BEGIN")
+        
+        last_score, last_id = None, None
+        while True:
+            page_start = time.perf_counter()
+            if last_id is None:
+                cursor = conn.execute(
+                    f"SELECT * FROM {table} ORDER BY {_EXPORT_SCORE} DESC, id DESC LIMIT ?", (page_size,))
+            else:
+                cursor = conn.execute(
+                    f'''SELECT * FROM {table}
+                    WHERE {_EXPORT_SCORE} <= ? AND ({_EXPORT_SCORE} < ? OR id < ?)
+                    ORDER BY {_EXPORT_SCORE} DESC, id DESC LIMIT ?''',
+                    (last_score, last_score, last_id, page_size))
+            
+            columns = tuple(description[0] for description in cursor.description)
+            rows = cursor.fetchall()
+            DB_READ_LATENCY.observe(time.perf_counter() - page_start, table=table)
+            if not rows:
+                return
+            
+            last_score, last_id = rows[-1][columns.index('custom_score')], rows[-1][columns.index('id')]
+            if last_score is None:
+                last_score = _EXPORT_NO_SCORE
+            yield TablePage(columns, rows)
+            
+            if len(rows) < page_size:
+                return
+    finally:
         conn.close()
+
+def get_latest_live_data():
+    """Retrieve the latest live player data from the read replica"""
+    import pandas as pd
+    try:
+        df = snapshot_to_frame(get_replica_snapshot('live_players'))
         
-        logging.info(f"Retrieved {len(df)} live player records from database")
+        logging.debug(f"Retrieved {len(df)} live player records from replica")
         return df
         
     except Exception as e:
@@ -294,18 +1092,12 @@ def get_latest_live_data():
         return pd.DataFrame()
     
 def get_latest_scorers():
-    """Retrieve the latest top scorers from database"""
+    """Retrieve the latest top scorers from the read replica"""
+    import pandas as pd
     try:
-        if not os.path.exists(DB_NAME):
-            logging.warning(f"Database file {DB_NAME} does not exist")
-            return pd.DataFrame()
-            
-        conn = get_db_connection()
-        query = "SELECT * FROM top_scorers ORDER BY custom_score DESC"
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        df = snapshot_to_frame(get_replica_snapshot('top_scorers'))
         
-        logging.info(f"Retrieved {len(df)} records from database")
+        logging.debug(f"Retrieved {len(df)} records from replica")
         return df
         
     except Exception as e:
@@ -313,15 +1105,13 @@ def get_latest_scorers():
         return pd.DataFrame()
 
 def get_last_update_time():
-    """Get the timestamp of the last database update"""
+    """Get the timestamp of the last database update from the read replica"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(update_time) FROM updates")
-        last_update = cursor.fetchone()[0]
-        conn.close()
+        if not _replica_loaded:
+            get_replica_snapshot('top_scorers')
         
-        return last_update
+        with _replica_lock:
+            return _replica_last_update
         
     except Exception as e:
         logging.error(f"Error getting last update time: {str(e)}")
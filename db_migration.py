@@ -1,13 +1,7 @@
 import sqlite3
 import logging
 import time
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='migration.log'
-)
+from database import ensure_player_key
 
 DB_NAME = 'nba_scores.db'
 
@@ -32,7 +26,7 @@ def get_db_connection(max_retries=5, retry_delay=1.0):
     raise sqlite3.OperationalError("Could not access database after multiple retries")
 
 def migrate_database():
-    """Add plus_minus column to existing tables"""
+    """Add the plus_minus, game_id and player_id columns to existing tables, and key player rows by game and player"""
     try:
         logging.info("Starting database migration to add plus_minus column")
         
@@ -60,6 +54,22 @@ def migrate_database():
         else:
             logging.info("plus_minus column already exists in live_players table")
         
+        # Player rows carry the game and player they belong to
+        for table in ('top_scorers', 'live_players'):
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [col[1] for col in cursor.fetchall()]
+            
+            for column, column_type in (('game_id', 'TEXT'), ('player_id', 'INTEGER')):
+                if column not in columns:
+                    logging.info(f"Adding {column} column to {table} table")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        
+        # Files that predate the game and player columns get the player rows' key
+        # now; on live rows it also serves lookups by game, which had an index of their own
+        ensure_player_key(conn, 'top_scorers')
+        ensure_player_key(conn, 'live_players')
+        cursor.execute("DROP INDEX IF EXISTS idx_live_players_game")
+        
         conn.commit()
         conn.close()
         
@@ -71,4 +81,6 @@ def migrate_database():
         return False
 
 if __name__ == "__main__":
+    from log_config import configure_logging
+    configure_logging('migration')
     migrate_database()
@@ -0,0 +1,76 @@
+import contextvars
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from metrics import EXECUTOR_QUEUE_DEPTH, EXECUTOR_WAIT
+from profiling import run_profiled
+
+# Lower runs first: live work always jumps ahead of queued completed-game work
+PRIORITY_LIVE = 0
+PRIORITY_COMPLETED = 10
+
+# Upstream requests in flight at once; nba_api also sleeps before every request
+FETCH_CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', 4))
+
+class PriorityExecutor:
+    """Fixed pool of worker threads that takes queued work in priority order.
+
+    Work of equal priority runs first in, first out. With one worker this is
+    a serialized queue, which is what the database writer uses so SQLite only
+    ever sees one writer in this process. Work runs in a copy of the
+    submitter's context variables, so it carries the submitter's trace, and
+    lands in the submitter's profile while that is being profiled.
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._workers = workers
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self._workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{index}")
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, priority, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) at priority, returning a Future for its result"""
+        self._start_workers()
+        future = Future()
+        self._queue.put((priority, next(self._sequence), time.perf_counter(), contextvars.copy_context(),
+                         future, func, args, kwargs))
+        EXECUTOR_QUEUE_DEPTH.inc(pool=self.name)
+        return future
+
+    def run(self, priority, func, *args, **kwargs):
+        """Queue func at priority and wait for its result"""
+        return self.submit(priority, func, *args, **kwargs).result()
+
+    def _work(self):
+        while True:
+            priority, _, queued_at, context, future, func, args, kwargs = self._queue.get()
+            EXECUTOR_QUEUE_DEPTH.dec(pool=self.name)
+            EXECUTOR_WAIT.observe(time.perf_counter() - queued_at, pool=self.name, priority=priority)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(run_profiled, func, *args, **kwargs))
+            except BaseException as e:
+                # Reported by whoever waits on the future
+                future.set_exception(e)
+
+# Upstream fetches for both kinds of data
+io_pool = PriorityExecutor('io', FETCH_CONCURRENCY)
+
+# Every database write made by ingestion, one at a time
+db_writer = PriorityExecutor('db-writer', 1)
@@ -0,0 +1,43 @@
+# ingest_worker.py - Standalone ingestion process
+#
+# Runs the schedulers and database writes on their own, so the web tier can
+# run with INGESTION_MODE=external and any number of gunicorn workers.
+# Several copies may run at once: one leads and the rest wait to take over.
+
+import logging
+import signal
+import threading
+from log_config import configure_logging
+
+# Set up logging before the imports below, some of which log as they load
+configure_logging('ingest')
+
+from database import init_db
+from db_migration import migrate_database
+import ingestion
+import memory
+
+def main():
+    """Wait for ingestion leadership, then ingest until stopped"""
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopped.set())
+
+    memory.start_memory_tracing()
+    init_db()
+    if not migrate_database():
+        logging.error("Database migration failed")
+
+    ingestion.sync_scheduler.start()
+    logging.info("Ingest worker waiting for ingestion leadership")
+    election = threading.Thread(target=ingestion.stand_for_election, name='ingestion-election', daemon=True)
+    election.start()
+
+    stopped.wait()
+    logging.info("Ingest worker stopping")
+    for scheduler in (ingestion.scheduler, ingestion.live_scheduler, ingestion.sync_scheduler):
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from database import (DB_NAME, poll_replica, request_refresh, get_refresh_tickets,
+                      mark_refresh_handled)
+from singleflight import SingleFlight
+from leader import FileLease
+from metrics import JOB_DURATION, JOB_LAG, JOB_MISSED, INGESTION_LEADER
+import profiling
+import memory
+
+# 'auto': every web process stands for ingestion leadership and one wins.
+# 'external': web processes only serve reads and ingest_worker.py ingests.
+INGESTION_MODE = os.environ.get('INGESTION_MODE', 'auto')
+
+# Whoever holds this lock runs the schedulers and is the only database writer
+LEADER_LOCK_PATH = os.environ.get('LEADER_LOCK_PATH', f"{DB_NAME}.ingest.lock")
+
+# Seconds between a follower's attempts to take over leadership
+LEADER_RETRY_INTERVAL = float(os.environ.get('LEADER_RETRY_INTERVAL', 5))
+
+# Seconds between checks of the database for other processes' saves and refresh requests
+REPLICA_POLL_INTERVAL = float(os.environ.get('REPLICA_POLL_INTERVAL', 2))
+
+# Minimum seconds between refreshes of each kind of data, however many clients ask
+LIVE_REFRESH_MIN_INTERVAL = int(os.environ.get('LIVE_REFRESH_MIN_INTERVAL', 15))
+TOP_SCORERS_REFRESH_MIN_INTERVAL = int(os.environ.get('TOP_SCORERS_REFRESH_MIN_INTERVAL', 60))
+
+def update_top_scorers():
+    # data_processor pulls in pandas and nba_api, so it is only imported once ingestion runs
+    from data_processor import update_top_scorers
+    return update_top_scorers()
+
+def update_live_games():
+    from data_processor import update_live_games
+    return update_live_games()
+
+# At most one refresh in flight per kind of data - scheduled runs and
+# refresh requests all join the same call
+top_scorers_refresh = SingleFlight('top_scorers', update_top_scorers, min_interval=TOP_SCORERS_REFRESH_MIN_INTERVAL)
+live_refresh = SingleFlight('live', update_live_games, min_interval=LIVE_REFRESH_MIN_INTERVAL)
+
+_refreshes = {flight.name: flight for flight in (top_scorers_refresh, live_refresh)}
+
+_lease = FileLease(LEADER_LOCK_PATH)
+INGESTION_LEADER.set(0)
+
+# Wall-clock start of the most recent run of each scheduled job
+_job_started_at = {}
+
+def _timed_job(job_id, func):
+    """Wrap a scheduled job so its duration and memory peak are recorded, profiling it when armed"""
+    def run():
+        _job_started_at[job_id] = time.time()
+        with JOB_DURATION.time(job=job_id):
+            return memory.track_job(job_id, lambda: profiling.run_job(job_id, func))
+    return run
+
+def _record_job_event(event):
+    """Record how late each scheduled run started, and runs that were skipped"""
+    if event.code == EVENT_JOB_MISSED:
+        JOB_MISSED.inc(job=event.job_id)
+    elif event.job_id in _job_started_at:
+        JOB_LAG.observe(max(0.0, _job_started_at[event.job_id] - event.scheduled_run_time.timestamp()),
+                        job=event.job_id)
+
+# Seconds between scheduled runs of each job
+TOP_SCORERS_INTERVAL = 30 * 60
+LIVE_INTERVAL = 30
+
+# Each scheduler has its own single-thread executor, so a long top scorers
+# run never holds up the live cadence; their database writes still go one
+# at a time, live first, through executors.db_writer. Runs never overlap,
+# missed runs collapse into one, and a run that could not start within its
+# grace time is skipped because a fresher one is due soon anyway.
+scheduler = BackgroundScheduler(executors={'default': ThreadPoolExecutor(1)},
+                                job_defaults={'max_instances': 1, 'coalesce': True, 'misfire_grace_time': 300})
+scheduler.add_job(_timed_job('top_scorers', top_scorers_refresh.run), 'interval', seconds=TOP_SCORERS_INTERVAL,
+                  jitter=60, id='top_scorers')
+scheduler.add_listener(_record_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+# Add live game scheduler
+logging.info("Setting up live games scheduler")
+live_scheduler = BackgroundScheduler(executors={'default': ThreadPoolExecutor(1)},
+                                     job_defaults={'max_instances': 1, 'coalesce': True,
+                                                   'misfire_grace_time': LIVE_INTERVAL // 2})
+live_scheduler.add_job(_timed_job('live', live_refresh.run), 'interval', seconds=LIVE_INTERVAL, jitter=3, id='live')
+live_scheduler.add_listener(_record_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+logging.info("Live scheduler job created")
+
+def is_leader():
+    """Whether this process runs ingestion"""
+    return _lease.is_held()
+
+def get_job(job_id):
+    """Look up a scheduled ingestion job by id"""
+    return scheduler.get_job(job_id) or live_scheduler.get_job(job_id)
+
+def refresh(flight, wait=False, timeout=None):
+    """Refresh one kind of data, here if this process leads ingestion or else by asking the leader.
+
+    Returns SingleFlight.run's (state, result) in the leader. Elsewhere the
+    result is always None and the state is 'requested' without waiting, and
+    'completed' or 'timeout' with it.
+    """
+    if is_leader():
+        return flight.run(wait=wait, timeout=timeout)
+
+    ticket = request_refresh(flight.name)
+    if not wait:
+        return 'requested', None
+
+    deadline = time.monotonic() + (timeout if timeout is not None else float('inf'))
+    while time.monotonic() < deadline:
+        _, handled = get_refresh_tickets((flight.name,))[flight.name]
+        if handled >= ticket:
+            # Pick the new data up now rather than at the next poll
+            poll_replica()
+            return 'completed', None
+        time.sleep(min(0.25, REPLICA_POLL_INTERVAL))
+    return 'timeout', None
+
+# Refreshes this leader is currently running for other processes
+_serving = set()
+_serving_lock = threading.Lock()
+
+def _serve_refresh(flight, ticket):
+    try:
+        flight.run()
+        mark_refresh_handled(flight.name, ticket)
+    except Exception as e:
+        logging.error(f"Error serving {flight.name} refresh request: {str(e)}")
+    finally:
+        with _serving_lock:
+            _serving.discard(flight.name)
+
+def _serve_refresh_requests():
+    """Run the refreshes other processes have asked for since the last check"""
+    for name, (requested, handled) in get_refresh_tickets(tuple(_refreshes)).items():
+        if requested <= handled:
+            continue
+        with _serving_lock:
+            if name in _serving:
+                continue
+            _serving.add(name)
+        threading.Thread(target=_serve_refresh, args=(_refreshes[name], requested),
+                         name=f"serve-refresh-{name}", daemon=True).start()
+
+def _sync():
+    """As the leader, serve other processes' refresh requests; as a follower, follow the leader's saves"""
+    try:
+        if is_leader():
+            _serve_refresh_requests()
+        else:
+            poll_replica()
+    except Exception as e:
+        logging.error(f"Error syncing with the ingestion leader: {str(e)}")
+
+# Runs in every process, leader or not
+sync_scheduler = BackgroundScheduler(executors={'default': ThreadPoolExecutor(1)},
+                                     job_defaults={'coalesce': True, 'max_instances': 1})
+sync_scheduler.add_job(_sync, 'interval', seconds=REPLICA_POLL_INTERVAL, id='replica_sync')
+if memory.is_tracing():
+    sync_scheduler.add_job(memory.take_snapshot, 'interval', seconds=memory.MEMORY_SNAPSHOT_INTERVAL,
+                           id='memory_snapshot')
+
+def _start_ingestion():
+    """Take over ingestion: start the schedulers with a warm refresh of both kinds of data due now.
+
+    Until the warm refresh lands, readers keep being served the last
+    persisted leaderboards, and stale live rows are replaced (or cleared when
+    no game is on) by the first live run.
+    """
+    INGESTION_LEADER.set(1)
+    now = datetime.now()
+    scheduler.start()
+    live_scheduler.start()
+    scheduler.modify_job('top_scorers', next_run_time=now)
+    live_scheduler.modify_job('live', next_run_time=now)
+    logging.info(f"Ingestion running in process {os.getpid()}")
+
+def warm_up_state():
+    """Ingestion side of readiness: whether this process leads and whether its warm refresh is done"""
+    if not is_leader():
+        return {'role': 'follower'}
+    return {
+        'role': 'leader',
+        'top_scorers_refreshed': top_scorers_refresh.has_completed(),
+        'live_refreshed': live_refresh.has_completed()
+    }
+
+def stand_for_election():
+    """Block until this process holds ingestion leadership, then start ingesting"""
+    while not _lease.try_acquire():
+        time.sleep(LEADER_RETRY_INTERVAL)
+    _start_ingestion()
+
+def start(mode=INGESTION_MODE):
+    """Follow the ingestion leader, and unless ingestion is external, stand for election in the background"""
+    sync_scheduler.start()
+
+    if mode == 'external':
+        logging.info("Ingestion is external - serving reads only")
+        return
+
+    thread = threading.Thread(target=stand_for_election, name='ingestion-election')
+    thread.daemon = True
+    thread.start()
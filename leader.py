@@ -0,0 +1,62 @@
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows - a lone development process there always leads
+    fcntl = None
+
+class FileLease:
+    """Leadership held as an exclusive lock on a file.
+
+    The OS drops the lock when the holding process exits or dies, so a
+    follower retrying try_acquire() takes over as soon as the leader is gone,
+    with no lease expiry to wait out. Every contender must share the file's
+    filesystem, which they already do to share the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def is_held(self):
+        """Whether this process holds the lease"""
+        return self._file is not None
+
+    def try_acquire(self):
+        """Take the lease if nobody holds it, returning whether this process now does"""
+        with self._lock:
+            if self._file is not None:
+                return True
+
+            lock_file = open(self.path, 'a+')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+
+            # Record the holder for whoever is debugging a stuck deployment
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(f"{os.getpid()}\n")
+            lock_file.flush()
+
+            self._file = lock_file
+            logging.info(f"Acquired lease {self.path} in process {os.getpid()}")
+            return True
+
+    def release(self):
+        """Give the lease up so another process can take it"""
+        with self._lock:
+            if self._file is None:
+                return
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+            logging.info(f"Released lease {self.path}")
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Events a slow client may fall behind by before it is resynced with a snapshot
+MAX_PENDING_EVENTS = 20
+
+# Streams one process holds open at once. Each open stream holds a server
+# thread for as long as it is connected (a gthread worker has 16), so past
+# this new clients are turned away and poll /api/live-games instead, which
+# leaves threads for every other request.
+MAX_LIVE_STREAMS = int(os.environ.get('MAX_LIVE_STREAMS', 8))
+
+def player_key(player):
+    """Key identifying a player row across live ingestion cycles"""
+    if player.get('player_id') is not None:
+        return f"{player['game_id']}|{player['player_id']}"
+    # Rows saved before game and player IDs were stored
+    return f"{player['player_name']}|{player['team']}"
+
+def format_event(event, data):
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf-8')
+
+class _Subscriber:
+    """Pending events for one connected client"""
+
+    def __init__(self):
+        self.events = queue.Queue(maxsize=MAX_PENDING_EVENTS)
+        self.needs_snapshot = False
+
+class LiveBroadcaster:
+    """Fan out live leaderboard changes to every connected stream.
+
+    Each ingestion cycle is diffed once against the previous one and the
+    encoded event is handed to every subscriber, so the number of clients
+    never adds database reads or serialization work.
+    """
+
+    def __init__(self, max_streams=MAX_LIVE_STREAMS):
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._players = {}
+        self._version = None
+        self._freshness = None
+
+    def _snapshot_event(self):
+        """Full snapshot event of the current live leaderboard"""
+        return format_event('snapshot', {'version': self._version, 'freshness': self._freshness,
+                                         'players': list(self._players.values())})
+
+    def publish(self, version, players, freshness=None):
+        """Record a new live leaderboard, and where its data came from, and push the changed rows to every stream"""
+        current = {player_key(player): player for player in players}
+
+        with self._lock:
+            if version == self._version:
+                return
+
+            upserted = [player for key, player in current.items() if self._players.get(key) != player]
+            removed = [key for key in self._players if key not in current]
+            self._players = current
+            self._version = version
+            self._freshness = freshness
+
+            if not upserted and not removed:
+                return
+
+            event = format_event('diff', {'version': version, 'freshness': freshness,
+                                          'upserted': upserted, 'removed': removed})
+            stream_count = len(self._subscribers)
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.events.put_nowait(event)
+                except queue.Full:
+                    subscriber.needs_snapshot = True
+
+        logging.info(f"Broadcast live diff v{version}: {len(upserted)} changed, {len(removed)} removed "
+                     f"to {stream_count} streams")
+
+    def open_stream(self):
+        """Subscribe a new client, or return None when max_streams are already open"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_streams:
+                return None
+            subscriber = _Subscriber()
+            subscriber.events.put_nowait(self._snapshot_event())
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def close_stream(self, subscriber):
+        """Unsubscribe a client, freeing its slot; closing a stream twice is harmless"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber):
+        """Generate the event stream of a subscribed client, starting with a full snapshot"""
+        try:
+            while True:
+                if subscriber.needs_snapshot:
+                    # The client fell too far behind - drop its backlog and resync
+                    with self._lock:
+                        while not subscriber.events.empty():
+                            subscriber.events.get_nowait()
+                        subscriber.needs_snapshot = False
+                        event = self._snapshot_event()
+                    yield event
+                    continue
+
+                try:
+                    yield subscriber.events.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield b": keep-alive\n\n"
+        finally:
+            self.close_stream(subscriber)
+
+    def subscriber_count(self):
+        """Number of connected streams"""
+        with self._lock:
+            return len(self._subscribers)
+
+# Shared broadcaster fed by the live ingestion cycle
+live_broadcaster = LiveBroadcaster()
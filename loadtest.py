@@ -0,0 +1,503 @@
+# loadtest.py - Load test the web tier with simulated dashboard viewers
+#
+# Starts the app in a scratch directory with the NBA upstream replaced by a
+# local fake, so ingestion, saves, publishes and the live stream all run for
+# real, then drives it with a growing number of viewers that each replay
+# script.js's request mix. Reports throughput, latency percentiles and error
+# rates per step, and writes them to a JSON report that later runs can be
+# compared against.
+#
+#   python loadtest.py --viewers 10,50,100 --duration 60
+#   python loadtest.py --profile polling --speedup 10 --baseline loadtest-report.json
+#   python loadtest.py --server werkzeug --url http://127.0.0.1:8080   # an already running app
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# What each simulated viewer requests, as (interval in seconds, paths fetched
+# in order, whether the fetch is conditional) schedules. 'stream' is the
+# current script.js: one dashboard request a minute plus the live stream.
+# 'polling' is script.js without EventSource support, which is also what
+# every viewer ran before the live stream existed.
+PROFILES = {
+    'stream': [
+        (60, ['/api/dashboard'], True),
+    ],
+    'polling': [
+        (30, ['/refresh-live', '/api/live-games'], False),
+        (60, ['/api/last-update'], False),
+        (300, ['/api/top-scorers', '/api/live-games'], False),
+    ],
+}
+
+# Profiles that also hold a live stream open per viewer
+STREAMING_PROFILES = {'stream'}
+
+# What a streaming viewer polls instead when the server has no stream slot for it, as script.js does
+STREAM_FALLBACK = (30, ['/api/live-games'], True)
+
+# Seconds to wait between steps for the server to free the last step's
+# stream slots. A server only notices a stream's client has left when it
+# next writes to it, which for an idle stream is its keep-alive.
+STREAM_RELEASE_TIMEOUT = 60
+
+# Fake upstream: games on today's scoreboard, and seconds each request takes
+FAKE_LIVE_GAMES = int(os.environ.get('FAKE_LIVE_GAMES', 5))
+FAKE_FINAL_GAMES = int(os.environ.get('FAKE_FINAL_GAMES', 10))
+FAKE_UPSTREAM_LATENCY = float(os.environ.get('FAKE_UPSTREAM_LATENCY', 0.1))
+
+# Players per team in each fake box score
+FAKE_ROSTER_SIZE = 13
+
+_FAKE_STARTED_AT = time.time()
+
+def _fake_game_ids():
+    live = [f"00224900{index:02d}" for index in range(FAKE_LIVE_GAMES)]
+    final = [f"00224901{index:02d}" for index in range(FAKE_FINAL_GAMES)]
+    return live, final
+
+def _fake_players(game_id, team_index):
+    """Deterministic box score lines for one team of a fake game"""
+    rng = random.Random(f"{game_id}-{team_index}")
+    players = []
+    for slot in range(FAKE_ROSTER_SIZE):
+        attempts = rng.randint(0, 22)
+        threes = rng.randint(0, min(attempts, 10))
+        players.append({
+            'id': int(game_id[-3:]) * 100 + team_index * FAKE_ROSTER_SIZE + slot,
+            'name': f"Player {game_id[-3:]}-{team_index}-{slot}",
+            'minutes': rng.uniform(4, 40), 'points': rng.randint(0, 40), 'oreb': rng.randint(0, 5),
+            'dreb': rng.randint(0, 10), 'ast': rng.randint(0, 12), 'stl': rng.randint(0, 4),
+            'blk': rng.randint(0, 4), 'to': rng.randint(0, 6), 'fgm': rng.randint(0, attempts),
+            'fga': attempts, 'fg3m': rng.randint(0, threes), 'fg3a': threes, 'pf': rng.randint(0, 6),
+            'plus_minus': rng.randint(-20, 20)
+        })
+    return players
+
+def install_fake_upstream():
+    """Replace every nba_api endpoint the ingestion uses with a local fake"""
+    import pandas as pd
+    import nba_data
+    from nba_api.live.nba.endpoints import boxscore
+
+    live_ids, final_ids = _fake_game_ids()
+
+    class _Frame:
+        def __init__(self, frame):
+            self._frame = frame
+
+        def get_data_frame(self):
+            return self._frame.copy()
+
+    class FakeScoreboard:
+        def __init__(self, game_date):
+            time.sleep(FAKE_UPSTREAM_LATENCY)
+            today = datetime.now().strftime('%m/%d/%Y') == game_date
+            games = [(game_id, 2) for game_id in live_ids] + [(game_id, 3) for game_id in final_ids] if today else []
+            self.game_header = _Frame(pd.DataFrame([{
+                'GAME_DATE_EST': datetime.now().strftime('%Y-%m-%dT00:00:00'), 'GAME_ID': game_id,
+                'GAME_STATUS_ID': status, 'GAME_STATUS_TEXT': 'Final' if status == 3 else 'Q2 6:00',
+                'HOME_TEAM_ID': 1, 'VISITOR_TEAM_ID': 2, 'LIVE_PERIOD': 4 if status == 3 else 2,
+                'LIVE_PC_TIME': '' if status == 3 else '6:00'
+            } for game_id, status in games], columns=['GAME_DATE_EST', 'GAME_ID', 'GAME_STATUS_ID', 'GAME_STATUS_TEXT',
+                                                      'HOME_TEAM_ID', 'VISITOR_TEAM_ID', 'LIVE_PERIOD', 'LIVE_PC_TIME']))
+            self.line_score = _Frame(pd.DataFrame([{
+                'GAME_ID': game_id, 'TEAM_ID': team_index + 1, 'TEAM_ABBREVIATION': f"T{game_id[-3:]}{'HA'[team_index]}",
+                'PTS': sum(player['points'] for player in _fake_players(game_id, team_index))
+            } for game_id, _ in games for team_index in (0, 1)],
+                columns=['GAME_ID', 'TEAM_ID', 'TEAM_ABBREVIATION', 'PTS']))
+
+    class FakeBoxScore:
+        def __init__(self, game_id):
+            time.sleep(FAKE_UPSTREAM_LATENCY)
+            self.player_stats = _Frame(pd.DataFrame([{
+                'GAME_ID': game_id, 'TEAM_ID': team_index + 1, 'TEAM_ABBREVIATION': f"T{game_id[-3:]}{'HA'[team_index]}",
+                'PLAYER_ID': player['id'], 'PLAYER_NAME': player['name'],
+                'MIN': f"{int(player['minutes'])}:{int(player['minutes'] % 1 * 60):02d}",
+                'PTS': player['points'], 'OREB': player['oreb'], 'DREB': player['dreb'], 'AST': player['ast'],
+                'STL': player['stl'], 'BLK': player['blk'], 'TO': player['to'], 'FGM': player['fgm'],
+                'FGA': player['fga'], 'FG3M': player['fg3m'], 'FG3A': player['fg3a'], 'PF': player['pf'],
+                'FTA': 0, 'PLUS_MINUS': player['plus_minus']
+            } for team_index in (0, 1) for player in _fake_players(game_id, team_index)]))
+
+    class FakeLiveBoxScore:
+        def __init__(self, game_id):
+            self.game_id = game_id
+
+        def get_dict(self):
+            time.sleep(FAKE_UPSTREAM_LATENCY)
+            # Stats grow with the minutes played so far, so every cycle changes some rows
+            progress = min(1.0, 0.2 + (time.time() - _FAKE_STARTED_AT) / 3600)
+
+            def team(team_index):
+                players = _fake_players(self.game_id, team_index)
+                return {
+                    'teamTricode': f"T{self.game_id[-3:]}{'HA'[team_index]}",
+                    'score': int(sum(player['points'] for player in players) * progress),
+                    'players': [{
+                        'status': 'ACTIVE', 'personId': player['id'],
+                        'firstName': player['name'].split(' ')[0], 'familyName': player['name'].split(' ')[1],
+                        'statistics': {
+                            'minutes': f"PT{int(player['minutes'] * progress):02d}M00.00S",
+                            'points': int(player['points'] * progress),
+                            'reboundsOffensive': player['oreb'], 'reboundsDefensive': player['dreb'],
+                            'assists': player['ast'], 'steals': player['stl'], 'blocks': player['blk'],
+                            'turnovers': player['to'], 'fieldGoalsMade': player['fgm'],
+                            'fieldGoalsAttempted': player['fga'], 'threePointersMade': player['fg3m'],
+                            'threePointersAttempted': player['fg3a'], 'foulsPersonal': player['pf'],
+                            'plusMinusPoints': player['plus_minus']
+                        }
+                    } for player in players]
+                }
+
+            return {'game': {'gameId': self.game_id, 'gameStatus': 2, 'gameStatusText': 'Q2 6:00', 'period': 2,
+                             'gameClock': 'PT06M00.00S', 'gameEt': datetime.now().strftime('%Y-%m-%dT19:00:00'),
+                             'homeTeam': team(0), 'awayTeam': team(1)}}
+
+    nba_data.ScoreboardV2 = FakeScoreboard
+    nba_data.BoxScoreTraditionalV2 = FakeBoxScore
+    boxscore.BoxScore = FakeLiveBoxScore
+
+def create_app():
+    """The app with the fake upstream installed, for gunicorn: gunicorn 'loadtest:create_app()'"""
+    install_fake_upstream()
+    import app
+    return app.app
+
+def serve(port):
+    """Serve the app on a fake upstream with werkzeug's threaded server"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', port, create_app(), threaded=True)
+    server.serve_forever()
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(server, workers, threads):
+    """Start the app in a scratch directory, returning (process, base URL, directory)"""
+    import requests
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    work_dir = tempfile.mkdtemp(prefix='nba-loadtest-')
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=repo_dir, INGESTION_MODE='auto')
+
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'loadtest:create_app()', '--bind', f"127.0.0.1:{port}",
+                   '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads),
+                   '--timeout', '120', '--log-level', 'warning']
+    else:
+        command = [sys.executable, os.path.join(repo_dir, 'loadtest.py'), 'serve', '--port', str(port)]
+
+    log = open(os.path.join(work_dir, 'server.log'), 'w')
+    process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+
+    # Wait until ingestion has published both leaderboards, so every step sees real payloads
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}, see {work_dir}/server.log")
+        try:
+            dashboard = requests.get(f"{url}/api/dashboard", timeout=5).json()
+            if dashboard['completed'].get('players') and dashboard['live'].get('players'):
+                return process, url, work_dir
+        except Exception:
+            pass
+        time.sleep(1)
+
+    process.terminate()
+    raise RuntimeError(f"Server did not warm up in time, see {work_dir}/server.log")
+
+class Viewer:
+    """One simulated dashboard viewer, replaying a profile's schedule until stopped"""
+
+    def __init__(self, url, profile, speedup, samples, stopped):
+        import requests
+        self.session = requests.Session()
+        self.url = url
+        self.profile = profile
+        self.speedup = speedup
+        self.samples = samples
+        self.stopped = stopped
+        self.etags = {}
+        self.stream_events = 0
+        self.stream_rejected = threading.Event()
+        self._stream_response = None
+        self._stream_thread = None
+
+    def _get(self, path, conditional=False):
+        headers = {'Accept-Encoding': 'gzip'}
+        if conditional and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.url + path, headers=headers, timeout=30)
+            body = response.content
+            status = response.status_code
+            if response.headers.get('ETag'):
+                self.etags[path] = response.headers['ETag']
+        except Exception:
+            body, status = b'', 0
+        self.samples.append((time.time(), path, status, time.perf_counter() - start, len(body)))
+
+    def _stream(self):
+        """Hold the live stream open, counting the events it pushes"""
+        import requests
+        start = time.perf_counter()
+        try:
+            self._stream_response = requests.get(self.url + '/api/live-stream', stream=True, timeout=(10, None))
+            if self.stopped.is_set():
+                # The step ended while connecting, after close() looked for the stream
+                self._stream_response.close()
+                return
+            if self._stream_response.status_code == 503:
+                # Every stream slot is taken - the viewer polls instead, which is not an error
+                self.stream_rejected.set()
+                return
+            self.samples.append((time.time(), '/api/live-stream', self._stream_response.status_code,
+                                 time.perf_counter() - start, 0))
+            for line in self._stream_response.iter_lines():
+                if self.stopped.is_set():
+                    break
+                if line.startswith(b'event:'):
+                    self.stream_events += 1
+        except Exception:
+            if not self.stopped.is_set():
+                self.samples.append((time.time(), '/api/live-stream', 0, time.perf_counter() - start, 0))
+
+    def run(self):
+        # A viewer opens the page, then polls on each schedule from a random point in it
+        self._get('/')
+        self._get('/api/dashboard', conditional=True)
+        if self.profile in STREAMING_PROFILES:
+            self._stream_thread = threading.Thread(target=self._stream, daemon=True)
+            self._stream_thread.start()
+
+        now = time.monotonic()
+        due = [(now + random.uniform(0, interval / self.speedup), interval, paths, conditional)
+               for interval, paths, conditional in PROFILES[self.profile]]
+        while not self.stopped.is_set():
+            if self.stream_rejected.is_set() and len(due) == len(PROFILES[self.profile]):
+                interval, paths, conditional = STREAM_FALLBACK
+                due.append((time.monotonic(), interval, paths, conditional))
+            due.sort(key=lambda schedule: schedule[0])
+            next_at, interval, paths, conditional = due[0]
+            # Wake early to pick up a stream rejection
+            if self.stopped.wait(max(0.0, min(next_at - time.monotonic(), 1.0))):
+                break
+            if time.monotonic() < next_at:
+                continue
+            for path in paths:
+                self._get(path, conditional)
+            due[0] = (next_at + interval / self.speedup, interval, paths, conditional)
+
+    def close(self):
+        if self._stream_response is not None:
+            self._stream_response.close()
+        if self._stream_thread is not None:
+            self._stream_thread.join(timeout=30)
+        self.session.close()
+
+def open_streams(url):
+    """Live streams the server reports open on /metrics, or None when it does not say"""
+    import requests
+    try:
+        metrics = requests.get(f"{url}/metrics", timeout=10).text
+    except Exception:
+        return None
+    for line in metrics.splitlines():
+        if line.startswith('nba_live_streams_open '):
+            return float(line.split()[1])
+    return None
+
+def wait_for_stream_slots(url, readings=3, timeout=STREAM_RELEASE_TIMEOUT):
+    """Wait until the server has every live stream slot free again.
+
+    Returns whether it did in time, or None when the server does not report
+    its open streams.
+
+    Each /metrics request reaches whichever worker accepts it, so the count
+    has to read zero several times in a row.
+    """
+    deadline = time.time() + timeout
+    zeros = 0
+    while time.time() < deadline:
+        count = open_streams(url)
+        if count is None:
+            return None
+        zeros = zeros + 1 if count == 0 else 0
+        if zeros >= readings:
+            return True
+        time.sleep(0.5)
+    return False
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+def summarize(samples, duration):
+    """Throughput, latency percentiles and error rate of a list of samples"""
+    latencies = sorted(latency * 1000 for _, _, _, latency, _ in samples)
+    errors = sum(1 for _, _, status, _, _ in samples if status == 0 or status >= 500)
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / duration, 2) if duration else None,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'not_modified': sum(1 for _, _, status, _, _ in samples if status == 304),
+        'bytes': sum(size for _, _, _, _, size in samples),
+        'latency_ms': {name: round(value, 2) if value is not None else None for name, value in (
+            ('p50', percentile(latencies, 0.50)), ('p95', percentile(latencies, 0.95)),
+            ('p99', percentile(latencies, 0.99)), ('max', latencies[-1] if latencies else None))}
+    }
+
+def run_step(url, viewer_count, profile, speedup, duration):
+    """Run viewer_count viewers for duration seconds and summarize what they saw"""
+    samples = []
+    stopped = threading.Event()
+    viewers = [Viewer(url, profile, speedup, samples, stopped) for _ in range(viewer_count)]
+    threads = [threading.Thread(target=viewer.run, daemon=True) for viewer in viewers]
+
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stopped.set()
+    elapsed = time.time() - started
+    for viewer in viewers:
+        viewer.close()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    samples = [sample for sample in samples if sample[0] <= started + elapsed]
+    step = {'viewers': viewer_count, 'duration': round(elapsed, 1), **summarize(samples, elapsed)}
+    step['stream_events'] = sum(viewer.stream_events for viewer in viewers)
+    step['streams_rejected'] = sum(viewer.stream_rejected.is_set() for viewer in viewers)
+    step['endpoints'] = {path: summarize([sample for sample in samples if sample[1] == path], elapsed)
+                         for path in sorted({sample[1] for sample in samples})}
+    return step
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+def _ms(value):
+    return f"{value:>7.1f}ms" if value is not None else '      -  '
+
+def print_step(step, baseline_step=None):
+    latency = step['latency_ms']
+    line = (f"{step['viewers']:>6} viewers  {step['throughput_rps']:>8.1f} req/s  "
+            f"p50 {_ms(latency['p50'])}  p95 {_ms(latency['p95'])}  p99 {_ms(latency['p99'])}  "
+            f"errors {step['error_rate']:.2%}")
+    if step.get('streams_rejected'):
+        line += f"  streams refused {step['streams_rejected']}"
+    if baseline_step and latency['p95'] is not None and baseline_step['latency_ms']['p95'] is not None:
+        base = baseline_step['latency_ms']
+        line += (f"  | vs baseline: req/s {step['throughput_rps'] - baseline_step['throughput_rps']:+.1f}, "
+                 f"p95 {latency['p95'] - base['p95']:+.1f}ms, p99 {latency['p99'] - base['p99']:+.1f}ms")
+    print(line)
+    for path, endpoint in step['endpoints'].items():
+        endpoint_latency = endpoint['latency_ms']
+        print(f"         {path:<22} {endpoint['requests']:>7} req  p50 {_ms(endpoint_latency['p50'])}  "
+              f"p95 {_ms(endpoint_latency['p95'])}  p99 {_ms(endpoint_latency['p99'])}  "
+              f"errors {endpoint['error_rate']:.2%}  304s {endpoint['not_modified']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the web tier with simulated dashboard viewers')
+    subcommands = parser.add_subparsers(dest='command')
+    serve_parser = subcommands.add_parser('serve', help='serve the app on a fake upstream (used by the harness)')
+    serve_parser.add_argument('--port', type=int, required=True)
+
+    parser.add_argument('--viewers', default='10,50,100,200', help='comma-separated viewer counts, one step each')
+    parser.add_argument('--duration', type=float, default=60, help='seconds each step runs')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='stream', help="viewers' request mix")
+    parser.add_argument('--speedup', type=float, default=1.0, help="divide the viewers' polling intervals by this")
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'],
+                        help='server to start (default gunicorn when installed)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=16, help='gunicorn threads per worker')
+    parser.add_argument('--url', help='load test an already running app instead of starting one')
+    parser.add_argument('--output', default='loadtest-report.json', help='JSON report to write')
+    parser.add_argument('--baseline', help='earlier JSON report to compare each step against')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.port)
+        return
+
+    if args.server is None:
+        try:
+            import gunicorn  # noqa: F401
+            args.server = 'gunicorn'
+        except ImportError:
+            args.server = 'werkzeug'
+
+    baseline_steps = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        baseline_steps = {step['viewers']: step for step in baseline['steps']}
+        for setting in ('profile', 'speedup', 'duration'):
+            if baseline['config'].get(setting) != getattr(args, setting):
+                print(f"Warning: baseline ran with {setting}={baseline['config'].get(setting)}, "
+                      f"this run uses {getattr(args, setting)}")
+
+    process, work_dir = None, None
+    url = args.url
+    if url is None:
+        process, url, work_dir = start_server(args.server, args.workers, args.threads)
+        print(f"Started {args.server} on {url} in {work_dir}")
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'config': {
+            'profile': args.profile, 'speedup': args.speedup, 'duration': args.duration,
+            'server': 'external' if args.url else args.server,
+            'workers': args.workers if args.server == 'gunicorn' and not args.url else None,
+            'threads': args.threads if args.server == 'gunicorn' and not args.url else None,
+            'fake_live_games': FAKE_LIVE_GAMES, 'fake_final_games': FAKE_FINAL_GAMES,
+            'fake_upstream_latency': FAKE_UPSTREAM_LATENCY, 'cpu_count': os.cpu_count()
+        },
+        'steps': []
+    }
+
+    try:
+        for viewer_count in [int(count) for count in args.viewers.split(',')]:
+            # Start every step with all stream slots free, not held by the last step's viewers
+            if args.profile in STREAMING_PROFILES:
+                if wait_for_stream_slots(url, readings=max(3, 2 * args.workers)) is False:
+                    print(f"Warning: live streams still open after {STREAM_RELEASE_TIMEOUT}s, "
+                          f"this step may see streams refused")
+            step = run_step(url, viewer_count, args.profile, args.speedup, args.duration)
+            report['steps'].append(step)
+            print_step(step, baseline_steps.get(viewer_count))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
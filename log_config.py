@@ -0,0 +1,137 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from metrics import LOG_RECORDS_DROPPED
+import tracing
+
+# Lowest level logged, and 'json' for one JSON object per line or 'text' for plain lines
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+
+# File records are also written to, besides stdout
+LOG_FILE = os.environ.get('LOG_FILE')
+
+# Records waiting for the writer thread; once it is this far behind, new
+# records are dropped rather than hold up the thread logging them
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Seconds between two sampled payloads with the same key
+LOG_SAMPLE_INTERVAL = float(os.environ.get('LOG_SAMPLE_INTERVAL', 300))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+# Attributes every LogRecord has; any others were passed with extra= and are logged as fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'trace_id'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any extra= fields and the ingestion trace it was logged in"""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'service': self.service,
+            'process': record.process,
+            'thread': record.threadName
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+        entry.update((name, value) for name, value in vars(record).items() if name not in _RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Hand records to the writer thread, never blocking the thread that logs them"""
+
+    def prepare(self, record):
+        # Resolve everything that depends on the logging thread before the record leaves it
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        trace = tracing.current()
+        if trace is not None:
+            record.trace_id = trace.trace_id
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(level=record.levelname)
+
+_listener = None
+_configure_lock = threading.Lock()
+
+def configure_logging(service, level=LOG_LEVEL):
+    """Send every log record through one queue to a writer thread, replacing any handlers set up before.
+
+    Only the first call in a process does anything, so every entry point can
+    call it. Records are written to stdout, and LOG_FILE when set, as JSON
+    unless LOG_FORMAT is 'text'; whatever is still queued is written at exit.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        formatter = JsonFormatter(service) if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if LOG_FILE:
+            handlers.append(logging.FileHandler(LOG_FILE))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_NonBlockingQueueHandler(log_queue))
+        root.setLevel(level)
+
+        # The schedulers' own per-run lines would dominate the log; runs are in the job metrics
+        logging.getLogger('apscheduler').setLevel(max(root.level, logging.WARNING))
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+_sampled_at = {}
+_sample_lock = threading.Lock()
+
+def log_sampled(key, build_message, level=logging.DEBUG, interval=LOG_SAMPLE_INTERVAL):
+    """Log build_message() at level at most once per interval for each key.
+
+    For payloads such as sample rows on hot paths: the message is only built
+    when it is logged, and never when the level is disabled. Returns whether
+    it was logged.
+    """
+    if not logging.getLogger().isEnabledFor(level):
+        return False
+    now = time.monotonic()
+    with _sample_lock:
+        logged_at = _sampled_at.get(key)
+        if logged_at is not None and now - logged_at < interval:
+            return False
+        _sampled_at[key] = now
+    logging.log(level, build_message())
+    return True
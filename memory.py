@@ -0,0 +1,140 @@
+import gc
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from metrics import MEMORY_RSS_BYTES, MEMORY_TRACED_BYTES, MEMORY_JOB_PEAK_BYTES
+
+# tracemalloc slows every allocation down, so it is only on when asked for
+MEMORY_TRACING_ENABLED = os.environ.get('MEMORY_TRACING_ENABLED') == '1'
+MEMORY_TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', 10))
+MEMORY_SNAPSHOT_INTERVAL = int(os.environ.get('MEMORY_SNAPSHOT_INTERVAL', 300))
+
+# Summaries of recent periodic snapshots, for spotting steady growth
+MAX_SNAPSHOT_HISTORY = 48
+
+# Allocations made by tracemalloc and the import machinery are noise here
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_lock = threading.Lock()
+_baseline = None
+_previous = None
+_latest = None
+_history = deque(maxlen=MAX_SNAPSHOT_HISTORY)
+_job_peaks = {}
+
+def get_rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def is_tracing():
+    return tracemalloc.is_tracing()
+
+def start_memory_tracing():
+    """Start tracemalloc if enabled and record the baseline snapshot"""
+    if not MEMORY_TRACING_ENABLED or tracemalloc.is_tracing():
+        return
+    tracemalloc.start(MEMORY_TRACE_FRAMES)
+    take_snapshot()
+    logging.info(f"Memory tracing started with {MEMORY_TRACE_FRAMES} frames per allocation")
+
+def update_memory_gauges():
+    """Refresh the process memory gauges"""
+    rss = get_rss_bytes()
+    if rss is not None:
+        MEMORY_RSS_BYTES.set(rss)
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        MEMORY_TRACED_BYTES.set(current, kind='current')
+        MEMORY_TRACED_BYTES.set(peak, kind='peak')
+
+def take_snapshot():
+    """Take a tracemalloc snapshot, keeping it and the one before for diffing"""
+    global _baseline, _previous, _latest
+    update_memory_gauges()
+    if not tracemalloc.is_tracing():
+        return
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    current, peak = tracemalloc.get_traced_memory()
+    with _lock:
+        if _baseline is None:
+            _baseline = snapshot
+        _previous, _latest = _latest, snapshot
+        _history.append({
+            'taken_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'rss_bytes': get_rss_bytes(),
+            'gc_objects': len(gc.get_objects())
+        })
+
+def track_job(job_id, func):
+    """Run a scheduler job, recording the traced memory peak reached while it ran.
+
+    The peak is process-wide, so requests served during the run count too.
+    """
+    if not tracemalloc.is_tracing():
+        return func()
+
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        return func()
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        MEMORY_JOB_PEAK_BYTES.set(peak, job=job_id)
+        with _lock:
+            _job_peaks[job_id] = {
+                'peak_bytes': peak,
+                'peak_over_start_bytes': peak - start,
+                'retained_bytes': current - start,
+                'finished_at': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+
+def _format_stats(stats, limit):
+    return [{
+        'location': str(stat.traceback[0]) if stat.traceback else '?',
+        'size_bytes': stat.size,
+        'count': stat.count,
+        'size_diff_bytes': getattr(stat, 'size_diff', None),
+        'count_diff': getattr(stat, 'count_diff', None)
+    } for stat in stats[:limit]]
+
+def memory_report(limit=20, key_type='lineno'):
+    """Current memory use, top allocations and growth since the previous snapshot and startup"""
+    update_memory_gauges()
+    report = {
+        'rss_bytes': get_rss_bytes(),
+        'gc_counts': gc.get_count(),
+        'tracing': tracemalloc.is_tracing()
+    }
+    if not tracemalloc.is_tracing():
+        return report
+
+    current, peak = tracemalloc.get_traced_memory()
+    with _lock:
+        baseline, previous, latest = _baseline, _previous, _latest
+        report['history'] = list(_history)
+        report['job_peaks'] = dict(_job_peaks)
+
+    report['traced_bytes'] = current
+    report['traced_peak_bytes'] = peak
+    if latest is not None:
+        report['top_allocations'] = _format_stats(latest.statistics(key_type), limit)
+    if previous is not None:
+        report['diff_since_previous'] = _format_stats(latest.compare_to(previous, key_type), limit)
+    if baseline is not None and baseline is not latest:
+        report['diff_since_start'] = _format_stats(latest.compare_to(baseline, key_type), limit)
+    return report
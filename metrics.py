@@ -0,0 +1,177 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cache hit up to a slow upstream slate
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Data age buckets in seconds, from a fresh live cycle to a leaderboard a few refreshes old
+FRESHNESS_BUCKETS = (1, 2.5, 5, 10, 15, 30, 45, 60, 120, 300, 600, 1800, 3600, 7200)
+
+# Every metric created, in registration order, for the /metrics page
+_registry = []
+
+def _format_labels(labelnames, values, extra=()):
+    """Render a Prometheus label set"""
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class _Metric:
+    """Base for a named metric with a fixed set of label names"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    """A value that only goes up"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+class Gauge(_Metric):
+    """A value that can go up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+
+        lines = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+# Upstream nba_api calls
+UPSTREAM_LATENCY = Histogram('nba_upstream_request_seconds', 'Latency of nba_api requests by endpoint and outcome',
+                             ['endpoint', 'outcome'])
+UPSTREAM_RETRIES = Counter('nba_upstream_retries_total', 'nba_api requests retried after a failure', ['endpoint'])
+BOX_SCORES = Counter('nba_box_scores_total', 'Completed-game box scores by source', ['source'])
+
+# Ingestion
+SCORING_LATENCY = Histogram('nba_scoring_seconds', 'Time spent scoring and ranking players', ['kind'])
+INGEST_PUBLISH_LATENCY = Histogram('nba_ingest_publish_seconds', 'Time from the start of a refresh to each version it publishes',
+                                   ['kind', 'stage'])
+INGEST_STAGE_LATENCY = Histogram('nba_ingest_stage_seconds', 'Time each ingestion cycle spent in each stage',
+                                 ['kind', 'stage'])
+DATA_PUBLISH_LAG = Histogram('nba_data_publish_lag_seconds', 'Time from upstream fetch to the read replica, by table',
+                             ['table'], buckets=FRESHNESS_BUCKETS)
+DB_WRITE_LATENCY = Histogram('nba_db_write_seconds', 'Time spent writing a leaderboard table', ['table'])
+DB_READ_LATENCY = Histogram('nba_db_read_seconds', 'Time spent reading a leaderboard table from disk', ['table'])
+DB_ROWS_WRITTEN = Counter('nba_db_rows_written_total', 'Rows written to leaderboard tables', ['table'])
+
+# Scheduler
+EXECUTOR_QUEUE_DEPTH = Gauge('nba_executor_queue_depth', 'Tasks waiting in an ingestion pool', ['pool'])
+EXECUTOR_WAIT = Histogram('nba_executor_wait_seconds', 'Time tasks waited in an ingestion pool by priority',
+                          ['pool', 'priority'])
+JOB_DURATION = Histogram('nba_scheduler_job_seconds', 'Duration of scheduled jobs', ['job'])
+JOB_LAG = Histogram('nba_scheduler_job_lag_seconds', 'Delay between a job\'s scheduled and actual start', ['job'])
+JOB_MISSED = Counter('nba_scheduler_jobs_missed_total', 'Scheduled runs skipped past their misfire grace time', ['job'])
+
+# Serving
+REQUEST_LATENCY = Histogram('nba_http_request_seconds', 'Time to produce a response by route', ['route', 'method', 'status'])
+LIVE_STREAMS_REJECTED = Counter('nba_live_streams_rejected_total', 'Live streams refused because the process had '
+                                'MAX_LIVE_STREAMS open')
+LIVE_STREAMS_OPEN = Gauge('nba_live_streams_open', 'Live streams the process holds open, out of MAX_LIVE_STREAMS')
+DATA_FRESHNESS = Histogram('nba_data_freshness_seconds', 'Age of the upstream data behind each API response, by table',
+                           ['table'], buckets=FRESHNESS_BUCKETS)
+
+# Process memory
+MEMORY_RSS_BYTES = Gauge('nba_process_resident_memory_bytes', 'Resident set size of the process')
+MEMORY_TRACED_BYTES = Gauge('nba_traced_memory_bytes', 'Python memory traced by tracemalloc', ['kind'])
+MEMORY_JOB_PEAK_BYTES = Gauge('nba_job_traced_memory_peak_bytes', 'Traced memory peak during the last run of a job', ['job'])
+
+# Logging
+LOG_RECORDS_DROPPED = Counter('nba_log_records_dropped_total', 'Log records dropped because the log writer fell behind',
+                              ['level'])
+
+# Deployment
+INGESTION_LEADER = Gauge('nba_ingestion_leader', 'Whether this process holds ingestion leadership')
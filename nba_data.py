@@ -1,23 +1,20 @@
 # nba_data.py - Improved version with better error handling and debugging
 
 from nba_api.stats.endpoints import ScoreboardV2, BoxScoreTraditionalV2
-from nba_api.stats.static import players
 from datetime import datetime, timedelta
 import pandas as pd
 import logging
-import sys
+import re
 import time
 import json
+import threading
 from requests.exceptions import RequestException
-
-# Configure logging to console
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from concurrent.futures import as_completed
+from metrics import UPSTREAM_LATENCY, UPSTREAM_RETRIES, BOX_SCORES
+from executors import io_pool, PRIORITY_LIVE, PRIORITY_COMPLETED
+from box_score_cache import BoxScoreCache
+import tracing
+from log_config import log_sampled
 
 # Try to patch the NBA API to use custom headers
 try:
@@ -58,6 +55,41 @@ try:
 except Exception as e:
     logging.warning(f"Could not patch NBA API headers: {e}")
 
+# Box scores of completed games fetched by earlier runs
+final_box_scores = BoxScoreCache()
+
+# Latest known state of each recent game, from scoreboards and live box
+# scores, and the IDs of those that changed since ingestion last saved them
+_games = {}
+_changed_game_ids = set()
+_box_score_game_ids = set()
+_games_lock = threading.Lock()
+
+# Days a game is remembered after its date
+GAME_RETENTION_DAYS = 2
+
+def fetch_with_retries(endpoint, description, fetch, max_retries=3):
+    """Call an nba_api endpoint with exponential backoff, recording latency, retries and the fetch in the current trace"""
+    retry_count = 0
+    stage = 'scoreboard_fetch' if endpoint.startswith('Scoreboard') else 'box_score_fetch'
+    
+    while True:
+        start = time.perf_counter()
+        try:
+            with tracing.span(stage):
+                result = fetch()
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, outcome='success')
+            tracing.record_fetch()
+            return result
+        except Exception:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, outcome='error')
+            retry_count += 1
+            if retry_count == max_retries:
+                raise
+            UPSTREAM_RETRIES.inc(endpoint=endpoint)
+            logging.warning(f"Retry {retry_count}/{max_retries} for {description}")
+            time.sleep(2 ** retry_count)  # Exponential backoff
+
 def parse_minutes(minutes_str):
     """Parse ISO 8601 duration format from NBA API (e.g., 'PT17M14.00S')"""
     try:
@@ -115,6 +147,98 @@ def format_minutes(minutes_value):
         logging.error(f"Error formatting minutes {minutes_value}: {str(e)}")
         return "0:00"
 
+def _int_or_none(value):
+    try:
+        return int(value) if value is not None and value == value else None
+    except (TypeError, ValueError):
+        return None
+
+def _text_or_none(value):
+    return (value.strip() or None) if isinstance(value, str) else None
+
+def format_game_clock(clock):
+    """Format a live game clock like 'PT05M12.00S' as '5:12'"""
+    match = re.match(r'PT(\d+)M(\d+)', clock or '')
+    if not match:
+        return _text_or_none(clock)
+    return f"{int(match.group(1))}:{int(match.group(2)):02d}"
+
+def _record_games(games, from_box_score=False):
+    """Merge newly seen game states into the known games, noting which changed.
+
+    The live box score runs ahead of ScoreboardV2, so once a game has been
+    seen in one, the scoreboard only updates it when the status moves on.
+    """
+    with _games_lock:
+        for game in games:
+            known = _games.setdefault(game['game_id'], {'game_id': game['game_id']})
+            if from_box_score:
+                _box_score_game_ids.add(game['game_id'])
+            elif game['game_id'] in _box_score_game_ids and game.get('status') == known.get('status'):
+                continue
+            updates = {field: value for field, value in game.items() if value is not None}
+            if any(known.get(field) != value for field, value in updates.items()):
+                known.update(updates)
+                _changed_game_ids.add(game['game_id'])
+
+def take_game_updates():
+    """Games whose state changed since the last call, for ingestion to save"""
+    cutoff = (datetime.now() - timedelta(days=GAME_RETENTION_DAYS)).strftime('%Y-%m-%d')
+    with _games_lock:
+        changed = [dict(_games[game_id]) for game_id in _changed_game_ids]
+        _changed_game_ids.clear()
+        
+        # Forget games that have dropped off every scoreboard we fetch
+        for game_id in [game_id for game_id, game in _games.items() if game.get('game_date', cutoff) < cutoff]:
+            del _games[game_id]
+            _box_score_game_ids.discard(game_id)
+    return changed
+
+def _scoreboard_games(scoreboard):
+    """Game rows of a ScoreboardV2 response, with teams and scores from its line score"""
+    try:
+        header = scoreboard.game_header.get_data_frame()
+        line_score = scoreboard.line_score.get_data_frame()
+        teams = {(team['GAME_ID'], team['TEAM_ID']): team for team in line_score.to_dict('records')}
+        
+        games = []
+        for game in header.to_dict('records'):
+            home = teams.get((game['GAME_ID'], game.get('HOME_TEAM_ID')), {})
+            away = teams.get((game['GAME_ID'], game.get('VISITOR_TEAM_ID')), {})
+            games.append({
+                'game_id': game['GAME_ID'],
+                'game_date': (_text_or_none(game.get('GAME_DATE_EST')) or '')[:10] or None,
+                'home_team': _text_or_none(home.get('TEAM_ABBREVIATION')),
+                'away_team': _text_or_none(away.get('TEAM_ABBREVIATION')),
+                'status': _int_or_none(game.get('GAME_STATUS_ID')),
+                'status_text': _text_or_none(game.get('GAME_STATUS_TEXT')),
+                'period': _int_or_none(game.get('LIVE_PERIOD')),
+                'clock': _text_or_none(game.get('LIVE_PC_TIME')),
+                'home_score': _int_or_none(home.get('PTS')),
+                'away_score': _int_or_none(away.get('PTS'))
+            })
+        return games
+    except Exception as e:
+        logging.error(f"Error reading games from scoreboard: {str(e)}")
+        return []
+
+def _box_score_game(game_id, game_data):
+    """Game row of a live box score"""
+    home_team = game_data.get('homeTeam', {})
+    away_team = game_data.get('awayTeam', {})
+    return {
+        'game_id': game_id,
+        'game_date': (_text_or_none(game_data.get('gameEt')) or '')[:10] or None,
+        'home_team': _text_or_none(home_team.get('teamTricode')),
+        'away_team': _text_or_none(away_team.get('teamTricode')),
+        'status': _int_or_none(game_data.get('gameStatus')),
+        'status_text': _text_or_none(game_data.get('gameStatusText')),
+        'period': _int_or_none(game_data.get('period')),
+        'clock': format_game_clock(game_data.get('gameClock')),
+        'home_score': _int_or_none(home_team.get('score')),
+        'away_score': _int_or_none(away_team.get('score'))
+    }
+
 def test_nba_api_connection():
     """Test if we can connect to NBA API"""
     try:
@@ -122,7 +246,8 @@ def test_nba_api_connection():
         today = datetime.now().strftime('%m/%d/%Y')
         logging.info(f"Testing NBA API connection with date: {today}")
         
-        scoreboard = ScoreboardV2(game_date=today)
+        scoreboard = fetch_with_retries('ScoreboardV2', f"date {today}",
+                                        lambda: ScoreboardV2(game_date=today), max_retries=1)
         games_df = scoreboard.game_header.get_data_frame()
         
         logging.info(f"Successfully connected to NBA API. Found {len(games_df)} games.")
@@ -156,22 +281,12 @@ def get_games_last_12_hours():
             logging.info(f"Fetching games for {game_date}")
             
             try:
-                # Add retry logic for individual API calls
-                max_retries = 3
-                retry_count = 0
-                
-                while retry_count < max_retries:
-                    try:
-                        # Get scoreboard data
-                        scoreboard = ScoreboardV2(game_date=game_date)
-                        games_df = scoreboard.game_header.get_data_frame()
-                        break
-                    except Exception as e:
-                        retry_count += 1
-                        if retry_count == max_retries:
-                            raise e
-                        logging.warning(f"Retry {retry_count}/{max_retries} for date {game_date}")
-                        time.sleep(2 ** retry_count)  # Exponential backoff
+                # Get scoreboard data, retrying individual API calls
+                scoreboard = fetch_with_retries('ScoreboardV2', f"date {game_date}",
+                                                lambda: ScoreboardV2(game_date=game_date))
+                with tracing.span('parse'):
+                    games_df = scoreboard.game_header.get_data_frame()
+                    _record_games(_scoreboard_games(scoreboard))
                 
                 # Log all game statuses for debugging
                 if not games_df.empty:
@@ -200,53 +315,79 @@ def get_games_last_12_hours():
         logging.error(traceback.format_exc())
         return []
 
-def get_player_stats(game_ids):
-    """
-    Fetch detailed player statistics for specified games
+def _fetch_box_score(game_id):
+    """Fetch the box score of one completed game, returning its player stats and when they arrived"""
+    logging.info(f"Fetching stats for game ID: {game_id}")
+    
+    # Get box score data, with retries
+    box_score = fetch_with_retries('BoxScoreTraditionalV2', f"game {game_id}",
+                                   lambda: BoxScoreTraditionalV2(game_id=game_id))
+    fetched_at = time.time()
+    BOX_SCORES.inc(source='fetched')
+    
+    with tracing.span('parse'):
+        player_stats = box_score.player_stats.get_data_frame()
+        
+        # Ensure PLUS_MINUS column exists and is properly formatted
+        if 'PLUS_MINUS' not in player_stats.columns:
+            logging.warning(f"PLUS_MINUS column not found in API response for game {game_id}, adding default values")
+            player_stats['PLUS_MINUS'] = 0
+        else:
+            # Convert to numeric values, handle any string values
+            player_stats['PLUS_MINUS'] = pd.to_numeric(player_stats['PLUS_MINUS'], errors='coerce').fillna(0)
+    
+    return player_stats, fetched_at
+
+def _scoreboard_state(game_id):
+    """What the scoreboards last showed of a game; a stat correction to the score moves it"""
+    with _games_lock:
+        game = _games.get(game_id, {})
+        return tuple(game.get(field) for field in ('status', 'status_text', 'home_score', 'away_score'))
+
+def iter_player_stats(game_ids):
+    """Yield (game IDs, player stats) batches as box scores become available.
+
+    Box scores cached by earlier runs that are still valid come first as one
+    batch, then each fetched game on its own as soon as its request
+    completes, so only one game's stats need to be handled at a time.
+    Cached box scores count in the current trace as of when they were fetched.
     """
-    all_player_stats = []
+    game_ids = list(dict.fromkeys(game_ids))
+    final_box_scores.retain(game_ids)
     
-    for game_id in game_ids:
+    cached = {game_id: final_box_scores.get(game_id, _scoreboard_state(game_id)) for game_id in game_ids}
+    cached = {game_id: entry for game_id, entry in cached.items() if entry is not None}
+    if cached:
+        BOX_SCORES.inc(len(cached), source='cached')
+        for entry in cached.values():
+            tracing.record_fetch(fetched_at=entry.fetched_at)
+        yield list(cached), pd.concat([entry.player_stats for entry in cached.values()])
+    
+    # Fetch every uncached game at once on the I/O pool, behind any live fetches
+    pending = {io_pool.submit(PRIORITY_COMPLETED, _fetch_box_score, game_id): game_id
+               for game_id in game_ids if game_id not in cached}
+    
+    for future in as_completed(pending):
+        game_id = pending[future]
         try:
-            logging.info(f"Fetching stats for game ID: {game_id}")
-            
-            # Add retry logic
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    # Get box score data
-                    box_score = BoxScoreTraditionalV2(game_id=game_id)
-                    player_stats = box_score.player_stats.get_data_frame()
-                    break
-                except Exception as e:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        raise e
-                    logging.warning(f"Retry {retry_count}/{max_retries} for game {game_id}")
-                    time.sleep(2 ** retry_count)
-            
-            # Ensure PLUS_MINUS column exists and is properly formatted
-            if 'PLUS_MINUS' not in player_stats.columns:
-                logging.warning(f"PLUS_MINUS column not found in API response for game {game_id}, adding default values")
-                player_stats['PLUS_MINUS'] = 0
-            else:
-                # Convert to numeric values, handle any string values
-                player_stats['PLUS_MINUS'] = pd.to_numeric(player_stats['PLUS_MINUS'], errors='coerce').fillna(0)
-            
-            # Add to our collection
-            if not player_stats.empty:
-                all_player_stats.append(player_stats)
-                logging.info(f"Successfully fetched stats for {len(player_stats)} players")
-            else:
-                logging.warning(f"No player stats found for game {game_id}")
-                
+            player_stats, fetched_at = future.result()
         except Exception as e:
             logging.error(f"Error fetching player stats for game {game_id}: {str(e)}")
-            import traceback
-            logging.error(traceback.format_exc())
             continue
+        
+        if player_stats.empty:
+            logging.warning(f"No player stats found for game {game_id}")
+            continue
+        
+        final_box_scores.put(game_id, player_stats, _scoreboard_state(game_id), fetched_at)
+        logging.info(f"Successfully fetched stats for {len(player_stats)} players")
+        yield [game_id], player_stats
+
+def get_player_stats(game_ids):
+    """
+    Fetch detailed player statistics for specified games
+    """
+    all_player_stats = [player_stats for _, player_stats in iter_player_stats(game_ids)]
     
     # Combine all stats if we have any
     if all_player_stats:
@@ -275,8 +416,11 @@ def get_live_games():
             today_game_date = datetime.now().strftime('%m/%d/%Y')
             logging.info(f"Fetching games for today ({today_game_date})")
             
-            today_scoreboard = ScoreboardV2(game_date=today_game_date)
-            today_games_df = today_scoreboard.game_header.get_data_frame()
+            today_scoreboard = fetch_with_retries('ScoreboardV2', f"date {today_game_date}",
+                                                  lambda: ScoreboardV2(game_date=today_game_date), max_retries=1)
+            with tracing.span('parse'):
+                today_games_df = today_scoreboard.game_header.get_data_frame()
+                _record_games(_scoreboard_games(today_scoreboard))
             
             if not today_games_df.empty:
                 # Log all game statuses for debugging
@@ -300,8 +444,11 @@ def get_live_games():
             yesterday_game_date = yesterday.strftime('%m/%d/%Y')
             logging.info(f"Fetching games for yesterday ({yesterday_game_date})")
             
-            yesterday_scoreboard = ScoreboardV2(game_date=yesterday_game_date)
-            yesterday_games_df = yesterday_scoreboard.game_header.get_data_frame()
+            yesterday_scoreboard = fetch_with_retries('ScoreboardV2', f"date {yesterday_game_date}",
+                                                      lambda: ScoreboardV2(game_date=yesterday_game_date), max_retries=1)
+            with tracing.span('parse'):
+                yesterday_games_df = yesterday_scoreboard.game_header.get_data_frame()
+                _record_games(_scoreboard_games(yesterday_scoreboard))
             
             if not yesterday_games_df.empty:
                 # Log yesterday's game statuses for debugging
@@ -320,6 +467,8 @@ def get_live_games():
         except Exception as e:
             logging.error(f"Error fetching yesterday's games: {str(e)}")
         
+        # A game can be on both days' scoreboards around midnight
+        all_live_games = list(dict.fromkeys(all_live_games))
         logging.info(f"Found a total of {len(all_live_games)} live games")
         return all_live_games
         
@@ -336,30 +485,24 @@ def get_live_player_stats(game_ids):
         
         all_player_stats = []
         
+        # Fetch every game at once on the I/O pool, ahead of any completed-game fetches
+        pending = {game_id: io_pool.submit(PRIORITY_LIVE, fetch_with_retries, 'live.BoxScore', f"live game {game_id}",
+                                           lambda game_id=game_id: boxscore.BoxScore(game_id=game_id).get_dict())
+                   for game_id in game_ids}
+        
         for game_id in game_ids:
             try:
                 logging.info(f"Fetching live stats for game ID: {game_id}")
                 
-                # Add retry logic
-                max_retries = 3
-                retry_count = 0
-                
-                while retry_count < max_retries:
-                    try:
-                        # Use the live boxscore endpoint
-                        live_box = boxscore.BoxScore(game_id=game_id)
-                        live_data = live_box.get_dict()
-                        break
-                    except Exception as e:
-                        retry_count += 1
-                        if retry_count == max_retries:
-                            raise e
-                        logging.warning(f"Retry {retry_count}/{max_retries} for live game {game_id}")
-                        time.sleep(2 ** retry_count)
+                # Use the live boxscore endpoint, with retries
+                live_data = pending[game_id].result()
+                parse_start = time.perf_counter()
+                tracing.record_source_time(live_data.get('meta', {}).get('time'))
                 
                 # Extract player stats from the live data
                 if 'game' in live_data:
                     game_data = live_data['game']
+                    _record_games([_box_score_game(game_id, game_data)], from_box_score=True)
                     
                     # Process home team
                     if 'homeTeam' in game_data:
@@ -377,6 +520,8 @@ def get_live_player_stats(game_ids):
                                 minutes_display = format_minutes(minutes_value)
                                 
                                 player_stats = {
+                                    'GAME_ID': game_id,
+                                    'PLAYER_ID': player.get('personId'),
                                     'PLAYER_NAME': f"{player.get('firstName', '')} {player.get('familyName', '')}",
                                     'TEAM_ABBREVIATION': home_abbr,
                                     'MIN': minutes_display,
@@ -413,6 +558,8 @@ def get_live_player_stats(game_ids):
                                 minutes_display = format_minutes(minutes_value)
                                 
                                 player_stats = {
+                                    'GAME_ID': game_id,
+                                    'PLAYER_ID': player.get('personId'),
                                     'PLAYER_NAME': f"{player.get('firstName', '')} {player.get('familyName', '')}",
                                     'TEAM_ABBREVIATION': away_abbr,
                                     'MIN': minutes_display,
@@ -433,6 +580,8 @@ def get_live_player_stats(game_ids):
                                 }
                                 
                                 all_player_stats.append(player_stats)
+                
+                tracing.record('parse', time.perf_counter() - parse_start)
                                 
             except Exception as e:
                 logging.error(f"Error processing live game {game_id}: {str(e)}")
@@ -441,8 +590,10 @@ def get_live_player_stats(game_ids):
                 continue
         
         if all_player_stats:
-            df = pd.DataFrame(all_player_stats)
-            logging.info(f"Created DataFrame with {len(df)} players. Columns: {df.columns.tolist()}")
+            with tracing.span('parse'):
+                df = pd.DataFrame(all_player_stats)
+            logging.info(f"Created DataFrame with {len(df)} live players")
+            log_sampled('live_columns', lambda: f"Live player columns: {df.columns.tolist()}")
             return df
         
         return pd.DataFrame()
@@ -0,0 +1,176 @@
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from database import get_replica_snapshots, ROLLING_SPANS
+
+# Most players one search returns
+MAX_SEARCH_RESULTS = 25
+
+# Letters per n-gram in the fuzzy index, and the least n-gram overlap a fuzzy match needs
+NGRAM_SIZE = 3
+MIN_FUZZY_SIMILARITY = 0.3
+
+# Tables whose rows feed the index and the scores shown with each result
+_SCORE_TABLES = ('top_scorers', 'live_players', 'player_aggregates')
+
+def normalize_name(name):
+    """Lower-case a name and drop accents and punctuation, so 'Luka Dončić' matches 'luka doncic'"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    unaccented = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.sub(r"[^a-z0-9 ]", '', unaccented.lower().replace('-', ' ')).split())
+
+def _ngrams(text):
+    padded = f" {text} "
+    return {padded[start:start + NGRAM_SIZE] for start in range(len(padded) - NGRAM_SIZE + 1)}
+
+class PlayerIndex:
+    """Immutable prefix and n-gram index over player names.
+
+    Prefix lookups binary-search a sorted list holding every name from each
+    of its words on, so 'jam' and 'lebron ja' both find LeBron James. Names
+    that no prefix matches are found by the n-grams they share with the
+    query, which tolerates typos.
+    """
+
+    def __init__(self, players):
+        # players maps player_id to (name, is_active)
+        self.players = players
+        keys = []
+        self._ngrams = defaultdict(set)
+        self._ngram_counts = {}
+        for player_id, (name, _) in players.items():
+            words = normalize_name(name).split()
+            keys.extend((' '.join(words[position:]), player_id) for position in range(len(words)))
+            grams = _ngrams(' '.join(words))
+            self._ngram_counts[player_id] = len(grams)
+            for gram in grams:
+                self._ngrams[gram].add(player_id)
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._key_players = [player_id for _, player_id in keys]
+
+        # Active players before retired ones, then by name
+        ranked = sorted(players, key=lambda player_id: (not players[player_id][1], players[player_id][0]))
+        self.rank = {player_id: position for position, player_id in enumerate(ranked)}
+
+    def prefix_matches(self, query):
+        """IDs of the players with a name or surname starting with a normalized query"""
+        matches = {}
+        position = bisect.bisect_left(self._keys, query)
+        while position < len(self._keys) and self._keys[position].startswith(query):
+            matches[self._key_players[position]] = None
+            position += 1
+        return list(matches)
+
+    def fuzzy_matches(self, query):
+        """IDs of the players whose name shares enough n-grams with a normalized query, closest first"""
+        grams = _ngrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._ngrams.get(gram, ()))
+
+        similarity = {player_id: count / (len(grams) + self._ngram_counts[player_id] - count)
+                      for player_id, count in shared.items()}
+        return sorted((player_id for player_id, score in similarity.items() if score >= MIN_FUZZY_SIMILARITY),
+                      key=lambda player_id: -similarity[player_id])
+
+# The current index and each player's scores, replaced wholesale so searches never take a lock
+_index = PlayerIndex({})
+_latest_scores = {}
+_rolling_scores = {}
+_build_lock = threading.Lock()
+
+def _snapshot_players(snapshot, value_column):
+    """Map player_id to (name, team, value) for the rows of a snapshot that carry a player ID"""
+    if not snapshot.rows or 'player_id' not in snapshot.columns:
+        return {}
+    index = {name: position for position, name in enumerate(snapshot.columns)}
+    return {row[index['player_id']]: (row[index['player_name']], row[index['team']], row[index[value_column]])
+            for row in snapshot.rows if row[index['player_id']] is not None}
+
+def _rolling_from(snapshot):
+    """Per-game average score of every player in each rolling span"""
+    rolling = defaultdict(dict)
+    if snapshot.rows:
+        index = {name: position for position, name in enumerate(snapshot.columns)}
+        for row in snapshot.rows:
+            games = row[index['games']]
+            if games:
+                rolling[row[index['player_id']]][row[index['span']]] = round(row[index['custom_score']] / games, 2)
+    return dict(rolling)
+
+def _update(top_snapshot, live_snapshot, aggregates_snapshot):
+    """Refresh the scores from the given snapshots, rebuilding the index if they name new players"""
+    global _index, _latest_scores, _rolling_scores
+    completed = _snapshot_players(top_snapshot, 'custom_score')
+    live = _snapshot_players(live_snapshot, 'custom_score')
+    latest = {player_id: (name, team, score, 'completed') for player_id, (name, team, score) in completed.items()}
+    latest.update((player_id, (name, team, score, 'live')) for player_id, (name, team, score) in live.items())
+    rolling = _rolling_from(aggregates_snapshot)
+    history = _snapshot_players(aggregates_snapshot, 'team')
+
+    with _build_lock:
+        seen = {player_id: (name, True) for player_id, (name, _, _) in {**history, **completed, **live}.items()}
+        new_players = {player_id: player for player_id, player in seen.items() if player_id not in _index.players}
+        if new_players:
+            _index = PlayerIndex({**_index.players, **new_players})
+        _latest_scores = latest
+        _rolling_scores = rolling
+
+def build_index():
+    """Index the static NBA player list plus every player in our leaderboards and history"""
+    global _index
+    start = time.perf_counter()
+    try:
+        from nba_api.stats.static import players
+        static_players = {player['id']: (player['full_name'], player['is_active']) for player in players.get_players()}
+    except Exception as e:
+        logging.error(f"Could not load the static player list: {str(e)}")
+        static_players = {}
+
+    with _build_lock:
+        _index = PlayerIndex(static_players)
+    _update(*get_replica_snapshots(_SCORE_TABLES))
+    logging.info(f"Built player search index of {len(_index.players)} players "
+                 f"in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+def on_replica_publish(table, snapshot):
+    """Replica listener keeping scores, and the index, up to date with each publish"""
+    if table in _SCORE_TABLES:
+        _update(*get_replica_snapshots(_SCORE_TABLES))
+
+def search_players(query, limit=10):
+    """Players whose name starts with, or failing that resembles, query, with their latest and rolling EPA"""
+    normalized = normalize_name(query)
+    if not normalized:
+        return []
+    index, latest, rolling = _index, _latest_scores, _rolling_scores
+
+    limit = min(limit, MAX_SEARCH_RESULTS)
+
+    # Players with recent games first, then active players, then by name
+    matches = heapq.nsmallest(limit, index.prefix_matches(normalized),
+                              key=lambda player_id: (player_id not in latest and player_id not in rolling,
+                                                     index.rank[player_id]))
+    if not matches:
+        matches = index.fuzzy_matches(normalized)[:limit]
+
+    results = []
+    for player_id in matches:
+        name, is_active = index.players[player_id]
+        _, team, latest_score, source = latest.get(player_id, (None, None, None, None))
+        results.append({
+            'player_id': player_id,
+            'player_name': name,
+            'team': team,
+            'is_active': is_active,
+            'latest_score': latest_score,
+            'latest_source': source,
+            'rolling_scores': {span: rolling.get(player_id, {}).get(span) for span in ROLLING_SPANS}
+        })
+    return results
@@ -0,0 +1,241 @@
+import cProfile
+import contextvars
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from datetime import datetime
+
+# Profiling is off unless explicitly enabled, and always needs the admin token
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# Seconds between stack samples in 'sample' mode
+SAMPLE_INTERVAL = 0.005
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+def has_admin_token(token):
+    """Whether token is the configured admin token"""
+    return bool(PROFILING_TOKEN) and hmac.compare_digest(token or '', PROFILING_TOKEN)
+
+def is_authorized(token):
+    """Whether profiling is enabled and token is the admin token"""
+    return PROFILING_ENABLED and has_admin_token(token)
+
+def _report_path(label, extension):
+    """Path for a new report named after what was profiled and when"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_label = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'profile'
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return os.path.join(PROFILE_DIR, f"{timestamp}_{safe_label}.{extension}")
+
+# The profiling session of the code running in this context. Work queued on
+# executors.PriorityExecutor runs in a copy of the submitter's context, so
+# fetches and writes a profiled job hands to the pools land in its profile.
+_active_session = contextvars.ContextVar('profile_session', default=None)
+
+class _StackSampler(threading.Thread):
+    """Sample some threads' Python stacks at a fixed interval into collapsed stacks, each under its thread's name"""
+
+    def __init__(self):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.stacks = StackCounter()
+        self._threads = {}
+        self._threads_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def add_current_thread(self):
+        with self._threads_lock:
+            self._threads[threading.get_ident()] = threading.current_thread().name
+
+    def remove_current_thread(self):
+        with self._threads_lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def run(self):
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            with self._threads_lock:
+                threads = dict(self._threads)
+            frames = sys._current_frames()
+            for thread_id, thread_name in threads.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join([thread_name] + stack[::-1])] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class ProfileSession:
+    """One profiling run of the current thread, saved to PROFILE_DIR when stopped.
+
+    Work the profiled code queues on the executor pools while the session
+    runs is profiled too, on the pool threads, and lands in the same report.
+    'cprofile' mode writes a pstats file (for snakeviz and friends) plus a text
+    summary; 'sample' mode writes collapsed stacks that flamegraph.pl and
+    speedscope read directly, each under the name of the thread it ran on.
+    """
+
+    def __init__(self, label, mode='cprofile'):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode}")
+        self.label = label
+        self.mode = mode
+        self._profiler = None
+        self._task_profilers = []
+        self._sampler = None
+        self._start = None
+        self._token = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _StackSampler()
+            self._sampler.add_current_thread()
+            self._sampler.start()
+        self._token = _active_session.set(self)
+        return self
+
+    @contextmanager
+    def task(self):
+        """Profile the with-block, run on another thread on behalf of the profiled code"""
+        with self._lock:
+            if self._stopped:
+                profiler = None
+            elif self.mode == 'cprofile':
+                # A cProfile.Profile only follows one thread, so each task gets its own
+                profiler = cProfile.Profile()
+                self._task_profilers.append(profiler)
+            else:
+                profiler = None
+                self._sampler.add_current_thread()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elif self._sampler is not None:
+                self._sampler.remove_current_thread()
+
+    def stop(self):
+        """Stop profiling and write the report, returning its path"""
+        elapsed = time.perf_counter() - self._start
+        try:
+            _active_session.reset(self._token)
+        except ValueError:
+            # Stopped from another context than it started in, which has nothing to undo
+            pass
+        with self._lock:
+            self._stopped = True
+            task_profilers = list(self._task_profilers)
+        try:
+            if self.mode == 'cprofile':
+                self._profiler.disable()
+                path = _report_path(self.label, 'prof')
+                stats = pstats.Stats(self._profiler)
+                for profiler in task_profilers:
+                    stats.add(profiler)
+                stats.dump_stats(path)
+
+                summary = io.StringIO()
+                stats.stream = summary
+                stats.sort_stats('cumulative').print_stats(50)
+                with open(path[:-len('.prof')] + '.txt', 'w') as f:
+                    f.write(f"{self.label} took {elapsed:.3f}s\n\n{summary.getvalue()}")
+            else:
+                self._sampler.stop()
+                path = _report_path(self.label, 'folded')
+                with open(path, 'w') as f:
+                    for stack, count in self._sampler.stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+
+            logging.info(f"Saved {self.mode} profile of {self.label} ({elapsed:.3f}s) to {path}")
+            return path
+
+        except Exception as e:
+            logging.error(f"Error saving profile of {self.label}: {str(e)}")
+            return None
+
+# Remaining profiled runs armed per scheduler job: job id -> (runs, mode)
+_armed_jobs = {}
+_armed_lock = threading.Lock()
+
+def arm_job(job_id, runs=1, mode='cprofile'):
+    """Profile the next runs of a named scheduler job"""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode}")
+    with _armed_lock:
+        if runs > 0:
+            _armed_jobs[job_id] = (runs, mode)
+        else:
+            _armed_jobs.pop(job_id, None)
+
+def armed_jobs():
+    """Jobs with profiled runs pending"""
+    with _armed_lock:
+        return {job_id: {'runs': runs, 'mode': mode} for job_id, (runs, mode) in _armed_jobs.items()}
+
+def run_profiled(func, *args, **kwargs):
+    """Run func, adding it to the profile of the code that queued it when that is being profiled"""
+    session = _active_session.get()
+    if session is None:
+        return func(*args, **kwargs)
+    with session.task():
+        return func(*args, **kwargs)
+
+def run_job(job_id, func):
+    """Run a scheduler job, profiling it if a run is armed for it"""
+    with _armed_lock:
+        armed = _armed_jobs.get(job_id)
+        if armed is not None:
+            runs, mode = armed
+            if runs > 1:
+                _armed_jobs[job_id] = (runs - 1, mode)
+            else:
+                del _armed_jobs[job_id]
+
+    if armed is None:
+        return func()
+
+    session = ProfileSession(f"job_{job_id}", armed[1]).start()
+    try:
+        return func()
+    finally:
+        session.stop()
+
+def list_profiles():
+    """Saved reports, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            profiles.append({
+                'name': name,
+                'size': stat.st_size,
+                'created': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+            })
+    return sorted(profiles, key=lambda profile: profile['name'], reverse=True)
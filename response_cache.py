@@ -0,0 +1,126 @@
+import threading
+import logging
+from collections import namedtuple
+from compression import compress
+
+# A fully encoded response body, valid for exactly one data version, along
+# with its compressed variants keyed by content coding
+CachedResponse = namedtuple('CachedResponse', ['version', 'body', 'compressed'])
+
+class _Build:
+    """One in-flight build of a cache entry or compressed body"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class ResponseCache:
+    """Cache of encoded response bodies keyed by endpoint and data version.
+
+    The leaderboards only change when ingestion saves a new version, so a
+    payload only has to be built, encoded and compressed once per version.
+    A hit is a dictionary lookup and the bytes go straight to the socket.
+    Requests that miss while the same body is being built wait for that
+    build instead of starting their own, so a new version is built once
+    however many requests arrive with it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._building = {}
+
+    def _build_once(self, build_key, build):
+        """Run build() once for build_key however many threads ask at the same time, all getting its result"""
+        with self._lock:
+            in_flight = self._building.get(build_key)
+            if in_flight is None:
+                in_flight = self._building[build_key] = _Build()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            in_flight.result = build()
+            return in_flight.result
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._building[build_key]
+            in_flight.done.set()
+
+    def _get_entry(self, key, version):
+        """Return the cached entry for key if it was built for this version"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            return entry
+        return None
+
+    def get(self, key, version):
+        """Return the cached body for key if it was built for this version"""
+        entry = self._get_entry(key, version)
+        return entry.body if entry is not None else None
+
+    def _get_or_build_entry(self, key, version, build):
+        """Return the cached entry for key, building it with build() on a miss"""
+        entry = self._get_entry(key, version)
+        if entry is not None:
+            return entry
+        return self._build_once((key, version), lambda: self._build_entry(key, version, build))
+
+    def _build_entry(self, key, version, build):
+        # A build that finished just before this one started has already done the work
+        entry = self._get_entry(key, version)
+        if entry is not None:
+            return entry
+
+        entry = CachedResponse(version, build(), {})
+        with self._lock:
+            # Never replace a body built for a newer version
+            current = self._entries.get(key)
+            if current is None or current.version <= version:
+                self._entries[key] = entry
+
+        logging.debug(f"Built response cache entry {key} for version {version}")
+        return entry
+
+    def get_or_build(self, key, version, build, encoding=None):
+        """Return the cached body for key, building it with build() on a miss.
+
+        With an encoding, the body compressed with that content coding is
+        returned instead, compressed on first use and kept with the entry.
+        """
+        entry = self._get_or_build_entry(key, version, build)
+        if encoding is None:
+            return entry.body
+
+        body = entry.compressed.get(encoding)
+        if body is None:
+            body = self._build_once((key, version, encoding), lambda: self._compress_entry(entry, encoding))
+        return body
+
+    def _compress_entry(self, entry, encoding):
+        body = entry.compressed.get(encoding)
+        if body is None:
+            body = compress(entry.body, encoding)
+            with self._lock:
+                entry.compressed[encoding] = body
+        return body
+
+    def clear(self):
+        """Drop every cached body"""
+        with self._lock:
+            self._entries.clear()
+
+# Shared cache used by the API routes
+response_cache = ResponseCache()
@@ -1,13 +1,34 @@
 import pandas as pd
 import logging
+from log_config import log_sampled
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='scoring.log'
-)
+# Weight of each stat in the custom score, in the order the terms are summed
+# (the total is then divided by 10)
+SCORE_WEIGHTS = {
+    'PTS': 4.5546,
+    'OREB': 1.1876,
+    'DREB': 1.1876,
+    'AST': 1.8509,
+    'STL': 12.1842,
+    'BLK': 4.0437,
+    'TO': -3.5363,
+    'FGA': -4.8825,
+    'FGM': 0,
+    'FG3M': 9.5992,
+    'FG3A': -2.2564,
+    'PF': -2.109,
+    'MIN_NUMERIC': -0.7015,
+    'PLUS_MINUS': 0.5746
+}
 
-def calculate_custom_score(player_stats):
+def weighted_score(stats, weights=None):
+    """Custom score from stat columns (DataFrame columns or arrays keyed by stat), rounded to 2 places"""
+    total = 0
+    for stat, weight in (weights or SCORE_WEIGHTS).items():
+        total = total + stats[stat] * weight
+    return (total / 10).round(2)
+
+def calculate_custom_score(player_stats, weights=None):
     """Calculate custom score based on various stats using custom formula with specific weights."""
     try:
         # Replace all None/NaN values with 0
@@ -15,7 +36,7 @@ def calculate_custom_score(player_stats):
         
         # Ensure MIN_NUMERIC exists - derive from MIN if needed
         if 'MIN_NUMERIC' not in player_stats.columns and 'MIN' in player_stats.columns:
-            logging.info("Creating MIN_NUMERIC from MIN column")
+            logging.debug("Creating MIN_NUMERIC from MIN column")
             # Convert MIN (which is typically in format like '24:30') to numerical minutes
             try:
                 player_stats['MIN_NUMERIC'] = player_stats['MIN'].apply(lambda x: 
@@ -36,27 +57,9 @@ def calculate_custom_score(player_stats):
                 logging.warning(f"Column {col} not found, using zeros")
                 player_stats[col] = 0
         
-        # Calculate custom score
-        player_stats['CUSTOM_SCORE'] = (
-            player_stats['PTS'] * 4.5546 +           
-            player_stats['OREB'] * 1.1876 +          
-            player_stats['DREB'] * 1.1876 +          
-            player_stats['AST'] * 1.8509 +           
-            player_stats['STL'] * 12.1842 +          
-            player_stats['BLK'] * 4.0437 -           
-            player_stats['TO'] * 3.5363 -           
-            player_stats['FGA'] * 4.8825 +           
-            player_stats['FGM'] * 0 +            
-            player_stats['FG3M'] * 9.5992 -          
-            player_stats['FG3A'] * 2.2564 -          
-            player_stats['PF'] * 2.109 -            
-            player_stats['MIN_NUMERIC'] * 0.7015 +
-            player_stats['PLUS_MINUS'] * 0.5746
-            )/10
-        
-        # Round to 2 decimal places
-        player_stats['CUSTOM_SCORE'] = player_stats['CUSTOM_SCORE'].round(2)
-        logging.info("Successfully calculated custom scores")
+        # Calculate custom score, rounded to 2 decimal places
+        player_stats['CUSTOM_SCORE'] = weighted_score(player_stats, weights)
+        logging.debug("Successfully calculated custom scores")
         
         return player_stats
     
@@ -67,15 +70,16 @@ def calculate_custom_score(player_stats):
         logging.error(traceback.format_exc())
         return player_stats
 
-def get_top_scorers(player_stats, limit=200, is_live=False):
+def get_top_scorers(player_stats, limit=200, is_live=False, weights=None):
     """Return the top N players based on custom score"""
     try:
         if player_stats.empty:
             logging.warning("Empty player stats dataframe provided")
             return pd.DataFrame()
         
-        # Log what we have before processing
-        logging.info(f"get_top_scorers received dataframe with columns: {player_stats.columns.tolist()}")
+        # Log what we have before processing now and then, when debugging
+        log_sampled('scoring_columns',
+                    lambda: f"get_top_scorers received dataframe with columns: {player_stats.columns.tolist()}")
         
         # Create MIN_NUMERIC from MIN if needed for scoring but don't replace MIN
         if 'MIN_NUMERIC' not in player_stats.columns:
@@ -107,18 +111,18 @@ def get_top_scorers(player_stats, limit=200, is_live=False):
             scored_players = player_stats
         
         # Calculate custom score
-        scored_players = calculate_custom_score(scored_players)
+        scored_players = calculate_custom_score(scored_players, weights)
         
         # Filter out players with 0 minutes regardless of whether it's live or completed games
         filtered_players = scored_players[scored_players['MIN_NUMERIC'] > 0]
-        logging.info(f"Filtered to {len(filtered_players)} players with minutes > 0")
+        logging.debug(f"Filtered to {len(filtered_players)} players with minutes > 0")
         
         # Sort by custom score (descending)
         top_players = filtered_players.sort_values('CUSTOM_SCORE', ascending=False).head(limit)
         
         # Ensure all needed columns are present
         needed_columns = [
-            'PLAYER_NAME', 'TEAM_ABBREVIATION', 'MIN', 'PTS', 'OREB', 'DREB',
+            'GAME_ID', 'PLAYER_ID', 'PLAYER_NAME', 'TEAM_ABBREVIATION', 'MIN', 'MIN_NUMERIC', 'PTS', 'OREB', 'DREB',
             'AST', 'STL', 'BLK', 'TO', 'FGM', 'FGA', 'FG3M', 'FG3A', 'PF','PLUS_MINUS','CUSTOM_SCORE'
         ]
         
@@ -126,9 +130,17 @@ def get_top_scorers(player_stats, limit=200, is_live=False):
         columns_to_select = [col for col in needed_columns if col in top_players.columns]
         result = top_players[columns_to_select]
         
-        logging.info(f"Returning {len(result)} players from get_top_scorers")
+        logging.debug(f"Returning {len(result)} players from get_top_scorers")
         return result
         
     except Exception as e:
         logging.error(f"Error getting top scorers: {str(e)}")
         return pd.DataFrame()
+
+def merge_top_scorers(*leaderboards, limit=200):
+    """Merge scored leaderboards into one, keeping the top N players by custom score"""
+    leaderboards = [board for board in leaderboards if not board.empty]
+    if not leaderboards:
+        return pd.DataFrame()
+    merged = pd.concat(leaderboards, ignore_index=True)
+    return merged.sort_values('CUSTOM_SCORE', ascending=False).head(limit)
@@ -0,0 +1,290 @@
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+
+# Integer box-score columns as stored in the leaderboard tables
+STAT_COLUMNS = [
+    'points', 'offensive_rebounds', 'defensive_rebounds', 'assists', 'steals', 'blocks',
+    'turnovers', 'field_goal_made', 'field_goal_attempts', 'three_point_made',
+    'three_point_attempts', 'personal_fouls', 'plus_minus'
+]
+
+# (output name, prepared column) pairs for each export format
+PLAYER_RECORD_FIELDS = [
+    ('player_name', 'player_name'), ('team', 'team'), ('minutes', 'minutes'),
+    ('points', 'points'), ('rebounds', 'rebounds'), ('assists', 'assists'),
+    ('steals', 'steals'), ('blocks', 'blocks'), ('turnovers', 'turnovers'),
+    ('field_goal_made', 'field_goal_made'), ('field_goal_attempts', 'field_goal_attempts'),
+    ('three_point_made', 'three_point_made'), ('three_point_attempts', 'three_point_attempts'),
+    ('personal_fouls', 'personal_fouls'), ('plus_minus', 'plus_minus'),
+    ('custom_score', 'custom_score'), ('game_id', 'game_id'), ('player_id', 'player_id')
+]
+
+SHEETS_FIELDS = [
+    ('Player', 'player_name'), ('Team', 'team'), ('Minutes', 'minutes_raw'),
+    ('Points', 'points'), ('OREB', 'offensive_rebounds'), ('DREB', 'defensive_rebounds'),
+    ('Total REB', 'rebounds'), ('Assists', 'assists'), ('Steals', 'steals'),
+    ('Blocks', 'blocks'), ('Turnovers', 'turnovers'), ('FGM', 'field_goal_made'),
+    ('FGA', 'field_goal_attempts'), ('FG%', 'field_goal_pct'), ('3PM', 'three_point_made'),
+    ('3PA', 'three_point_attempts'), ('3P%', 'three_point_pct'), ('Fouls', 'personal_fouls'),
+    ('+/-', 'plus_minus'), ('EPA Score', 'custom_score')
+]
+
+CSV_FIELDS = [
+    ('Player', 'player_name'), ('Team', 'team'), ('Minutes', 'minutes_raw'),
+    ('Points', 'points'), ('Off_Rebounds', 'offensive_rebounds'),
+    ('Def_Rebounds', 'defensive_rebounds'), ('Total_Rebounds', 'rebounds'),
+    ('Assists', 'assists'), ('Steals', 'steals'), ('Blocks', 'blocks'),
+    ('Turnovers', 'turnovers'), ('FG_Made', 'field_goal_made'),
+    ('FG_Attempts', 'field_goal_attempts'), ('FG_Percentage', 'field_goal_pct_label'),
+    ('Three_Made', 'three_point_made'), ('Three_Attempts', 'three_point_attempts'),
+    ('Three_Percentage', 'three_point_pct_label'), ('Personal_Fouls', 'personal_fouls'),
+    ('Plus_Minus', 'plus_minus'), ('EPA_Score', 'custom_score')
+]
+
+def _to_int(value):
+    """Coerce a stored stat to int, counting missing or unparseable values as 0"""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+def _to_float(value):
+    """Coerce a stored score to float, counting missing or unparseable values as 0.0"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if number != number else number
+
+def format_minutes(minutes):
+    """Format stored minutes like '43.0000000:28' as '43:28'.
+
+    Values without a colon, or that cannot be parsed, are passed through as-is.
+    """
+    whole, colon, seconds = str(minutes).partition(':')
+    if not colon:
+        return minutes
+    try:
+        whole = int(float(whole.split('.')[0]))
+    except (ValueError, OverflowError):
+        return minutes
+    seconds = int(seconds) if seconds.isdecimal() else 0
+    return f"{whole}:{seconds:02d}"
+
+def _percentage(made, attempts):
+    """Shooting percentage to one decimal place, '0.0' when nothing was attempted"""
+    return '%.1f' % (made * 100.0 / attempts if attempts > 0 else 0.0)
+
+def _numeric_column(values):
+    """Stored values as a float64 array, with NaN for missing or unparseable ones"""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float, copy=True)
+
+def _int_column(values):
+    """Stored stats as an int64 array, counting missing or unparseable values as 0 like _to_int"""
+    numbers = _numeric_column(values)
+    numbers[~np.isfinite(numbers)] = 0
+    return np.trunc(numbers).astype(np.int64)
+
+def _float_column(values):
+    """Stored scores as a float64 array, counting missing or unparseable values as 0.0 like _to_float"""
+    numbers = _numeric_column(values)
+    numbers[np.isnan(numbers)] = 0.0
+    return numbers
+
+def _map_distinct(func, values):
+    """func of every value of an array, called once per distinct value; a leaderboard repeats few of them"""
+    codes, distinct = pd.factorize(values)
+    mapped = np.empty(len(values), dtype=object)
+    known = codes >= 0
+    mapped[known] = np.array([func(value) for value in distinct], dtype=object)[codes[known]]
+    # factorize lumps None and NaN together, so missing values are mapped as they are
+    for position in np.flatnonzero(~known):
+        mapped[position] = func(values[position])
+    return mapped
+
+def _percentage_column(made, attempts):
+    """_percentage of every (made, attempts) pair"""
+    attempted = attempts > 0
+    ratios = np.where(attempted, made * 100.0 / np.where(attempted, attempts, 1), 0.0)
+    return _map_distinct(lambda ratio: '%.1f' % ratio, ratios)
+
+def prepare_columns(table):
+    """Compute every display and derived column of a leaderboard, a whole column at a time.
+
+    table is anything with columns and rows, such as a replica snapshot or an
+    export page, read straight from sqlite3. Stats are converted and derived
+    with numpy array operations, and minutes and percentages are formatted
+    once per distinct value rather than once per row. Returns a dict of
+    plain Python lists, one per column, that all of the output formats below
+    are assembled from.
+    """
+    index = {name: position for position, name in enumerate(table.columns)}
+    rows = table.rows
+
+    def raw(column):
+        position = index.get(column)
+        if position is None:
+            return [None] * len(rows)
+        return [row[position] for row in rows]
+
+    stats = {column: _int_column(raw(column)) for column in STAT_COLUMNS}
+    rebounds = stats['offensive_rebounds'] + stats['defensive_rebounds']
+    field_goal_pct = _percentage_column(stats['field_goal_made'], stats['field_goal_attempts'])
+    three_point_pct = _percentage_column(stats['three_point_made'], stats['three_point_attempts'])
+
+    columns = {column: values.tolist() for column, values in stats.items()}
+    columns['game_id'] = raw('game_id')
+    columns['player_id'] = raw('player_id')
+    columns['player_name'] = raw('player_name')
+    columns['team'] = raw('team')
+    columns['minutes_raw'] = raw('minutes')
+    columns['minutes'] = _map_distinct(format_minutes, np.array(columns['minutes_raw'], dtype=object)).tolist()
+    columns['rebounds'] = rebounds.tolist()
+    columns['custom_score'] = _float_column(raw('custom_score')).tolist()
+
+    columns['field_goal_pct'] = field_goal_pct.tolist()
+    columns['three_point_pct'] = three_point_pct.tolist()
+    columns['field_goal_pct_label'] = (field_goal_pct + '%').tolist()
+    columns['three_point_pct_label'] = (three_point_pct + '%').tolist()
+
+    return columns
+
+# Summed columns of the rolling aggregate tables, averaged per game to this many decimals
+AGGREGATE_AVERAGES = [
+    ('minutes', 'min_numeric', 1), ('points', 'points', 1), ('offensive_rebounds', 'offensive_rebounds', 1),
+    ('defensive_rebounds', 'defensive_rebounds', 1), ('assists', 'assists', 1), ('steals', 'steals', 1),
+    ('blocks', 'blocks', 1), ('turnovers', 'turnovers', 1), ('field_goal_made', 'field_goal_made', 1),
+    ('field_goal_attempts', 'field_goal_attempts', 1), ('three_point_made', 'three_point_made', 1),
+    ('three_point_attempts', 'three_point_attempts', 1), ('personal_fouls', 'personal_fouls', 1),
+    ('plus_minus', 'plus_minus', 1), ('custom_score', 'custom_score', 2)
+]
+
+def aggregate_records(table, span, key_columns, limit=None):
+    """Per-game averages of one span of a rolling aggregate table, best average score first"""
+    index = {name: position for position, name in enumerate(table.columns)}
+    records = []
+    for row in table.rows:
+        games = _to_int(row[index['games']]) if row[index['span']] == span else 0
+        if games <= 0:
+            continue
+        
+        record = {column: row[index[column]] for column in key_columns}
+        record['games'] = games
+        for name, column, decimals in AGGREGATE_AVERAGES:
+            record[name] = round(_to_float(row[index[column]]) / games, decimals)
+        record['rebounds'] = round(record['offensive_rebounds'] + record['defensive_rebounds'], 1)
+        record['field_goal_pct'] = _percentage(_to_float(row[index['field_goal_made']]),
+                                               _to_float(row[index['field_goal_attempts']]))
+        record['three_point_pct'] = _percentage(_to_float(row[index['three_point_made']]),
+                                                _to_float(row[index['three_point_attempts']]))
+        records.append(record)
+    
+    records.sort(key=lambda record: record['custom_score'], reverse=True)
+    return records[:limit] if limit is not None else records
+
+def _field_values(columns, fields):
+    """Iterate the rows of the given fields from prepared columns"""
+    return zip(*(columns[source] for _, source in fields))
+
+def field_headers(fields):
+    """Output names of a field list"""
+    return [name for name, _ in fields]
+
+def to_records(columns, fields=PLAYER_RECORD_FIELDS):
+    """Prepared columns as a list of dicts, which JSON needs one per row"""
+    keys = field_headers(fields)
+    return [dict(zip(keys, values)) for values in _field_values(columns, fields)]
+
+def to_rows(columns, fields=SHEETS_FIELDS):
+    """Prepared columns as a list of row arrays, which JSON needs one per row"""
+    return [list(values) for values in _field_values(columns, fields)]
+
+def iter_csv(pages, fields=CSV_FIELDS):
+    """Stream CSV text for an iterable of leaderboard pages, one chunk per page"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(field_headers(fields))
+
+    for page in pages:
+        writer.writerows(_field_values(prepare_columns(page), fields))
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate()
+
+    if output.tell():
+        yield output.getvalue()
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _arrow_schema(fields):
+    """Arrow schema of a field list, typed from the prepared columns rather than from any one page"""
+    import pyarrow as pa
+
+    def arrow_type(source):
+        if source in STAT_COLUMNS or source in ('rebounds', 'player_id'):
+            return pa.int64()
+        if source == 'custom_score':
+            return pa.float64()
+        return pa.string()
+
+    return pa.schema([(name, arrow_type(source)) for name, source in fields])
+
+def iter_arrow(pages, file_format='arrow', fields=PLAYER_RECORD_FIELDS):
+    """Stream an Arrow IPC stream or a Parquet file for an iterable of leaderboard pages.
+
+    Each page becomes one record batch (or Parquet row group) and its bytes
+    are yielded as soon as they are written. The schema is fixed up front, so
+    a column that happens to be all null on one page does not change its type
+    and an empty table still makes a valid file. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    schema = _arrow_schema(fields)
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    for page in pages:
+        columns = prepare_columns(page)
+        data = {name: columns[source] for name, source in fields}
+        writer.write_batch(pa.RecordBatch.from_pydict(data, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,96 @@
+import threading
+import logging
+import time
+
+class _Call:
+    """One in-flight run of a refresh function"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class SingleFlight:
+    """Coalesce concurrent refreshes of one kind of data.
+
+    At most one call of func is in flight at a time. Callers that arrive while
+    it runs join that call instead of starting their own, and callers that
+    arrive within min_interval seconds of the last completed run get its
+    result back without running anything.
+    """
+
+    def __init__(self, name, func, min_interval=0):
+        self.name = name
+        self.func = func
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._call = None
+        self._last_result = None
+        self._last_completed = None
+
+    def is_fresh(self):
+        """Whether the last completed run is inside the freshness window"""
+        return (self._last_completed is not None
+                and time.monotonic() - self._last_completed < self.min_interval)
+
+    def has_completed(self):
+        """Whether any run has completed successfully yet"""
+        return self._last_completed is not None
+
+    def in_flight(self):
+        """Whether a run is currently in progress"""
+        return self._call is not None
+
+    def run(self, wait=True, timeout=None):
+        """Refresh unless fresh, joining any in-flight run.
+
+        Returns a (state, result) tuple where state is one of 'fresh', 'ran',
+        'joined' or 'timeout' when waiting, and 'fresh', 'started' or
+        'in_flight' when wait is False (result is then None unless fresh).
+        """
+        with self._lock:
+            if self._call is None:
+                if self.is_fresh():
+                    return 'fresh', self._last_result
+                call = self._call = _Call()
+                leader = True
+            else:
+                call = self._call
+                leader = False
+
+        if leader and not wait:
+            thread = threading.Thread(target=self._execute, args=(call,), name=f"refresh-{self.name}")
+            thread.daemon = True
+            thread.start()
+            return 'started', None
+
+        if leader:
+            self._execute(call)
+            return 'ran', call.result
+
+        if not wait:
+            return 'in_flight', None
+
+        if not call.done.wait(timeout):
+            return 'timeout', None
+        return 'joined', call.result
+
+    def _execute(self, call):
+        """Run func for the current call and release everyone waiting on it.
+
+        Only a run that returns counts as completed; one that raises leaves
+        the previous result and freshness window as they were, so the next
+        caller runs it again.
+        """
+        succeeded = False
+        try:
+            call.result = self.func()
+            succeeded = True
+        except Exception as e:
+            logging.error(f"Error in {self.name} refresh: {str(e)}")
+        finally:
+            with self._lock:
+                if succeeded:
+                    self._last_result = call.result
+                    self._last_completed = time.monotonic()
+                self._call = None
+            call.done.set()
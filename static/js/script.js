@@ -2,6 +2,29 @@
 let currentSortColumn = 'custom_score'; // Default sort column
 let currentSortDirection = 'desc';      // Default direction (descending)
 
+// Last payload and ETag per API URL, so polls can be conditional requests
+const conditionalCache = {};
+
+// Fetch JSON with If-None-Match, reusing the cached payload on a 304
+function fetchJSON(url) {
+    const cached = conditionalCache[url];
+    const headers = cached ? {'If-None-Match': cached.etag} : {};
+    
+    return fetch(url, {headers: headers, cache: 'no-store'})
+        .then(response => {
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+            return response.json().then(data => {
+                const etag = response.headers.get('ETag');
+                if (etag) {
+                    conditionalCache[url] = {etag: etag, data: data};
+                }
+                return data;
+            });
+        });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Store fetched data globally
     let completedGamesData = [];
@@ -18,12 +41,12 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Determine which refresh to use based on current view
         const toggleState = document.getElementById('data-toggle');
-        const endpoint = (toggleState && toggleState.checked) ? '/refresh-live' : '/refresh';
+        const endpoint = (toggleState && toggleState.checked) ? '/refresh-live?wait=1' : '/refresh';
         
         fetch(endpoint)
             .then(response => response.json())
             .then(data => {
-                if (data.status === 'success') {
+                if (data.status === 'success' || data.status === 'processing') {
                     fetchAllPlayerData();
                 } else {
                     document.getElementById('loading-message').textContent = 'Error refreshing data: ' + data.message;
@@ -43,31 +66,94 @@ document.addEventListener('DOMContentLoaded', function() {
     // Set up column header click event listeners for sorting
     setupSortableColumns();
     
-    // Update last update time
-    fetchLastUpdateTime();
-    
-    // Auto-refresh every 5 minutes
-    setInterval(fetchAllPlayerData, 5 * 60 * 1000);
+    // Set up player search autocomplete
+    setupPlayerSearch();
     
-    // Auto-refresh live data every 30 seconds
+    // Check the dashboard every minute - a conditional request that only
+    // re-renders when the server has new data
     setInterval(function() {
-        fetch('/refresh-live')
-            .then(response => response.json())
-            .then(data => {
-                if (data.status === 'success') {
-                    fetchLiveGamesData();
-                    console.log('Auto-refresh of live data completed');
-                }
-            })
-            .catch(error => {
-                console.error('Error during auto-refresh of live data:', error);
-            });
-    }, 30 * 1000);  // 30 seconds
+        fetchAllPlayerData(true);
+    }, 60 * 1000);
     
-    // Auto-refresh last update time every minute
-    setInterval(fetchLastUpdateTime, 60 * 1000);
+    if (window.EventSource) {
+        // Live data is pushed by the server as it changes
+        connectLiveStream();
+    } else {
+        // Auto-refresh live data every 30 seconds
+        setInterval(function() {
+            fetch('/refresh-live')
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status === 'success') {
+                        fetchLiveGamesData();
+                        console.log('Auto-refresh of live data completed');
+                    }
+                })
+                .catch(error => {
+                    console.error('Error during auto-refresh of live data:', error);
+                });
+        }, 30 * 1000);  // 30 seconds
+    }
 });
 
+// Latest search results by player name, for showing the one picked
+let playerSearchResults = {};
+
+function setupPlayerSearch() {
+    const input = document.getElementById('player-search');
+    let debounceTimer = null;
+    
+    input.addEventListener('input', function() {
+        clearTimeout(debounceTimer);
+        const query = input.value.trim();
+        
+        // A name picked from the suggestions shows that player's scores
+        if (playerSearchResults[query]) {
+            showPlayerSearchDetail(playerSearchResults[query]);
+            return;
+        }
+        if (!query) {
+            return;
+        }
+        
+        debounceTimer = setTimeout(function() {
+            fetch('/api/players/search?q=' + encodeURIComponent(query))
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status !== 'success') {
+                        return;
+                    }
+                    const datalist = document.getElementById('player-search-results');
+                    datalist.innerHTML = '';
+                    playerSearchResults = {};
+                    data.players.forEach(player => {
+                        playerSearchResults[player.player_name] = player;
+                        const option = document.createElement('option');
+                        option.value = player.player_name;
+                        datalist.appendChild(option);
+                    });
+                })
+                .catch(error => {
+                    console.error('Error searching players:', error);
+                });
+        }, 150);
+    });
+}
+
+function showPlayerSearchDetail(player) {
+    const formatScore = score => (score === null || score === undefined) ? '-' : score.toFixed(2);
+    const parts = [`${player.player_name}${player.team ? ' (' + player.team + ')' : ''}`];
+    
+    if (player.latest_score !== null) {
+        parts.push(`Latest EPA ${formatScore(player.latest_score)} (${player.latest_source})`);
+    }
+    parts.push(`7d ${formatScore(player.rolling_scores['7d'])}`);
+    parts.push(`30d ${formatScore(player.rolling_scores['30d'])}`);
+    parts.push(`Season ${formatScore(player.rolling_scores.season)}`);
+    
+    document.getElementById('player-search-detail').textContent = parts.join(' \u00b7 ');
+}
+
 function setupSortableColumns() {
     // Get all the column headers
     const headers = document.querySelectorAll('#players-table thead th');
@@ -128,31 +214,31 @@ function setupSortableColumns() {
     });
 }
 
-function fetchLastUpdateTime() {
-    fetch('/api/last-update')
-        .then(response => response.json())
-        .then(data => {
-            if (data.status === 'success') {
-                const lastUpdateElement = document.getElementById('last-update-time');
-                if (lastUpdateElement) {
-                    // Format the timestamp for display
-                    const timestamp = new Date(data.last_update);
-                    lastUpdateElement.textContent = timestamp.toLocaleString();
-                }
-            }
-        })
-        .catch(error => {
-            console.error('Error fetching last update time:', error);
-        });
+function showLastUpdateTime(lastUpdate) {
+    const lastUpdateElement = document.getElementById('last-update-time');
+    if (lastUpdateElement && lastUpdate) {
+        // Format the timestamp for display
+        const timestamp = new Date(lastUpdate);
+        lastUpdateElement.textContent = timestamp.toLocaleString();
+    }
 }
 
-function fetchAllPlayerData() {
-    // Fetch both completed games and live games data
-    Promise.all([
-        fetch('/api/top-scorers').then(response => response.json()),
-        fetch('/api/live-games').then(response => response.json())
-    ])
-    .then(([completedData, liveData]) => {
+// Last dashboard payload rendered, to skip re-rendering unchanged data
+let lastDashboard = null;
+
+function fetchAllPlayerData(onlyIfChanged) {
+    // Fetch both leaderboards and the last update time in one request
+    fetchJSON('/api/dashboard')
+    .then(dashboard => {
+        if (onlyIfChanged && dashboard === lastDashboard) {
+            return;
+        }
+        lastDashboard = dashboard;
+        
+        const completedData = dashboard.completed;
+        const liveData = dashboard.live;
+        showLastUpdateTime(dashboard.last_update);
+        
         // Store the fetched data globally
         if (completedData.status === 'success' && completedData.players.length > 0) {
             // Filter out players with 0 minutes
@@ -214,58 +300,126 @@ function fetchAllPlayerData() {
 
 function fetchLiveGamesData() {
     // Only refresh live games data
-    fetch('/api/live-games')
-        .then(response => response.json())
-        .then(liveData => {
-            if (liveData.status === 'success' && liveData.players.length > 0) {
-                // Filter out players with 0 minutes, then mark live game players for display purposes
-                liveGamesData = liveData.players
-                    .filter(player => player.minutes !== "0:00" && player.minutes !== "0" && player.minutes !== "")
-                    .map(player => ({...player, isLive: true}));
-                
-                // Show toggle switch and live indicator if there are players with minutes > 0
-                const toggleContainer = document.getElementById('toggle-container');
-                const liveIndicator = document.getElementById('live-indicator');
-                
-                if (toggleContainer) {
-                    toggleContainer.style.display = liveGamesData.length > 0 ? 'flex' : 'none';
-                }
-                
-                if (liveIndicator) {
-                    liveIndicator.style.display = liveGamesData.length > 0 ? 'block' : 'none';
-                }
-                
-                // If toggle is set to live games, update the display
-                if (document.getElementById('data-toggle').checked) {
-                    displaySelectedData();
-                }
-            } else {
-                liveGamesData = [];
-                
-                // Hide toggle switch and live indicator if there's no live data
-                const toggleContainer = document.getElementById('toggle-container');
-                const liveIndicator = document.getElementById('live-indicator');
-                
-                if (toggleContainer) {
-                    toggleContainer.style.display = 'none';
-                }
-                
-                if (liveIndicator) {
-                    liveIndicator.style.display = 'none';
-                }
-                
-                // If toggle was set to live games but now there are none, switch to completed games
-                if (document.getElementById('data-toggle').checked && completedGamesData.length > 0) {
-                    document.getElementById('data-toggle').checked = false;
-                    displaySelectedData();
-                }
-            }
-        })
+    fetchJSON('/api/live-games')
+        .then(applyLiveGamesData)
         .catch(error => {
             console.error('Error fetching live games data:', error);
         });
 }
 
+function applyLiveGamesData(liveData) {
+    if (liveData.status === 'success' && liveData.players.length > 0) {
+        // Filter out players with 0 minutes, then mark live game players for display purposes
+        liveGamesData = liveData.players
+            .filter(player => player.minutes !== "0:00" && player.minutes !== "0" && player.minutes !== "")
+            .map(player => ({...player, isLive: true}));
+        
+        // Show toggle switch and live indicator if there are players with minutes > 0
+        const toggleContainer = document.getElementById('toggle-container');
+        const liveIndicator = document.getElementById('live-indicator');
+        
+        if (toggleContainer) {
+            toggleContainer.style.display = liveGamesData.length > 0 ? 'flex' : 'none';
+        }
+        
+        if (liveIndicator) {
+            liveIndicator.style.display = liveGamesData.length > 0 ? 'block' : 'none';
+        }
+        
+        // If toggle is set to live games, update the display
+        if (document.getElementById('data-toggle').checked) {
+            displaySelectedData();
+        }
+    } else {
+        liveGamesData = [];
+        
+        // Hide toggle switch and live indicator if there's no live data
+        const toggleContainer = document.getElementById('toggle-container');
+        const liveIndicator = document.getElementById('live-indicator');
+        
+        if (toggleContainer) {
+            toggleContainer.style.display = 'none';
+        }
+        
+        if (liveIndicator) {
+            liveIndicator.style.display = 'none';
+        }
+        
+        // If toggle was set to live games but now there are none, switch to completed games
+        if (document.getElementById('data-toggle').checked && completedGamesData.length > 0) {
+            document.getElementById('data-toggle').checked = false;
+            displaySelectedData();
+        }
+    }
+}
+
+// Live leaderboard rows keyed the same way as the server's stream diffs
+let liveStreamPlayers = new Map();
+
+function livePlayerKey(player) {
+    if (player.player_id !== null && player.player_id !== undefined) {
+        return `${player.game_id}|${player.player_id}`;
+    }
+    return `${player.player_name}|${player.team}`;
+}
+
+// Polling of live data while the server has no live stream slot for this page
+let liveStreamFallbackTimer = null;
+
+function startLivePolling() {
+    if (liveStreamFallbackTimer === null) {
+        fetchLiveGamesData();
+        liveStreamFallbackTimer = setInterval(fetchLiveGamesData, 30 * 1000);
+    }
+}
+
+function stopLivePolling() {
+    if (liveStreamFallbackTimer !== null) {
+        clearInterval(liveStreamFallbackTimer);
+        liveStreamFallbackTimer = null;
+    }
+}
+
+function connectLiveStream() {
+    // The server pushes a full snapshot on connect, then only the rows that
+    // changed after each live ingestion cycle. EventSource reconnects on its
+    // own and the server resends a snapshot when it does.
+    const source = new EventSource('/api/live-stream');
+    
+    source.onopen = stopLivePolling;
+    
+    source.addEventListener('snapshot', event => {
+        const data = JSON.parse(event.data);
+        liveStreamPlayers = new Map(data.players.map(player => [livePlayerKey(player), player]));
+        renderLiveStream();
+    });
+    
+    source.addEventListener('diff', event => {
+        const data = JSON.parse(event.data);
+        data.removed.forEach(key => liveStreamPlayers.delete(key));
+        data.upserted.forEach(player => liveStreamPlayers.set(livePlayerKey(player), player));
+        renderLiveStream();
+    });
+    
+    source.onerror = function() {
+        if (source.readyState === EventSource.CLOSED) {
+            // Refused, typically with a 503 when every stream slot is taken:
+            // poll instead, and try the stream again in a few minutes
+            console.warn('Live stream unavailable, polling live data instead');
+            startLivePolling();
+            setTimeout(connectLiveStream, 5 * 60 * 1000);
+        } else {
+            console.error('Live stream connection lost, retrying');
+        }
+    };
+}
+
+function renderLiveStream() {
+    const players = Array.from(liveStreamPlayers.values())
+        .sort((a, b) => b.custom_score - a.custom_score);
+    applyLiveGamesData({status: 'success', players: players});
+}
+
 function sortTable(column) {
     // If clicking the same column, reverse the direction
     if (column === currentSortColumn) {
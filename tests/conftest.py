@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A freshly initialized database file, with an empty read replica"""
+    monkeypatch.setattr(database, 'DB_NAME', str(tmp_path / 'nba_scores.db'))
+    monkeypatch.setattr(database, '_replica', {})
+    assert database.init_db()
+    return database.DB_NAME
+
+
+def player_lines(game_id, lines):
+    """Box score rows of one game as nba_api returns them, from (player_id, team, points) tuples"""
+    return pd.DataFrame([{
+        'GAME_ID': game_id, 'PLAYER_ID': player_id, 'PLAYER_NAME': f"Player {player_id}",
+        'TEAM_ABBREVIATION': team, 'MIN': f"{20 + player_id % 15}:{player_id % 60:02d}", 'PTS': points,
+        'OREB': player_id % 3, 'DREB': 4, 'AST': player_id % 7, 'STL': 1, 'BLK': player_id % 2, 'TO': 2,
+        'FGM': points // 2, 'FGA': points, 'FG3M': 1, 'FG3A': 3, 'PF': 2, 'PLUS_MINUS': player_id % 11 - 5
+    } for player_id, team, points in lines])
+
+
+@pytest.fixture
+def box_score():
+    """Factory of raw box score frames, see player_lines"""
+    return player_lines
+
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    """A test client of the web app on the db fixture's database, with ingestion left to nobody"""
+    import ingestion
+    monkeypatch.setattr(ingestion, 'start', lambda mode=None: None)
+    # The app sets up its database and directories relative to where it starts
+    monkeypatch.chdir(tmp_path)
+    import app
+    app.response_cache.clear()
+    return app.app.test_client()
@@ -0,0 +1,27 @@
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def admin(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(profiling, 'PROFILING_TOKEN', 'secret')
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+    return client
+
+
+def test_admin_routes_take_the_token_from_the_header(admin):
+    response = admin.get('/admin/profiles', headers={'X-Profile-Token': 'secret'})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
+
+
+@pytest.mark.parametrize('path', ['/admin/profiles', '/admin/traces', '/admin/memory'])
+def test_admin_routes_ignore_a_token_in_the_query_string(admin, path):
+    assert admin.get(f"{path}?token=secret").status_code == 404
+
+
+def test_requests_are_not_profiled_with_a_query_string_token(admin, tmp_path):
+    admin.get('/api/top-scorers?profile=1&token=secret')
+    assert not (tmp_path / 'profiles').exists()
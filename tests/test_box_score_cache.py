@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+import nba_data
+import tracing
+from box_score_cache import BoxScoreCache
+
+FINAL = (3, 'Final', 100, 90)
+
+
+def test_entry_is_reused_while_valid():
+    cache = BoxScoreCache(ttl=60)
+    stats = pd.DataFrame({'PTS': [10]})
+    cache.put('g1', stats, FINAL)
+
+    entry = cache.get('g1', FINAL)
+    assert entry.player_stats is stats
+    assert cache.get('g2', FINAL) is None
+
+
+def test_entry_expires_after_the_ttl():
+    cache = BoxScoreCache(ttl=60)
+    cache.put('g1', pd.DataFrame(), FINAL, fetched_at=1.0)
+
+    assert cache.get('g1', FINAL) is None
+
+
+def test_entry_is_dropped_when_the_scoreboard_changes():
+    cache = BoxScoreCache(ttl=60)
+    cache.put('g1', pd.DataFrame(), FINAL)
+
+    assert cache.get('g1', (3, 'Final', 102, 90)) is None
+    # Dropped for good, not just hidden from that one state
+    assert cache.get('g1', FINAL) is None
+
+
+def test_retain_drops_games_out_of_the_window():
+    cache = BoxScoreCache(ttl=60)
+    cache.put('g1', pd.DataFrame(), FINAL)
+    cache.put('g2', pd.DataFrame(), FINAL)
+
+    cache.retain(['g2'])
+    assert cache.get('g1', FINAL) is None
+    assert cache.get('g2', FINAL) is not None
+
+
+@pytest.fixture
+def fetches(monkeypatch, box_score):
+    """Serve box scores from box_score lines instead of nba_api, recording each game fetched"""
+    fetched = []
+
+    class FakeBoxScore:
+        def __init__(self, game_id):
+            fetched.append(game_id)
+            self.player_stats = self
+            self.game_id = game_id
+
+        def get_data_frame(self):
+            return box_score(self.game_id, [(1, 'AAA', 20), (2, 'BBB', 10)])
+
+    monkeypatch.setattr(nba_data, 'BoxScoreTraditionalV2', FakeBoxScore)
+    monkeypatch.setattr(nba_data, 'final_box_scores', BoxScoreCache(ttl=60))
+    monkeypatch.setattr(nba_data, '_games', {})
+    monkeypatch.setattr(nba_data, '_changed_game_ids', set())
+    monkeypatch.setattr(nba_data, '_box_score_game_ids', set())
+    return fetched
+
+
+def _run(game_ids):
+    return [batch for batch, _ in nba_data.iter_player_stats(game_ids)]
+
+
+def test_completed_games_are_fetched_once_until_their_scoreboard_changes(fetches):
+    nba_data._record_games([{'game_id': game_id, 'status': 3, 'status_text': 'Final',
+                             'home_score': 100, 'away_score': 90} for game_id in ('g1', 'g2')])
+
+    assert sorted(map(tuple, _run(['g1', 'g2']))) == [('g1',), ('g2',)]
+    assert sorted(fetches) == ['g1', 'g2']
+
+    fetches.clear()
+    assert _run(['g1', 'g2']) == [['g1', 'g2']]
+    assert fetches == []
+
+    # A stat correction moves the score on the scoreboard
+    nba_data._record_games([{'game_id': 'g1', 'status': 3, 'status_text': 'Final',
+                             'home_score': 102, 'away_score': 90}])
+    assert _run(['g1', 'g2']) == [['g2'], ['g1']]
+    assert fetches == ['g1']
+
+
+def test_cached_box_scores_report_when_they_were_fetched(fetches):
+    nba_data._record_games([{'game_id': 'g1', 'status': 3, 'status_text': 'Final',
+                             'home_score': 100, 'away_score': 90}])
+    _run(['g1'])
+    fetched_at = nba_data.final_box_scores.get('g1', nba_data._scoreboard_state('g1')).fetched_at
+
+    with tracing.trace('completed') as trace:
+        assert _run(['g1']) == [['g1']]
+    assert fetches == ['g1']
+    assert trace.fetched_at == fetched_at
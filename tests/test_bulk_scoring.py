@@ -0,0 +1,89 @@
+import json
+import random
+
+import pandas as pd
+import pytest
+
+import backfill
+import bulk_scoring
+import scoring
+
+HEADERS = ['GAME_ID', 'TEAM_ID', 'TEAM_ABBREVIATION', 'TEAM_CITY', 'PLAYER_ID', 'PLAYER_NAME', 'NICKNAME',
+           'START_POSITION', 'COMMENT', 'MIN', 'FGM', 'FGA', 'FG_PCT', 'FG3M', 'FG3A', 'FG3_PCT', 'FTM', 'FTA',
+           'FT_PCT', 'OREB', 'DREB', 'REB', 'AST', 'STL', 'BLK', 'TO', 'PF', 'PTS', 'PLUS_MINUS']
+
+
+def raw_box_score(game_id, seed):
+    """A BoxScoreTraditionalV2 response with the minute formats and did-not-play rows the API sends"""
+    rng = random.Random(seed)
+    rows = []
+    for index in range(26):
+        team = 'AAA' if index < 13 else 'BBB'
+        player_id = seed * 100 + index
+        if index % 13 == 12:
+            rows.append([game_id, 1, team, 'City', player_id, f"Player {player_id}", None, '', 'DNP - Coach',
+                         None] + [None] * 19)
+            continue
+        minutes = rng.choice([f"{rng.randint(1, 44)}:{rng.randint(0, 59):02d}",
+                              f"{rng.randint(1, 44)}.000000:{rng.randint(0, 59):02d}", '0:00'])
+        fga, fg3a = rng.randint(0, 25), rng.randint(0, 10)
+        rows.append([game_id, 1, team, 'City', player_id, f"Player {player_id}", None, '', '', minutes,
+                     rng.randint(0, fga), fga, 0.5, rng.randint(0, fg3a), fg3a, 0.3, 2, 3, 0.6,
+                     rng.randint(0, 5), rng.randint(0, 10), 0, rng.randint(0, 12), rng.randint(0, 4),
+                     rng.randint(0, 4), rng.randint(0, 6), rng.randint(0, 6), rng.randint(0, 45),
+                     float(rng.randint(-20, 20))])
+    return json.dumps({'resultSets': [{'name': 'PlayerStats', 'headers': HEADERS, 'rowSet': rows}]})
+
+
+def dataframe_scores(raws, weights=None):
+    """The same box scores scored the way ingestion does, from nba_api's data frames"""
+    frames = [pd.DataFrame(result['rowSet'], columns=result['headers'])
+              for raw in raws for result in json.loads(raw)['resultSets']]
+    player_stats = pd.concat(frames, ignore_index=True)
+    return scoring.get_top_scorers(player_stats, limit=len(player_stats), weights=weights)
+
+
+def _by_player(frame):
+    return frame.set_index('PLAYER_ID').sort_index()
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_bulk_scoring_matches_get_top_scorers(processes):
+    raws = [raw_box_score(f"00224000{seed:02d}", seed) for seed in range(1, 7)]
+
+    bulk = _by_player(bulk_scoring.to_frame(bulk_scoring.score_box_scores(raws, processes=processes)))
+    expected = _by_player(dataframe_scores(raws))
+
+    assert list(bulk.index) == list(expected.index)
+    assert (bulk['CUSTOM_SCORE'] == expected['CUSTOM_SCORE']).all()
+    for column in ['GAME_ID', 'PLAYER_NAME', 'TEAM_ABBREVIATION', 'MIN'] + bulk_scoring.STAT_COLUMNS:
+        assert (bulk[column] == expected[column]).all(), column
+
+
+def test_bulk_scoring_matches_get_top_scorers_with_custom_weights():
+    raws = [raw_box_score('0022400001', 1)]
+    weights = dict(scoring.SCORE_WEIGHTS, PTS=5.0, TO=-5.0)
+
+    bulk = _by_player(bulk_scoring.to_frame(bulk_scoring.score_box_scores(raws, processes=1, weights=weights)))
+    expected = _by_player(dataframe_scores(raws, weights=weights))
+
+    assert (bulk['CUSTOM_SCORE'] == expected['CUSTOM_SCORE']).all()
+
+
+def test_backfill_cache_is_only_written_whole(tmp_path, monkeypatch):
+    raw = raw_box_score('0022400001', 1)
+    monkeypatch.setattr(backfill, 'fetch_with_retries', lambda endpoint, description, fetch: raw)
+
+    def interrupted(source, destination):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(backfill.os, 'replace', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        backfill._raw_box_score('0022400001', str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+
+    monkeypatch.undo()
+    monkeypatch.setattr(backfill, 'fetch_with_retries', lambda endpoint, description, fetch: raw)
+    assert backfill._raw_box_score('0022400001', str(tmp_path)) == raw
+    assert [path.name for path in tmp_path.iterdir()] == ['0022400001.json']
+    assert (tmp_path / '0022400001.json').read_text() == raw
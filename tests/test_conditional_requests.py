@@ -0,0 +1,23 @@
+import database
+
+
+def test_unchanged_leaderboard_is_answered_with_304(client, box_score):
+    board = box_score('g1', [(1, 'AAA', 30), (2, 'BBB', 25)])
+    board['CUSTOM_SCORE'] = board['PTS'] * 1.5
+    assert database.save_top_scorers(board)
+
+    first = client.get('/api/top-scorers')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    again = client.get('/api/top-scorers', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert again.get_data() == b''
+
+    board.loc[0, 'PTS'] = 31
+    assert database.save_top_scorers(board)
+    changed = client.get('/api/top-scorers', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['players'][0]['points'] == 31
@@ -0,0 +1,36 @@
+import database
+
+
+def _insert_scores(scores):
+    conn = database.get_db_connection()
+    conn.executemany("INSERT INTO top_scorers (player_name, custom_score) VALUES (?, ?)",
+                     [(f"Player {index}", score) for index, score in enumerate(scores)])
+    conn.commit()
+    conn.close()
+
+
+def test_pages_cover_every_row_once_best_first(db):
+    # Ties and missing scores straddle the page boundaries
+    _insert_scores([10.0, None, 7.5, 10.0, None, 7.5, 7.5, 3.0, None, 10.0, -2.0])
+
+    pages = list(database.iter_table_pages('top_scorers', page_size=3))
+    assert [len(page.rows) for page in pages] == [3, 3, 3, 2]
+
+    columns = pages[0].columns
+    rows = [row for page in pages for row in page.rows]
+    ids = [row[columns.index('id')] for row in rows]
+    assert sorted(ids) == list(range(1, 12))
+    scores = [row[columns.index('custom_score')] for row in rows]
+    assert scores == [10.0] * 3 + [7.5] * 3 + [3.0, -2.0] + [None] * 3
+
+
+def test_pages_are_read_from_the_export_index(db):
+    conn = database.get_db_connection()
+    plan = ' '.join(row[-1] for row in conn.execute(
+        f'''EXPLAIN QUERY PLAN SELECT * FROM top_scorers
+        WHERE {database._EXPORT_SCORE} <= ? AND ({database._EXPORT_SCORE} < ? OR id < ?)
+        ORDER BY {database._EXPORT_SCORE} DESC, id DESC LIMIT ?''', (1.0, 1.0, 5, 3)))
+    conn.close()
+
+    assert 'idx_top_scorers_export' in plan
+    assert 'TEMP B-TREE' not in plan
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pandas as pd
+
+import database
+
+
+def box_score(game_id, lines):
+    """Scored player lines of one final game, as ingestion passes them to save_game_history"""
+    rows = []
+    for player_id, team, points in lines:
+        rows.append({
+            'GAME_ID': game_id, 'PLAYER_ID': player_id, 'PLAYER_NAME': f"Player {player_id}",
+            'TEAM_ABBREVIATION': team, 'MIN': '30:00', 'MIN_NUMERIC': 30.0, 'PTS': points,
+            'OREB': 1, 'DREB': 4, 'AST': 3, 'STL': 1, 'BLK': 0, 'TO': 2, 'FGM': points // 2,
+            'FGA': points, 'FG3M': 1, 'FG3A': 3, 'PF': 2, 'PLUS_MINUS': 5, 'CUSTOM_SCORE': points / 2
+        })
+    return pd.DataFrame(rows)
+
+
+def aggregates(db):
+    conn = sqlite3.connect(db)
+    try:
+        players = {(span, player_id): (games, points, score) for span, player_id, games, points, score in conn.execute(
+            "SELECT span, player_id, games, points, custom_score FROM player_aggregates")}
+        teams = {(span, team): (games, points) for span, team, games, points in conn.execute(
+            "SELECT span, team, games, points FROM team_aggregates")}
+        return players, teams
+    finally:
+        conn.close()
+
+
+def test_new_games_are_added_to_every_span(db):
+    assert database.save_game_history(box_score('g1', [(1, 'AAA', 20), (2, 'BBB', 10)]))
+    assert database.save_game_history(box_score('g2', [(1, 'AAA', 30)]))
+
+    players, teams = aggregates(db)
+    for span in database.ROLLING_SPANS:
+        assert players[(span, 1)] == (2, 50, 25.0)
+        assert players[(span, 2)] == (1, 10, 5.0)
+        assert teams[(span, 'AAA')] == (2, 50)
+
+
+def test_refetched_game_with_corrected_lines_replaces_its_old_lines(db):
+    database.save_game_history(box_score('g1', [(1, 'AAA', 20), (2, 'BBB', 10)]))
+    database.save_game_history(box_score('g2', [(1, 'AAA', 30)]))
+    version = database.get_data_version('player_aggregates')
+
+    # A stat correction moves two points from player 2 to player 1
+    assert database.save_game_history(box_score('g1', [(1, 'AAA', 22), (2, 'BBB', 8)]))
+
+    players, teams = aggregates(db)
+    for span in database.ROLLING_SPANS:
+        assert players[(span, 1)] == (2, 52, 26.0)
+        assert players[(span, 2)] == (1, 8, 4.0)
+        assert teams[(span, 'AAA')] == (2, 52)
+        assert teams[(span, 'BBB')] == (1, 8)
+    assert database.get_data_version('player_aggregates') == version + 1
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT points FROM player_game_stats WHERE game_id = 'g1' ORDER BY player_id").fetchall() \
+        == [(22,), (8,)]
+    conn.close()
+
+
+def test_refetched_game_without_changes_writes_nothing(db):
+    database.save_game_history(box_score('g1', [(1, 'AAA', 20), (2, 'BBB', 10)]))
+    before = aggregates(db)
+    version = database.get_data_version('player_aggregates')
+
+    assert database.save_game_history(box_score('g1', [(1, 'AAA', 20), (2, 'BBB', 10)]))
+
+    assert aggregates(db) == before
+    assert database.get_data_version('player_aggregates') == version
@@ -0,0 +1,62 @@
+import sqlite3
+
+import database
+from leader import FileLease
+
+
+def test_one_lease_holder_at_a_time(tmp_path):
+    path = str(tmp_path / 'ingest.lock')
+    leader, follower = FileLease(path), FileLease(path)
+
+    assert leader.try_acquire()
+    assert leader.try_acquire()
+    assert not follower.try_acquire()
+    assert not follower.is_held()
+
+    # The follower takes over as soon as the leader lets go
+    leader.release()
+    assert follower.try_acquire()
+    assert follower.is_held()
+    follower.release()
+
+
+def _refresh_rows(db):
+    conn = sqlite3.connect(db)
+    try:
+        return dict(conn.execute("SELECT name, version FROM data_versions WHERE name LIKE 'refresh_%'"))
+    finally:
+        conn.close()
+
+
+def test_refresh_requests_share_the_pending_ticket(db):
+    tickets = [database.request_refresh('live') for _ in range(20)]
+
+    assert tickets == [1] * 20
+    assert _refresh_rows(db) == {'refresh_requested:live': 1}
+    assert database.get_refresh_tickets(('live', 'top_scorers')) == {'live': (1, 0), 'top_scorers': (0, 0)}
+
+
+def test_refresh_requests_take_a_new_ticket_once_the_leader_served_one(db):
+    assert database.request_refresh('live') == 1
+    database.mark_refresh_handled('live', 1)
+    assert database.get_refresh_tickets(('live',)) == {'live': (1, 1)}
+
+    assert database.request_refresh('live') == 2
+    assert database.request_refresh('live') == 2
+    assert database.get_refresh_tickets(('live',)) == {'live': (2, 1)}
+
+
+def test_pending_ticket_does_not_write(db, monkeypatch):
+    database.request_refresh('live')
+
+    statements = []
+    connect = database.get_db_connection
+
+    def traced_connection(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(database, 'get_db_connection', traced_connection)
+    assert database.request_refresh('live') == 1
+    assert statements and all(statement.lstrip().upper().startswith('SELECT') for statement in statements)
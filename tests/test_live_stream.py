@@ -0,0 +1,35 @@
+from live_stream import live_broadcaster
+
+
+def _open_streams(client):
+    metrics = client.get('/metrics').get_data(as_text=True)
+    return next(float(line.split()[1]) for line in metrics.splitlines()
+                if line.startswith('nba_live_streams_open '))
+
+
+def test_metrics_report_open_streams(client):
+    assert _open_streams(client) == 0
+
+    subscriber = live_broadcaster.open_stream()
+    try:
+        assert _open_streams(client) == 1
+    finally:
+        live_broadcaster.close_stream(subscriber)
+    assert _open_streams(client) == 0
+
+
+def test_streams_past_the_cap_are_refused(client, monkeypatch):
+    monkeypatch.setattr(live_broadcaster, 'max_streams', 1)
+    subscriber = live_broadcaster.open_stream()
+    try:
+        response = client.get('/api/live-stream')
+        assert response.status_code == 503
+        assert response.headers['Retry-After']
+    finally:
+        live_broadcaster.close_stream(subscriber)
+
+    response = client.get('/api/live-stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    response.close()
+    assert live_broadcaster.subscriber_count() == 0
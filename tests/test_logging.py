@@ -0,0 +1,39 @@
+import logging
+
+import log_config
+import scoring
+from response_cache import ResponseCache
+
+
+def test_log_sampled_logs_a_key_once_per_interval(caplog):
+    caplog.set_level(logging.DEBUG)
+    built = []
+
+    def message():
+        built.append(1)
+        return 'payload'
+
+    assert log_config.log_sampled('test_once', message, interval=60)
+    assert not log_config.log_sampled('test_once', message, interval=60)
+    assert log_config.log_sampled('test_other', message, interval=60)
+    assert len(built) == 2
+    assert [record.getMessage() for record in caplog.records] == ['payload', 'payload']
+
+
+def test_log_sampled_builds_nothing_when_the_level_is_disabled(caplog):
+    caplog.set_level(logging.INFO)
+    assert not log_config.log_sampled('test_disabled', lambda: 1 / 0)
+
+
+def test_scoring_logs_nothing_at_info(caplog, box_score):
+    caplog.set_level(logging.INFO)
+    for _ in range(3):
+        assert not scoring.get_top_scorers(box_score('g1', [(1, 'AAA', 20), (2, 'BBB', 10)])).empty
+    assert not caplog.records
+
+
+def test_response_cache_builds_log_nothing_at_info(caplog):
+    caplog.set_level(logging.INFO)
+    cache = ResponseCache()
+    assert cache.get_or_build('key', 1, lambda: b'body') == b'body'
+    assert not caplog.records
@@ -0,0 +1,75 @@
+import pandas as pd
+
+import database
+
+
+def _scored(box_score, game_id, lines):
+    frame = box_score(game_id, lines)
+    frame['CUSTOM_SCORE'] = frame['PTS'] * 1.5
+    return frame
+
+
+def _rows(table):
+    conn = database.get_db_connection()
+    rows = {(game_id, player_id): (row_id, points, timestamp) for row_id, game_id, player_id, points, timestamp
+            in conn.execute(f"SELECT id, game_id, player_id, points, timestamp FROM {table}")}
+    conn.close()
+    return rows
+
+
+def _updates():
+    conn = database.get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM updates").fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_identical_live_tick_writes_nothing(db, box_score):
+    tick = _scored(box_score, 'g1', [(1, 'AAA', 20), (2, 'BBB', 10)])
+    assert database.save_live_data(tick)
+    version, rows = database.get_data_version('live_players'), _rows('live_players')
+
+    assert database.save_live_data(tick)
+    assert database.get_data_version('live_players') == version
+    assert _rows('live_players') == rows
+
+
+def test_live_tick_updates_only_the_changed_player_in_place(db, box_score):
+    assert database.save_live_data(_scored(box_score, 'g1', [(1, 'AAA', 20), (2, 'BBB', 10)]))
+    version, before = database.get_data_version('live_players'), _rows('live_players')
+
+    assert database.save_live_data(_scored(box_score, 'g1', [(1, 'AAA', 22), (2, 'BBB', 10)]))
+    after = _rows('live_players')
+    assert database.get_data_version('live_players') == version + 1
+    assert after[('g1', 2)] == before[('g1', 2)]
+    assert after[('g1', 1)][0] == before[('g1', 1)][0]
+    assert after[('g1', 1)][1] == 22
+
+
+def test_live_tick_deletes_players_no_longer_on_it(db, box_score):
+    first = _scored(box_score, 'g1', [(1, 'AAA', 20), (2, 'BBB', 10)])
+    second = _scored(box_score, 'g2', [(3, 'CCC', 12)])
+    assert database.save_live_data(pd.concat([first, second]))
+    version = database.get_data_version('live_players')
+
+    # Game g2 ended and player 2 dropped off, with nothing else changing
+    assert database.save_live_data(first.iloc[:1])
+    assert set(_rows('live_players')) == {('g1', 1)}
+    assert database.get_data_version('live_players') == version + 1
+    assert len(database.get_replica_snapshot('live_players').rows) == 1
+
+
+def test_partial_top_scorer_boards_are_not_logged_as_updates(db, box_score):
+    board = _scored(box_score, 'g1', [(1, 'AAA', 30), (2, 'BBB', 25)])
+    assert database.save_top_scorers(board, final=False)
+    version = database.get_data_version('top_scorers')
+    assert _updates() == 0
+
+    # The final board is logged even though it matches the last partial one
+    assert database.save_top_scorers(board)
+    assert database.get_data_version('top_scorers') == version
+    assert _updates() == 1
+
+    assert database.save_top_scorers(_scored(box_score, 'g1', [(1, 'AAA', 30)]))
+    assert set(_rows('top_scorers')) == {('g1', 1)}
+    assert database.get_data_version('top_scorers') == version + 1
@@ -0,0 +1,52 @@
+import pstats
+import time
+
+import pytest
+
+import profiling
+from executors import PriorityExecutor
+
+
+def fetch_on_pool():
+    """Work a profiled job hands to a pool thread, as ingestion's fetches and writes do"""
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return 'fetched'
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize('mode', profiling.PROFILE_MODES)
+def test_job_profile_includes_work_run_on_the_pools(profile_dir, mode):
+    pool = PriorityExecutor('test-io', 2)
+    profiling.arm_job('job', mode=mode)
+
+    def job():
+        futures = [pool.submit(0, fetch_on_pool) for _ in range(2)]
+        return [future.result() for future in futures]
+
+    assert profiling.run_job('job', job) == ['fetched', 'fetched']
+
+    (report,) = [path for path in profile_dir.iterdir() if path.suffix in ('.prof', '.folded')]
+    if mode == 'cprofile':
+        functions = {name for _, _, name in pstats.Stats(str(report)).stats}
+        assert 'fetch_on_pool' in functions
+        assert 'job' in functions
+    else:
+        stacks = report.read_text()
+        assert any(line.startswith('test-io-') and 'fetch_on_pool' in line for line in stacks.splitlines())
+
+
+def test_pool_work_outside_a_profiled_job_is_not_profiled(profile_dir):
+    pool = PriorityExecutor('test-io', 1)
+    session = profiling.ProfileSession('request').start()
+    session.stop()
+
+    assert pool.run(0, fetch_on_pool) == 'fetched'
+    assert profiling._active_session.get() is None
+    assert len(list(profile_dir.glob('*.prof'))) == 1
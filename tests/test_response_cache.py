@@ -0,0 +1,93 @@
+import gzip
+import threading
+import time
+
+from response_cache import ResponseCache
+
+
+def _concurrently(count, func):
+    results = [None] * count
+    errors = [None] * count
+    start = threading.Barrier(count)
+
+    def run(index):
+        start.wait()
+        try:
+            results[index] = func()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_body_is_built_once_per_version():
+    cache = ResponseCache()
+    builds = []
+
+    assert cache.get_or_build('top', 1, lambda: builds.append(1) or b'v1') == b'v1'
+    assert cache.get_or_build('top', 1, lambda: builds.append(1) or b'again') == b'v1'
+    assert cache.get('top', 1) == b'v1'
+    assert cache.get('top', 2) is None
+    assert cache.get_or_build('top', 2, lambda: builds.append(2) or b'v2') == b'v2'
+    assert builds == [1, 2]
+
+
+def test_concurrent_misses_share_one_build():
+    cache = ResponseCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.1)
+        return b'payload'
+
+    results, errors = _concurrently(16, lambda: cache.get_or_build('top', 1, build))
+
+    assert errors == [None] * 16
+    assert results == [b'payload'] * 16
+    assert len(builds) == 1
+
+
+def test_concurrent_misses_share_one_compression(monkeypatch):
+    import response_cache
+    compressions = []
+
+    def slow_compress(body, encoding):
+        compressions.append(encoding)
+        time.sleep(0.1)
+        return gzip.compress(body, mtime=0)
+
+    monkeypatch.setattr(response_cache, 'compress', slow_compress)
+    cache = ResponseCache()
+    cache.get_or_build('top', 1, lambda: b'payload')
+
+    results, errors = _concurrently(8, lambda: cache.get_or_build('top', 1, lambda: b'unused', encoding='gzip'))
+
+    assert errors == [None] * 8
+    assert {gzip.decompress(body) for body in results} == {b'payload'}
+    assert compressions == ['gzip']
+
+
+def test_failed_build_reaches_every_waiter_and_is_retried():
+    cache = ResponseCache()
+
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError('replica unavailable')
+
+    results, errors = _concurrently(4, lambda: cache.get_or_build('top', 1, failing))
+    assert all(isinstance(error, RuntimeError) for error in errors)
+
+    assert cache.get_or_build('top', 1, lambda: b'payload') == b'payload'
+
+
+def test_older_version_never_replaces_a_newer_one():
+    cache = ResponseCache()
+    cache.get_or_build('top', 2, lambda: b'v2')
+    assert cache.get_or_build('top', 1, lambda: b'v1') == b'v1'
+    assert cache.get('top', 2) == b'v2'
@@ -0,0 +1,69 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from database import TablePage
+from serializers import PLAYER_RECORD_FIELDS, SHEETS_FIELDS, iter_arrow, prepare_columns, to_records, to_rows
+
+COLUMNS = ('player_name', 'team', 'minutes', 'points', 'custom_score', 'game_id', 'player_id')
+SHOOTING = ('minutes', 'points', 'offensive_rebounds', 'defensive_rebounds', 'field_goal_made',
+            'field_goal_attempts', 'three_point_made', 'three_point_attempts', 'custom_score')
+
+
+def test_columns_are_coerced_like_the_stored_values_allow():
+    columns = prepare_columns(TablePage(SHOOTING, [
+        ('43.0000000:28', 30, 2, 5, 11, 20, 3, 7, 41.25),
+        ('12:5', '14', None, '6.9', 0, 0, 'n/a', 0, None),
+        ('DNP', None, 1, 1, 2, 3, 1, 3, 'bad'),
+        (None, 8.7, 0, 0, 1, 1, 0, 0, float('nan')),
+    ]))
+
+    assert columns['points'] == [30, 14, 0, 8]
+    assert all(type(value) is int for value in columns['points'])
+    assert columns['rebounds'] == [7, 6, 2, 0]
+    assert columns['custom_score'] == [41.25, 0.0, 0.0, 0.0]
+    assert columns['minutes'] == ['43:28', '12:05', 'DNP', None]
+    assert columns['minutes_raw'] == ['43.0000000:28', '12:5', 'DNP', None]
+    assert columns['field_goal_pct'] == ['55.0', '0.0', '66.7', '100.0']
+    assert columns['three_point_pct_label'] == ['42.9%', '0.0%', '33.3%', '0.0%']
+    assert columns['assists'] == [0, 0, 0, 0]
+
+
+def test_records_and_rows_follow_their_field_lists():
+    columns = prepare_columns(TablePage(COLUMNS, [
+        ('Player 1', 'BOS', '30.000000:07', 20, 25.5, '0022300001', 1),
+        ('Player 2', 'NYK', '28:15', 12, 9.0, '0022300001', 2),
+    ]))
+
+    records = to_records(columns)
+    assert records[0]['player_name'] == 'Player 1'
+    assert records[0]['minutes'] == '30:07'
+    assert records[1]['player_id'] == 2
+    assert list(records[0]) == [name for name, _ in PLAYER_RECORD_FIELDS]
+
+    rows = to_rows(columns)
+    assert len(rows) == 2 and len(rows[0]) == len(SHEETS_FIELDS)
+    assert rows[0][:4] == ['Player 1', 'BOS', '30.000000:07', 20]
+
+
+def test_arrow_keeps_its_schema_when_a_column_starts_all_null():
+    pages = [
+        TablePage(COLUMNS, [('Player 1', 'BOS', '30:00', 20, 25.5, None, None)]),
+        TablePage(COLUMNS, [('Player 2', 'NYK', '28:15', 12, None, '0022300001', 2)]),
+    ]
+
+    table = pa.ipc.open_stream(b''.join(iter_arrow(pages))).read_all()
+
+    assert table.schema.field('game_id').type == pa.string()
+    assert table.schema.field('player_id').type == pa.int64()
+    assert table.column('game_id').to_pylist() == [None, '0022300001']
+    assert table.column('player_id').to_pylist() == [None, 2]
+    assert table.column('custom_score').to_pylist() == [25.5, 0.0]
+
+
+def test_parquet_of_an_empty_table_is_a_valid_file():
+    table = pq.read_table(io.BytesIO(b''.join(iter_arrow([], 'parquet'))))
+
+    assert table.num_rows == 0
+    assert table.schema.field('points').type == pa.int64()
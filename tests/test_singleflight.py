@@ -0,0 +1,73 @@
+import threading
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_join_one_run():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    flight = SingleFlight('test', refresh)
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.run()))
+    leader.start()
+    assert started.wait(5)
+    joiners = [threading.Thread(target=lambda: results.append(flight.run())) for _ in range(4)]
+    for thread in joiners:
+        thread.start()
+    release.set()
+    for thread in [leader] + joiners:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [('joined', 'result')] * 4 + [('ran', 'result')]
+
+
+def test_callers_inside_min_interval_get_the_last_result():
+    calls = []
+    flight = SingleFlight('test', lambda: calls.append(1) or len(calls), min_interval=60)
+
+    assert flight.run() == ('ran', 1)
+    assert flight.run() == ('fresh', 1)
+    assert flight.run(wait=False) == ('fresh', 1)
+    assert len(calls) == 1
+
+
+def test_failed_run_is_not_fresh_and_keeps_the_last_result():
+    outcomes = iter(['first', RuntimeError('upstream down'), 'third'])
+
+    def refresh():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    flight = SingleFlight('test', refresh, min_interval=60)
+    assert flight.run() == ('ran', 'first')
+
+    # Let the window lapse, then fail the refresh
+    flight._last_completed -= 120
+    assert flight.run() == ('ran', None)
+    assert not flight.is_fresh()
+    assert flight._last_result == 'first'
+
+    # The next caller refreshes again instead of being told it is fresh
+    assert flight.run() == ('ran', 'third')
+    assert flight.is_fresh()
+
+
+def test_a_run_that_only_failed_has_not_completed():
+    def refresh():
+        raise RuntimeError('upstream down')
+
+    flight = SingleFlight('test', refresh, min_interval=60)
+    assert flight.run() == ('ran', None)
+    assert not flight.has_completed()
+    assert not flight.in_flight()
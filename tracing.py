@@ -0,0 +1,150 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from metrics import INGEST_STAGE_LATENCY
+
+# Finished ingestion traces kept in memory for /admin/traces
+TRACE_HISTORY = int(os.environ.get('TRACE_HISTORY', 50))
+
+# Stages of an ingestion cycle, in pipeline order
+STAGES = ('scoreboard_fetch', 'box_score_fetch', 'parse', 'score', 'db_write', 'publish')
+
+# The trace of the cycle running in this context. executors.PriorityExecutor
+# runs work in a copy of the submitter's context, so fetches and writes on
+# the pools land in the trace of the cycle that queued them.
+_current = contextvars.ContextVar('ingestion_trace', default=None)
+
+_finished = deque(maxlen=TRACE_HISTORY)
+_finished_lock = threading.Lock()
+
+class Trace:
+    """Stage timings of one ingestion cycle, and when the upstream data it used was fetched.
+
+    Spans of the same stage add up, as a cycle fetches and parses many box
+    scores, some of them at once on the I/O pool.
+    """
+
+    def __init__(self, kind):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.started_at = time.time()
+        self.finished_at = None
+        # Wall time of the oldest upstream response this cycle used, and the
+        # oldest timestamp the upstream feeds put on their own data
+        self.fetched_at = None
+        self.source_time = None
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Add seconds spent in a stage"""
+        with self._lock:
+            total = self._stages.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def record_fetch(self, fetched_at=None, source_time=None):
+        """Note an upstream response this cycle used"""
+        with self._lock:
+            if fetched_at and (self.fetched_at is None or fetched_at < self.fetched_at):
+                self.fetched_at = fetched_at
+            if source_time and (self.source_time is None or source_time < self.source_time):
+                self.source_time = source_time
+
+    def stages(self):
+        """(stage, seconds, spans) for each stage seen, in pipeline order"""
+        with self._lock:
+            stages = dict(self._stages)
+        order = {stage: position for position, stage in enumerate(STAGES)}
+        return [(stage, seconds, count) for stage, (seconds, count)
+                in sorted(stages.items(), key=lambda item: order.get(item[0], len(STAGES)))]
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'kind': self.kind,
+            'started_at': self.started_at,
+            'duration': None if self.finished_at is None else round(self.finished_at - self.started_at, 4),
+            'fetched_at': self.fetched_at,
+            'source_time': self.source_time,
+            'stages': {stage: {'seconds': round(seconds, 4), 'spans': count}
+                       for stage, seconds, count in self.stages()}
+        }
+
+@contextmanager
+def trace(kind):
+    """Trace the with-block as one ingestion cycle of a kind, logging and recording its stages at the end"""
+    active = Trace(kind)
+    token = _current.set(active)
+    try:
+        yield active
+    finally:
+        active.finished_at = time.time()
+        stages = active.stages()
+        for stage, seconds, _ in stages:
+            INGEST_STAGE_LATENCY.observe(seconds, kind=kind, stage=stage)
+        with _finished_lock:
+            _finished.append(active)
+
+        summary = ', '.join(f"{stage} {seconds:.2f}s" + (f" ({count})" if count > 1 else '')
+                            for stage, seconds, count in stages)
+        logging.info(f"Trace {active.trace_id} {kind} cycle in {active.finished_at - active.started_at:.2f}s: "
+                     f"{summary or 'no stages'}")
+        _current.reset(token)
+
+def traced(kind):
+    """Decorator running every call of a function as one traced ingestion cycle of a kind"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def current():
+    """The trace of the ingestion cycle running in this context, or None"""
+    return _current.get()
+
+@contextmanager
+def span(stage):
+    """Time the with-block as a stage of the current trace; does nothing outside a traced cycle"""
+    active = _current.get()
+    if active is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.record(stage, time.perf_counter() - start)
+
+def record(stage, seconds):
+    """Add seconds measured elsewhere to a stage of the current trace"""
+    active = _current.get()
+    if active is not None:
+        active.record(stage, seconds)
+
+def record_fetch(source_time=None, fetched_at=None):
+    """Note that the current trace used an upstream response, received just now unless fetched_at says when"""
+    active = _current.get()
+    if active is not None:
+        active.record_fetch(fetched_at or time.time(), source_time)
+
+def record_source_time(source_time):
+    """Note the timestamp an upstream feed put on data the current trace used"""
+    active = _current.get()
+    if active is not None:
+        active.record_fetch(source_time=source_time)
+
+def recent_traces(limit=TRACE_HISTORY):
+    """The most recently finished traces in this process, newest first"""
+    with _finished_lock:
+        finished = list(_finished)
+    return [trace.to_dict() for trace in reversed(finished)][:limit]